@@ -0,0 +1,82 @@
+# bench/amount_path.py
+"""
+Throughput of the integer amount path (UI string -> base units ->
+TransferChecked bytes, token-account bytes -> base units), next to the old
+float path (float(ui) -> int(round(x * 1e6))), with a count of how often the
+float path disagrees with exact parsing. The round-trip, ordering and
+rejection properties are tested in tests/test_amounts.py.
+
+    python -m bench.amount_path --cases 200000
+"""
+import argparse
+import random
+import time
+from base64 import b64encode
+
+from bench.mock_rpc import spl_token_account_data
+from core.amounts import U64_MAX, USDC_DECIMALS, format_units, to_base_units
+from services.solana_service import _token_amount, _u64_le
+
+MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+OWNER = "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"
+
+
+def random_units(rnd: random.Random) -> int:
+    # mix of tiny, typical and huge (near u64 max) amounts
+    kind = rnd.random()
+    if kind < 0.3:
+        return rnd.randrange(0, 10**4)
+    if kind < 0.9:
+        return rnd.randrange(0, 10**12)
+    return rnd.randrange(U64_MAX - 10**9, U64_MAX + 1)
+
+
+def float_mismatches(cases: int, seed: int) -> int:
+    """How often the old float path disagrees with exact parsing."""
+    rnd = random.Random(seed)
+    n = 0
+    for _ in range(cases):
+        units = random_units(rnd)
+        if int(round(float(format_units(units)) * 10**USDC_DECIMALS)) != units:
+            n += 1
+    return n
+
+
+def throughput(n: int, seed: int):
+    rnd = random.Random(seed)
+    texts = [format_units(rnd.randrange(0, 10**12)) for _ in range(n)]
+    accounts = [{"data": [b64encode(spl_token_account_data(MINT, OWNER, rnd.randrange(10**12))).decode(), "base64"]}
+                for _ in range(min(n, 10_000))]
+
+    t0 = time.perf_counter()
+    for t in texts:
+        _u64_le(to_base_units(t))
+    parse = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for t in texts:
+        _u64_le(int(round(float(t) * 10**USDC_DECIMALS)))
+    legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        _token_amount(accounts[i % len(accounts)])
+    decode = time.perf_counter() - t0
+
+    print(f"  parse+encode (exact) : {n / parse:>12,.0f}/s")
+    print(f"  parse+encode (float) : {n / legacy:>12,.0f}/s")
+    print(f"  balance decode       : {n / decode:>12,.0f}/s")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cases", type=int, default=100_000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    mismatches = float_mismatches(args.cases, args.seed)
+    print(f"{args.cases} random cases: old float path disagreed on {mismatches} ({mismatches / args.cases:.1%})")
+    throughput(args.cases, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# bench/async_db_load.py
+"""
+Event-loop health under concurrent handlers: the same simulated bot/HTTP
+handler (ensure_user, wallet lookup, invoice create/pay/gate, history page)
+run with the sync services called straight from coroutines versus the async
+services over AsyncDB. A 1ms ticker on the loop records how late it wakes up.
+Sync-mode per-request latency looks low only because its handlers never yield
+and so run back to back; the loop lag is what other connections experience.
+
+    python -m bench.async_db_load --handlers 200 --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from core.async_db import AsyncDB
+from core.db import DB
+from services.directory_cache import DirectoryCache
+from services.user_service import AsyncUserService, UserService
+from services.wallet_service import AsyncWalletService, WalletService
+from services.x402_service import AsyncX402Service, X402Service
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def seed(db: DB, users: int, payments: int):
+    db.bulk_add_users([(i, f"user{i}") for i in range(users)])
+    db.insert_many("wallets", ("tg_user_id", "wallet_address", "is_active"),
+                   [(i, f"wallet{i}", 1) for i in range(users)])
+    rnd = random.Random(7)
+    db.bulk_add_payments([(rnd.randrange(users), "s", rnd.randrange(users), "r", rnd.randrange(1, 10**8), "CONFIRMED")
+                          for _ in range(payments)])
+
+
+async def ticker(lags: list, stop: asyncio.Event, period: float = 0.001):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(period)
+        lags.append(time.perf_counter() - t0 - period)
+
+
+def sync_handler(db: DB, users: UserService, wallets: WalletService, x402: X402Service):
+    async def handle(n: int, uid: int):
+        users.ensure_user(uid, f"user{uid}" if n % 50 else f"user{uid}_{n}")
+        wallets.active_wallet(uid)
+        inv = x402.create_invoice(f"res{n % 100}", 10_000, uid)
+        x402.get_invoice(inv)
+        x402.mark_paid(inv)
+        x402.has_paid(f"res{n % 100}", uid)
+        db.payment_history(uid, limit=20)
+    return handle
+
+
+def async_handler(adb: AsyncDB, users: AsyncUserService, wallets: AsyncWalletService, x402: AsyncX402Service):
+    async def handle(n: int, uid: int):
+        await users.ensure_user(uid, f"user{uid}" if n % 50 else f"user{uid}_{n}")
+        await wallets.active_wallet(uid)
+        inv = await x402.create_invoice(f"res{n % 100}", 10_000, uid)
+        await x402.get_invoice(inv)
+        await x402.mark_paid(inv)
+        await x402.has_paid(f"res{n % 100}", uid)
+        await adb.payment_history(uid, limit=20)
+    return handle
+
+
+async def drive(handle, handlers: int, requests: int, users: int):
+    rnd = random.Random(1)
+    work = [(n, rnd.randrange(users * 2)) for n in range(requests)]  # half the ids are first-time users
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.01)
+
+    async def worker(k: int):
+        for n, uid in work[k::handlers]:
+            t0 = time.perf_counter()
+            await handle(n, uid)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(k) for k in range(handlers)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await tick
+    return elapsed, latencies, lags
+
+
+async def run(mode: str, handlers: int, requests: int, users: int, payments: int):
+    tmp = tempfile.TemporaryDirectory()
+    db = DB(os.path.join(tmp.name, "load.db"))
+    seed(db, users, payments)
+    cache = DirectoryCache(db)
+    commits = []
+    db._writer.set_trace_callback(lambda sql: commits.append(1) if sql.startswith("COMMIT") else None)
+    adb = None
+    if mode == "sync":
+        handle = sync_handler(db, UserService(db, cache), WalletService(db, cache), X402Service(db))
+    else:
+        adb = AsyncDB(db)
+        handle = async_handler(adb, AsyncUserService(adb, cache), AsyncWalletService(adb, cache), AsyncX402Service(adb))
+
+    elapsed, latencies, lags = await drive(handle, handlers, requests, users)
+    if adb:
+        await adb.aclose()
+    db._writer.set_trace_callback(None)
+    db.close()
+    tmp.cleanup()
+    return {
+        "req/s": requests / elapsed,
+        "p50 ms": statistics.median(latencies) * 1e3,
+        "p99 ms": _pct(latencies, 0.99) * 1e3,
+        "lag p50": statistics.median(lags) * 1e3 if lags else float("nan"),
+        "lag p99": _pct(lags, 0.99) * 1e3,
+        "lag max": max(lags, default=0.0) * 1e3,
+        "ticks": len(lags),
+        "writes/commit": adb.stats()["writes_per_commit"] if adb else 1.0,
+        "commits": len(commits),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--handlers", type=int, default=200)
+    ap.add_argument("--requests", type=int, default=5_000)
+    ap.add_argument("--users", type=int, default=5_000)
+    ap.add_argument("--payments", type=int, default=100_000)
+    args = ap.parse_args()
+
+    results = {mode: asyncio.run(run(mode, args.handlers, args.requests, args.users, args.payments))
+               for mode in ("sync", "async")}
+    print(f"{args.requests} requests, {args.handlers} concurrent handlers (all times ms)")
+    print(f"{'':<14}" + "".join(f"{mode:>12}" for mode in results))
+    for key in results["sync"]:
+        print(f"{key:<14}" + "".join(f"{r[key]:>12,.2f}" for r in results.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench/build_latency.py
+"""
+Latency of SolanaService.build_usdc_transfer against a mock node with a fixed
+per-request delay, versus the old six-sequential-call build.
+
+    python -m bench.build_latency --latency 0.05 --builds 50
+"""
+import argparse
+import statistics
+import time
+
+from solders.hash import Hash
+from solders.keypair import Keypair
+from solders.message import MessageV0
+from solders.null_signer import NullSigner
+from solders.pubkey import Pubkey
+from solders.transaction import VersionedTransaction
+
+from bench.mock_rpc import MockRpcServer
+from core.config import USDC_MINT
+from services.rpc import Rpc
+from services.solana_service import (
+    USDC_DECIMALS, SolanaService, _get_associated_token_address,
+    _ix_create_associated_token_account, _ix_transfer_checked,
+)
+
+
+def legacy_build(svc: SolanaService, sender_pubkey: str, recipient_pubkey: str, amount: int) -> bytes:
+    """The pre-batching build: getBalance, getTokenAccountsByOwner, getTokenAccountBalance,
+    getAccountInfo x2 and getLatestBlockhash, one after another."""
+    rpc, mint = svc.rpc, svc.usdc_mint
+    sender = Pubkey.from_string(sender_pubkey)
+    recipient = Pubkey.from_string(recipient_pubkey)
+    rpc.get_balance_lamports(sender_pubkey)
+    acc = rpc.get_token_account_by_owner(sender_pubkey, str(mint))
+    if acc:
+        rpc.get_token_balance_ui(acc)
+    sender_ata = _get_associated_token_address(sender, mint)
+    recipient_ata = _get_associated_token_address(recipient, mint)
+    ixs = []
+    if rpc.get_account_info(str(sender_ata)) is None:
+        ixs.append(_ix_create_associated_token_account(sender, sender, mint))
+    if rpc.get_account_info(str(recipient_ata)) is None:
+        ixs.append(_ix_create_associated_token_account(sender, recipient, mint))
+    ixs.append(_ix_transfer_checked(sender_ata, mint, recipient_ata, sender, amount, USDC_DECIMALS))
+    msg = MessageV0.try_compile(sender, ixs, [], Hash.from_string(rpc.get_latest_blockhash()))
+    return bytes(VersionedTransaction(msg, [NullSigner(sender)]))
+
+
+def fund(node: MockRpcServer, owner: Pubkey, usdc: int):
+    ata = _get_associated_token_address(owner, Pubkey.from_string(USDC_MINT))
+    node.chain.set_balance(str(owner), 10**9)
+    node.chain.set_token_account(str(ata), str(owner), USDC_MINT, usdc)
+
+
+def _stats(name, samples):
+    ms = sorted(s * 1000 for s in samples)
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    print(f"{name:<12} p50 {statistics.median(ms):8.1f} ms   p99 {p99:8.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency", type=float, default=0.05, help="seconds per RPC round trip")
+    ap.add_argument("--builds", type=int, default=30)
+    args = ap.parse_args()
+
+    sender, recipient = Keypair().pubkey(), Keypair().pubkey()
+    with MockRpcServer(latency=args.latency) as node:
+        fund(node, sender, 50 * 10**6)
+        fund(node, recipient, 0)
+        svc = SolanaService(Rpc(node.url))
+
+        for name, build in (("legacy", lambda: legacy_build(svc, str(sender), str(recipient), 1_250_000)),
+                            ("optimized", lambda: svc.build_usdc_transfer(str(sender), str(recipient), 1_250_000))):
+            before = node.requests
+            samples = []
+            for _ in range(args.builds):
+                t0 = time.perf_counter()
+                build()
+                samples.append(time.perf_counter() - t0)
+            _stats(name, samples)
+            print(f"{'':<12} {(node.requests - before) / args.builds:.2f} HTTP round trips per build")
+
+
+if __name__ == "__main__":
+    main()
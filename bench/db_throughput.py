@@ -0,0 +1,102 @@
+# bench/db_throughput.py
+"""
+Mixed read/write throughput of core.db.DB with N threads, compared against the
+old connect-per-statement behaviour.
+
+    python -m bench.db_throughput --threads 1 4 8 --ops 2000
+"""
+import argparse
+import contextlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from core.db import DB
+
+
+class LegacyDB(DB):
+    """The pre-pool DB: a fresh connection, global lock and commit per statement."""
+
+    PRAGMAS = ()
+
+    def _legacy_conn(self):
+        conn = sqlite3.connect(self.filename, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def transaction(self):
+        return contextlib.nullcontext(self)
+
+    def execute(self, query, params=()):
+        with self.lock:
+            conn = self._legacy_conn()
+            cur = conn.execute(query, params)
+            conn.commit()
+            rid = cur.lastrowid
+            conn.close()
+            return rid
+
+    def _read(self, query, params, one):
+        with self.lock:
+            conn = self._legacy_conn()
+            cur = conn.execute(query, params)
+            rows = cur.fetchone() if one else cur.fetchall()
+            conn.close()
+            return rows
+
+
+def _seed(db: DB, users: int):
+    for i in range(users):
+        db.ensure_user(i, f"user{i}")
+        db.add_wallet(i, f"wallet{i}", "")
+        db.set_active_wallet(i, f"wallet{i}")
+
+
+def _worker(db: DB, ops: int, users: int, write_every: int, seed: int):
+    for n in range(ops):
+        uid = (seed * 7919 + n) % users
+        if write_every and n % write_every == 0:
+            db.add_payment(uid, f"wallet{uid}", (uid + 1) % users, f"wallet{(uid + 1) % users}", 1_000_000)
+        elif n % 2:
+            db.get_active_wallet(uid)
+        else:
+            db.get_user_by_username(f"user{uid}")
+
+
+def run(cls, threads: int, ops: int, users: int, write_every: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = cls(os.path.join(tmp, "bench.db"))
+        _seed(db, users)
+        workers = [
+            threading.Thread(target=_worker, args=(db, ops, users, write_every, i))
+            for i in range(threads)
+        ]
+        t0 = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - t0
+        db.close()
+        return threads * ops / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    ap.add_argument("--ops", type=int, default=2000, help="operations per thread")
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--write-every", type=int, default=10, help="one write per N ops (0 = read only)")
+    args = ap.parse_args()
+
+    print(f"{'threads':>8} {'legacy ops/s':>14} {'pooled ops/s':>14} {'speedup':>8}")
+    for n in args.threads:
+        before = run(LegacyDB, n, args.ops, args.users, args.write_every)
+        after = run(DB, n, args.ops, args.users, args.write_every)
+        print(f"{n:>8} {before:>14.0f} {after:>14.0f} {after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
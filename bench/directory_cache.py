@@ -0,0 +1,84 @@
+# bench/directory_cache.py
+"""
+"pay @user" resolution (username -> tg id -> active wallet) with and without
+the DirectoryCache, plus hit/miss stats and a cross-process invalidation check.
+
+    python -m bench.directory_cache --users 5000 --lookups 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from core.db import DB
+from services.directory_cache import DirectoryCache
+from services.user_service import UserService
+from services.wallet_service import WalletService
+
+
+def _open(path: str, **cache_kw):
+    db = DB(path)
+    cache = DirectoryCache(db, **cache_kw)
+    return db, UserService(db, cache), WalletService(db, cache)
+
+
+def _resolve(users: UserService, wallets: WalletService, name: str):
+    uid = users.find_by_username_or_id(name, None)
+    return wallets.active_wallet(uid) if uid is not None else None
+
+
+def run(n_users: int, lookups: int, write_every: int):
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "dir.db")
+    db, users, wallets = _open(path, shared=True, sync_interval=0.05)
+    for i in range(n_users):
+        wallets.add_wallet(i, f"user{i}", f"wallet{i}")
+
+    rnd = random.Random(1)
+    names = [f"user{min(int(rnd.paretovariate(1.2)) - 1, n_users - 1)}" for _ in range(lookups)]
+
+    t0 = time.perf_counter()
+    for name in names:
+        users._load("username", name) and wallets._load_active(int(name[4:]))
+    uncached = time.perf_counter() - t0
+
+    users.cache.clear()
+    t0 = time.perf_counter()
+    for n, name in enumerate(names):
+        if write_every and n % write_every == 0:
+            uid = int(name[4:])
+            wallets.set_active(uid, f"wallet{uid}")
+        _resolve(users, wallets, name)
+    cached = time.perf_counter() - t0
+
+    print(f"{lookups} resolutions over {n_users} users")
+    print(f"  sqlite : {uncached:.3f}s ({lookups / uncached:,.0f}/s)")
+    print(f"  cached : {cached:.3f}s ({lookups / cached:,.0f}/s)  x{uncached / cached:.1f}")
+    print(f"  stats  : {users.cache.stats()}")
+
+    # A second "process" (own DB handle + cache) must see a wallet switch made here.
+    db2, users2, wallets2 = _open(path, shared=True, sync_interval=0.05)
+    assert _resolve(users2, wallets2, "user0") == "wallet0"
+    wallets.add_wallet(0, "user0", "wallet0b")
+    assert _resolve(users2, wallets2, "user0") == "wallet0"  # stale until the next sync
+    time.sleep(0.06)
+    assert _resolve(users2, wallets2, "user0") == "wallet0b"
+    print("  cross-process invalidation: ok")
+
+    db2.close()
+    db.close()
+    tmp.cleanup()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=5_000)
+    ap.add_argument("--lookups", type=int, default=100_000)
+    ap.add_argument("--write-every", type=int, default=1_000, help="set_active every N lookups (0 = never)")
+    args = ap.parse_args()
+    run(args.users, args.lookups, args.write_every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# bench/ensure_user.py
+"""
+ensure_user() at message rate: the old unconditional INSERT OR IGNORE + UPDATE
+against the seen-users cache with batched last-seen flushes, across N threads.
+
+    python -m bench.ensure_user --threads 1 4 8 --messages 20000 --users 2000
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from core.db import DB
+from services.directory_cache import DirectoryCache
+from services.user_service import UserService
+
+
+def legacy_ensure_user(db: DB, tg_user_id: int, username: str | None):
+    with db.transaction():
+        db.execute("INSERT OR IGNORE INTO users(tg_user_id, username) VALUES (?, ?)", (tg_user_id, username))
+        if username:
+            db.execute("UPDATE users SET username=? WHERE tg_user_id=?", (username, tg_user_id))
+
+
+def run(legacy: bool, threads: int, messages: int, users: int):
+    tmp = tempfile.TemporaryDirectory()
+    db = DB(os.path.join(tmp.name, "users.db"))
+    svc = UserService(db, DirectoryCache(db), seen_flush_interval=1.0)
+    ensure = (lambda uid, name: legacy_ensure_user(db, uid, name)) if legacy else svc.ensure_user
+    writes = []
+    db._writer.set_trace_callback(lambda sql: writes.append(sql) if sql.startswith(("INSERT", "UPDATE")) else None)
+
+    def worker(seed: int):
+        for n in range(messages // threads):
+            uid = (seed * 7919 + n * 31) % users
+            # one user in 500 messages shows up with a new username
+            ensure(uid, f"user{uid}" if n % 500 else f"user{uid}_{n}")
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    svc.flush_seen()
+    elapsed = time.perf_counter() - t0
+    db._writer.set_trace_callback(None)
+    db.close()
+    tmp.cleanup()
+    return elapsed, len(writes)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    ap.add_argument("--messages", type=int, default=20_000)
+    ap.add_argument("--users", type=int, default=2_000)
+    args = ap.parse_args()
+    print(f"{'threads':>7} {'legacy msg/s':>13} {'writes':>7} {'cached msg/s':>13} {'writes':>7} {'speedup':>8}")
+    for n in args.threads:
+        before, w_before = run(True, n, args.messages, args.users)
+        after, w_after = run(False, n, args.messages, args.users)
+        print(f"{n:>7} {args.messages / before:>13,.0f} {w_before:>7} {args.messages / after:>13,.0f} {w_after:>7} "
+              f"{before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
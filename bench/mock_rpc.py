@@ -0,0 +1,307 @@
+# bench/mock_rpc.py
+"""
+Local stand-in for a Solana JSON-RPC node, for benchmarks and manual checks.
+
+    with MockRpcServer(latency=0.02, error_rate=0.01) as node:
+        rpc = Rpc(node.url)
+
+Every HTTP request sleeps `latency` seconds (one round trip, however many calls
+a batch carries). `error_rate` turns individual calls into JSON-RPC errors and
+`http_error_rate` fails whole requests with `http_error_status` (e.g. 429).
+`slow_rate` of requests take `slow_latency` instead, for tail-latency spikes.
+`batch_mode` makes batch replies come back reversed, short one reply, or
+rejected as a whole.
+"""
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import base58
+
+TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+
+
+def spl_token_account_data(mint: str, owner: str, amount: int) -> bytes:
+    """165-byte SPL token account: mint, owner, amount (u64 LE), then zeroed state."""
+    data = bytearray(165)
+    data[0:32] = base58.b58decode(mint)
+    data[32:64] = base58.b58decode(owner)
+    data[64:72] = amount.to_bytes(8, "little")
+    data[108] = 1  # AccountState::Initialized
+    return bytes(data)
+
+
+def _token_balance(index: int, data: bytes, units: int) -> dict:
+    """A pre/postTokenBalances entry for the token account at `index` of a transaction."""
+    return {"accountIndex": index, "mint": base58.b58encode(data[:32]).decode(),
+            "owner": base58.b58encode(data[32:64]).decode(),
+            "uiTokenAmount": {"amount": str(units), "decimals": 6}}
+
+
+class MockChain:
+    """In-memory ledger the mock node answers from."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lamports = {}        # pubkey -> lamports
+        self.accounts = {}        # pubkey -> (owner program, data bytes, lamports)
+        self.token_owners = {}    # (owner, mint) -> [token account pubkeys]
+        self.signatures = {}      # signature -> submission slot
+        self.slot = 1000
+        self.block_height = 900
+        self.confirm_after = 2    # slots until a sent tx shows as confirmed
+        self.fail_sends = False   # reject sendTransaction like a failing preflight (True or the message)
+        self.tx_errors = {}       # signature -> on-chain err reported by getSignatureStatuses
+        self.slot_time = None     # seconds per slot; None = slots only move on tick()
+        self._clock_slots = 0
+        self._t0 = time.monotonic()
+        self.calls = {}           # method -> count
+        self.listeners = []       # fn(kind, key) on account change / signature confirmation
+        self._unconfirmed = set()
+        self.references = {}      # reference pubkey -> signature infos, newest first
+        self.transactions = {}    # signature -> getTransaction result
+
+    def set_balance(self, pubkey: str, lamports: int):
+        self.lamports[pubkey] = lamports
+
+    def set_token_account(self, account: str, owner: str, mint: str, amount: int):
+        self.accounts[account] = (TOKEN_PROGRAM, spl_token_account_data(mint, owner, amount), 2039280)
+        self.token_owners.setdefault((owner, mint), [])
+        if account not in self.token_owners[(owner, mint)]:
+            self.token_owners[(owner, mint)].append(account)
+        self._notify("account", account)
+
+    def credit(self, account: str, amount: int, reference: str | None = None):
+        """
+        Simulate an incoming transfer to an existing token account. With a
+        `reference` (Solana Pay), the transfer's signature is listed by
+        getSignaturesForAddress(reference). getTransaction returns the token
+        balance change either way. Returns the signature.
+        """
+        with self.lock:
+            _, data, lamports = self.accounts[account]
+            data = bytearray(data)
+            before = int.from_bytes(data[64:72], "little")
+            data[64:72] = (before + amount).to_bytes(8, "little")
+            self.accounts[account] = (TOKEN_PROGRAM, bytes(data), lamports)
+            self.slot += 1
+            sig = base58.b58encode(hashlib.sha512(f"{account}:{self.slot}:{amount}".encode()).digest()).decode()
+            self._record(sig, [account], reference, [_token_balance(1, data, before)],
+                         [_token_balance(1, data, before + amount)])
+        self._notify("account", account)
+        return sig
+
+    def touch_reference(self, reference: str) -> str:
+        """A successful transaction that carries `reference` but moves no tokens."""
+        with self.lock:
+            self.slot += 1
+            sig = base58.b58encode(hashlib.sha512(f"touch:{reference}:{self.slot}".encode()).digest()).decode()
+            self._record(sig, [], reference, [], [])
+        return sig
+
+    def _record(self, sig, accounts, reference, pre, post):
+        payer = base58.b58encode(hashlib.sha256(sig.encode()).digest()).decode()
+        keys = [payer, *accounts] + ([reference] if reference else [])
+        self.transactions[sig] = {
+            "slot": self.slot, "version": 0,
+            "transaction": {"signatures": [sig], "message": {"accountKeys": keys}},
+            "meta": {"err": None, "preTokenBalances": pre, "postTokenBalances": post,
+                     "loadedAddresses": {"writable": [], "readonly": []}},
+        }
+        if reference:
+            self.references.setdefault(reference, []).insert(
+                0, {"signature": sig, "slot": self.slot, "err": None, "confirmationStatus": "confirmed"})
+
+    def _notify(self, kind, key):
+        for fn in self.listeners:
+            fn(kind, key)
+
+    def _confirm_due(self):
+        due = [s for s in self._unconfirmed if self.slot - self.signatures[s] >= self.confirm_after]
+        for sig in due:
+            self._unconfirmed.discard(sig)
+        return due
+
+    def tick(self, slots: int = 1):
+        with self.lock:
+            self.slot += slots
+            self.block_height += slots
+            due = self._confirm_due()
+        for sig in due:
+            self._notify("signature", sig)
+
+    # ---------- method handlers ----------
+    def _account_value(self, pubkey):
+        if pubkey in self.accounts:
+            owner, data, lamports = self.accounts[pubkey]
+            return {"lamports": lamports, "owner": owner, "executable": False, "rentEpoch": 0,
+                    "data": [base64.b64encode(data).decode(), "base64"], "space": len(data)}
+        if pubkey in self.lamports:
+            return {"lamports": self.lamports[pubkey], "owner": "11111111111111111111111111111111",
+                    "executable": False, "rentEpoch": 0, "data": ["", "base64"], "space": 0}
+        return None
+
+    def _advance_clock(self):
+        if self.slot_time:
+            due = int((time.monotonic() - self._t0) / self.slot_time)
+            if due > self._clock_slots:
+                self.slot += due - self._clock_slots
+                self.block_height += due - self._clock_slots
+                self._clock_slots = due
+
+    def handle(self, method, params):
+        with self.lock:
+            self._advance_clock()
+            due = self._confirm_due() if self.listeners else ()
+        for sig in due:
+            self._notify("signature", sig)
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            ctx = {"slot": self.slot}
+            if method == "getLatestBlockhash":
+                h = hashlib.sha256(str(self.slot).encode()).digest()
+                return {"context": ctx, "value": {"blockhash": base58.b58encode(h).decode(),
+                                                  "lastValidBlockHeight": self.block_height + 150}}
+            if method == "getBlockHeight":
+                return self.block_height
+            if method == "getSlot":
+                return self.slot
+            if method == "getBalance":
+                return {"context": ctx, "value": self.lamports.get(params[0], 0)}
+            if method == "getAccountInfo":
+                return {"context": ctx, "value": self._account_value(params[0])}
+            if method == "getMultipleAccounts":
+                return {"context": ctx, "value": [self._account_value(p) for p in params[0]]}
+            if method == "getTokenAccountsByOwner":
+                accs = self.token_owners.get((params[0], params[1].get("mint")), [])
+                return {"context": ctx, "value": [{"pubkey": a, "account": self._account_value(a)} for a in accs]}
+            if method == "getTokenAccountBalance":
+                _, data, _ = self.accounts[params[0]]
+                amount = int.from_bytes(data[64:72], "little")
+                return {"context": ctx, "value": {"amount": str(amount), "decimals": 6,
+                                                  "uiAmount": amount / 1e6, "uiAmountString": str(amount / 1e6)}}
+            if method == "sendTransaction":
+                # wire format: compact-u16 signature count, then 64-byte signatures
+                sig = base58.b58encode(base64.b64decode(params[0])[1:65]).decode()
+                if self.fail_sends:
+                    raise ValueError(self.fail_sends if isinstance(self.fail_sends, str)
+                                     else "Transaction simulation failed: insufficient funds")
+                if sig not in self.signatures:
+                    self.signatures[sig] = self.slot
+                    self._unconfirmed.add(sig)
+                return sig
+            if method == "getSignaturesForAddress":
+                limit = (params[1] if len(params) > 1 else {}).get("limit", 1000)
+                return self.references.get(params[0], [])[:limit]
+            if method == "getTransaction":
+                return self.transactions.get(params[0])
+            if method == "getSignatureStatuses":
+                out = []
+                for sig in params[0]:
+                    sent = self.signatures.get(sig)
+                    if sent is None:
+                        out.append(None)
+                        continue
+                    age = self.slot - sent
+                    status = "finalized" if age >= 2 * self.confirm_after else (
+                        "confirmed" if age >= self.confirm_after else "processed")
+                    out.append({"slot": sent, "confirmations": age, "err": self.tx_errors.get(sig), "confirmationStatus": status})
+                return {"context": ctx, "value": out}
+        raise KeyError(method)
+
+
+class MockRpcServer:
+    def __init__(self, chain: MockChain | None = None, latency: float = 0.0, error_rate: float = 0.0,
+                 http_error_rate: float = 0.0, http_error_status: int = 500, seed: int = 0,
+                 slow_rate: float = 0.0, slow_latency: float = 0.0, batch_mode: str | None = None):
+        self.chain = chain or MockChain()
+        self.latency = latency
+        self.slow_rate = slow_rate        # fraction of requests that take slow_latency instead (tail spikes)
+        self.slow_latency = slow_latency
+        self.batch_mode = batch_mode      # None | "reverse" | "drop_last" | "reject": misbehaving batch replies
+        self.error_rate = error_rate
+        self.http_error_rate = http_error_rate
+        self.http_error_status = http_error_status
+        self.requests = 0
+        self._rnd = random.Random(seed)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _reply(self, req):
+        if self._rnd.random() < self.error_rate:
+            return {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": -32005, "message": "injected error"}}
+        try:
+            return {"jsonrpc": "2.0", "id": req.get("id"), "result": self.chain.handle(req["method"], req.get("params", []))}
+        except KeyError as e:
+            return {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": -32601, "message": f"unknown {e}"}}
+        except ValueError as e:
+            return {"jsonrpc": "2.0", "id": req.get("id"), "error": {"code": -32002, "message": str(e)}}
+
+    def _batch_reply(self, reqs):
+        if self.batch_mode == "reject":
+            return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batch requests are disabled"}}
+        out = [self._reply(r) for r in reqs]
+        if self.batch_mode == "reverse":
+            out.reverse()
+        elif self.batch_mode == "drop_last":
+            out.pop()
+        return out
+
+    def _handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                node.requests += 1
+                delay = node.slow_latency if node._rnd.random() < node.slow_rate else node.latency
+                if delay:
+                    time.sleep(delay)
+                if node._rnd.random() < node.http_error_rate:
+                    self.send_response(node.http_error_status)
+                    self.send_header("Content-Length", "0")
+                    if node.http_error_status == 429:
+                        self.send_header("Retry-After", "1")
+                    self.end_headers()
+                    return
+                req = json.loads(body)
+                out = node._batch_reply(req) if isinstance(req, list) else node._reply(req)
+                data = json.dumps(out).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,116 @@
+# bench/mock_ws.py
+"""
+Local stand-in for a Solana PubSub websocket, driven by a MockChain.
+
+    chain = MockChain()
+    async with MockWsServer(chain) as ws:
+        watcher = PaymentWatcher(ws.url, ...)
+        chain.credit(ata, 1_000_000)   # -> accountNotification to subscribers
+
+Supports accountSubscribe/Unsubscribe and signatureSubscribe/Unsubscribe.
+drop_all() closes every client connection to exercise reconnects.
+"""
+import asyncio
+import itertools
+import json
+
+from websockets.asyncio.server import serve
+
+from bench.mock_rpc import MockChain
+
+
+class MockWsServer:
+    def __init__(self, chain: MockChain):
+        self.chain = chain
+        self._ids = itertools.count(1)
+        self._subs = {}        # sub id -> (ws, kind, key)
+        self._by_key = {}      # (kind, key) -> set of sub ids
+        self._clients = set()
+        self._server = None
+        self._loop = None
+        self.url = None
+
+    async def __aenter__(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await serve(self._handle, "127.0.0.1", 0, max_size=None)
+        port = self._server.sockets[0].getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}"
+        self.chain.listeners.append(self._on_chain)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.chain.listeners.remove(self._on_chain)
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def subscriptions(self) -> int:
+        return len(self._subs)
+
+    async def drop_all(self):
+        """Abort every client socket, like a node restart or network blip."""
+        for ws in list(self._clients):
+            self._forget(ws)
+            ws.transport.abort()
+
+    def _forget(self, ws):
+        self._clients.discard(ws)
+        for sub in [s for s, v in self._subs.items() if v[0] is ws]:
+            self._drop(sub)
+
+    # ---------- chain -> clients ----------
+    def _on_chain(self, kind, key):
+        # MockChain may call from the HTTP server's threads
+        self._loop.call_soon_threadsafe(self._publish, kind, key)
+
+    def _publish(self, kind, key):
+        for sub in list(self._by_key.get((kind, key), ())):
+            ws = self._subs[sub][0]
+            if kind == "account":
+                with self.chain.lock:
+                    value = self.chain._account_value(key)
+                    slot = self.chain.slot
+                result = {"context": {"slot": slot}, "value": value}
+                method = "accountNotification"
+            else:
+                result = {"context": {"slot": self.chain.slot}, "value": {"err": None}}
+                method = "signatureNotification"
+                self._drop(sub)
+            msg = {"jsonrpc": "2.0", "method": method, "params": {"result": result, "subscription": sub}}
+            asyncio.ensure_future(self._send(ws, msg))
+
+    @staticmethod
+    async def _send(ws, msg):
+        try:
+            await ws.send(json.dumps(msg))
+        except Exception:
+            pass
+
+    def _drop(self, sub):
+        ws, kind, key = self._subs.pop(sub)
+        self._by_key.get((kind, key), set()).discard(sub)
+
+    # ---------- client requests ----------
+    async def _handle(self, ws):
+        self._clients.add(ws)
+        try:
+            async for raw in ws:
+                req = json.loads(raw)
+                method, params = req["method"], req.get("params", [])
+                reply = {"jsonrpc": "2.0", "id": req.get("id")}
+                if method in ("accountSubscribe", "signatureSubscribe"):
+                    kind = method[:-len("Subscribe")]
+                    sub = next(self._ids)
+                    self._subs[sub] = (ws, kind, params[0])
+                    self._by_key.setdefault((kind, params[0]), set()).add(sub)
+                    reply["result"] = sub
+                elif method in ("accountUnsubscribe", "signatureUnsubscribe"):
+                    ok = params[0] in self._subs
+                    if ok:
+                        self._drop(params[0])
+                    reply["result"] = ok
+                else:
+                    reply["error"] = {"code": -32601, "message": f"unknown {method}"}
+                await ws.send(json.dumps(reply))
+        finally:
+            self._forget(ws)
@@ -0,0 +1,332 @@
+# bench/pay_flow.py
+"""
+End-to-end pay flow against a mock Solana node and a temp SQLite DB:
+
+    ensure_user -> active_wallet -> add_payment -> build_usdc_transfer
+      -> PhantomLink.build_sign_link -> sign* -> send_signed -> update_payment_status
+
+(*sign stands in for the user's Phantom wallet.) The mock node runs in its own
+process with configurable latency and error rates, so it neither competes for
+the GIL nor shows up in allocation numbers. Two passes:
+
+  - timed: `--payments` flows over `--concurrency` threads; throughput and
+    per-stage p50/p99 (failed calls are counted, not timed out of the sample)
+  - allocations: `--alloc-flows` sequential flows under tracemalloc; per stage,
+    peak KiB allocated during the call and blocks still alive after it
+
+    python -m bench.pay_flow --payments 2000 --concurrency 8 --latency 0.002
+    python -m bench.pay_flow --save-baseline bench/pay_flow.json      # once, on the CI runner
+    python -m bench.pay_flow --baseline bench/pay_flow.json --tolerance 0.3
+
+With --baseline, exits non-zero when:
+  - the run's config (payments, latency, error rates) differs from the baseline's;
+  - any flow failed with error injection off, or the failure rate rose above
+    the baseline's (plus a little slack for random injection);
+  - a stage ran fewer times than in the baseline, by more than `--tolerance`;
+  - throughput, a stage's p50, or a stage's allocations regress by more than
+    `--tolerance` (relative, above small absolute floors so that
+    sub-millisecond noise does not trip it).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from base64 import b64decode, b64encode
+from concurrent.futures import ThreadPoolExecutor
+
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.transaction import VersionedTransaction
+
+from bench.mock_rpc import MockRpcServer
+from core.config import USDC_MINT
+from core.db import DB
+from services.directory_cache import DirectoryCache
+from services.phantom_link import PhantomLink
+from services.rpc import Rpc
+from services.solana_service import SolanaService, _get_associated_token_address
+from services.user_service import UserService
+from services.wallet_service import WalletService
+
+STAGES = ("ensure_user", "active_wallet", "add_payment", "build_usdc_transfer", "build_sign_link",
+          "sign*", "send_signed", "update_payment_status")
+
+# absolute slack on top of --tolerance before a change counts as a regression
+FLOORS = {"p50_ms": 0.5, "peak_kib": 4.0, "blocks": 20}
+FAIL_RATE_SLACK = 0.02
+# a baseline is only comparable with a run under the same load and fault injection
+CONFIG_KEYS = ("payments", "concurrency", "latency", "error_rate", "http_error_rate")
+
+
+# ---------- mock node (child process) ----------
+def _serve(conn, owners, recipients, node_kw):
+    node = MockRpcServer(**node_kw)
+    mint = Pubkey.from_string(USDC_MINT)
+    for owner in owners + recipients:
+        pk = Pubkey.from_string(owner)
+        node.chain.set_balance(owner, 10**9 if owner in owners else 0)
+        node.chain.set_token_account(str(_get_associated_token_address(pk, mint)), owner, USDC_MINT,
+                                     10**15 if owner in owners else 0)
+    with node:
+        conn.send(node.url)
+        conn.recv()
+        conn.send(node.requests)
+
+
+class _Node:
+    def __init__(self, owners, recipients, **node_kw):
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child = ctx.Pipe()
+        self._proc = ctx.Process(target=_serve, args=(child, owners, recipients, node_kw), daemon=True)
+
+    def __enter__(self):
+        self._proc.start()
+        self.url = self._conn.recv()
+        return self
+
+    def __exit__(self, *exc):
+        self._conn.send("stop")
+        self.requests = self._conn.recv()
+        self._proc.join(5)
+
+
+# ---------- stage recorders ----------
+class Timed:
+    def __init__(self):
+        self.samples = {s: [] for s in STAGES}
+        self.errors = dict.fromkeys(STAGES, 0)
+
+    def run(self, stage, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception:
+            self.errors[stage] += 1
+            raise
+        finally:
+            self.samples[stage].append(time.perf_counter() - t0)
+
+
+class Allocs:
+    """Sequential only: tracemalloc counters are process-wide."""
+
+    def __init__(self):
+        self.peak = {s: [] for s in STAGES}
+        self.blocks = {s: [] for s in STAGES}
+
+    def run(self, stage, fn, *args):
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        try:
+            return fn(*args)
+        finally:
+            self.peak[stage].append(tracemalloc.get_traced_memory()[1])
+            self.blocks[stage].append(len(tracemalloc.take_snapshot().traces))
+
+
+# ---------- the flow ----------
+class Flow:
+    def __init__(self, db: DB, rpc: Rpc, senders, recipients):
+        cache = DirectoryCache(db)
+        self.db = db
+        self.users = UserService(db, cache)
+        self.wallets = WalletService(db, cache)
+        self.sol = SolanaService(rpc)
+        self.phantom = PhantomLink()
+        self.senders = senders          # [(tg id, username, Keypair)]
+        self.recipients = recipients    # [(tg id, username, wallet)]
+
+    @staticmethod
+    def _sign(unsigned_b64: str, kp: Keypair) -> str:
+        tx = VersionedTransaction.from_bytes(b64decode(unsigned_b64))
+        return b64encode(bytes(VersionedTransaction(tx.message, [kp]))).decode()
+
+    def _resolve(self, sender_id: int, recip_id: int):
+        return self.wallets.active_wallet(sender_id), self.wallets.active_wallet(recip_id)
+
+    def pay(self, rec, n: int) -> bool:
+        """One payment end to end; False if any stage raised (the payment is marked FAILED)."""
+        sender_id, sender_name, kp = self.senders[n % len(self.senders)]
+        recip_id, _, _ = self.recipients[(n * 7) % len(self.recipients)]
+        amount = 10_000 + n % 997
+        pay_id = None
+        try:
+            rec.run("ensure_user", self.users.ensure_user, sender_id, sender_name)
+            sender_wallet, recip_wallet = rec.run("active_wallet", self._resolve, sender_id, recip_id)
+            pay_id = rec.run("add_payment", self.db.add_payment, sender_id, sender_wallet, recip_id, recip_wallet, amount)
+            built = rec.run("build_usdc_transfer", self.sol.build_usdc_transfer, sender_wallet, recip_wallet, amount)
+            rec.run("build_sign_link", self.phantom.build_sign_link, built.unsigned_b64, {"state": str(pay_id)})
+            signed = rec.run("sign*", self._sign, built.unsigned_b64, kp)
+            sig = rec.run("send_signed", self.sol.send_signed, signed)
+            rec.run("update_payment_status", self.db.update_payment_status, pay_id, "PENDING", sig)
+        except Exception:
+            if pay_id is not None:
+                self.db.update_payment_status(pay_id, "FAILED")
+            return False
+        return True
+
+
+def _setup(db: DB, n_senders: int, n_recipients: int, seed: int):
+    rnd = random.Random(seed)
+    senders = [(1_000_000 + i, f"payer{i}", Keypair.from_seed(rnd.randbytes(32))) for i in range(n_senders)]
+    recipients = [(2_000_000 + i, f"payee{i}", str(Keypair.from_seed(rnd.randbytes(32)).pubkey()))
+                  for i in range(n_recipients)]
+    wallets = WalletService(db)
+    for tg, name, kp in senders:
+        wallets.add_wallet(tg, name, str(kp.pubkey()))
+    for tg, name, wallet in recipients:
+        wallets.add_wallet(tg, name, wallet)
+    return senders, recipients
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run(args) -> dict:
+    tmp = tempfile.TemporaryDirectory()
+    db = DB(os.path.join(tmp.name, "payflow.db"))
+    senders, recipients = _setup(db, args.senders, args.recipients, args.seed)
+    node_kw = dict(latency=args.latency, error_rate=args.error_rate, http_error_rate=args.http_error_rate,
+                   seed=args.seed)
+    with _Node([str(kp.pubkey()) for _, _, kp in senders], [w for _, _, w in recipients], **node_kw) as node:
+        rpc = Rpc(node.url, timeout=10, pool_size=args.concurrency)
+        flow = Flow(db, rpc, senders, recipients)
+        for n in range(args.warmup):
+            flow.pay(Timed(), n)
+
+        timed = Timed()
+        flow_times = []
+
+        def one(n):
+            t0 = time.perf_counter()
+            ok = flow.pay(timed, n)
+            flow_times.append(time.perf_counter() - t0)
+            return ok
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            failed = sum(not ok for ok in pool.map(one, range(args.warmup, args.warmup + args.payments)))
+        elapsed = time.perf_counter() - t0
+
+        allocs = Allocs()
+        tracemalloc.start()
+        try:
+            alloc_failed = sum(not flow.pay(allocs, n) for n in range(args.alloc_flows))
+        finally:
+            tracemalloc.stop()
+        rpc.close()
+    db.close()
+    tmp.cleanup()
+
+    stages = {}
+    for s in STAGES:
+        ms = timed.samples[s]
+        stages[s] = {
+            "calls": len(ms),
+            "errors": timed.errors[s],
+            # None when the stage never ran (every flow failed before it)
+            "p50_ms": statistics.median(ms) * 1e3 if ms else None,
+            "p99_ms": _pct(ms, 0.99) * 1e3 if ms else None,
+            "peak_kib": statistics.median(allocs.peak[s]) / 1024 if allocs.peak[s] else None,
+            "blocks": statistics.median(allocs.blocks[s]) if allocs.blocks[s] else None,
+        }
+    return {
+        "config": {k: getattr(args, k) for k in ("payments", "concurrency", "latency", "error_rate",
+                                                 "http_error_rate", "senders", "recipients", "alloc_flows", "seed")},
+        "flows_per_s": args.payments / elapsed,
+        "flow_p50_ms": statistics.median(flow_times) * 1e3,
+        "flow_p99_ms": _pct(flow_times, 0.99) * 1e3,
+        "failed": failed,
+        "alloc_failed": alloc_failed,
+        "rpc_requests": node.requests,
+        "stages": stages,
+    }
+
+
+def report(r: dict):
+    c = r["config"]
+    print(f"{c['payments']} payments, {c['concurrency']} threads, node latency {c['latency'] * 1e3:.1f}ms, "
+          f"error rate {c['error_rate']:.1%} / http {c['http_error_rate']:.1%}")
+    print(f"  {r['flows_per_s']:,.0f} flows/s   p50 {r['flow_p50_ms']:.2f}ms   p99 {r['flow_p99_ms']:.2f}ms   "
+          f"failed {r['failed']} (+{r['alloc_failed']} in the alloc pass)   rpc requests {r['rpc_requests']}")
+    print(f"  {'stage':<22} {'calls':>6} {'errors':>6} {'p50 ms':>8} {'p99 ms':>8} {'peak KiB':>9} {'blocks':>7}")
+
+    def cell(v, width, fmt):
+        return f"{'-':>{width}}" if v is None else f"{v:>{width}{fmt}}"
+
+    for name, s in r["stages"].items():
+        print(f"  {name:<22} {s['calls']:>6} {s['errors']:>6} {cell(s['p50_ms'], 8, '.3f')} "
+              f"{cell(s['p99_ms'], 8, '.3f')} {cell(s['peak_kib'], 9, '.1f')} {cell(s['blocks'], 7, '.0f')}")
+
+
+def regressions(current: dict, baseline: dict, tolerance: float):
+    cfg, base_cfg = current["config"], baseline["config"]
+    differs = [k for k in CONFIG_KEYS if cfg.get(k) != base_cfg.get(k)]
+    if differs:
+        return ["config differs from baseline: " + ", ".join(f"{k} {cfg.get(k)} vs {base_cfg.get(k)}" for k in differs)]
+
+    out = []
+    injected = cfg["error_rate"] or cfg["http_error_rate"]
+    rate = (current["failed"] + current["alloc_failed"]) / (cfg["payments"] + cfg.get("alloc_flows", 0))
+    base_rate = (baseline["failed"] + baseline.get("alloc_failed", 0)) / (base_cfg["payments"] + base_cfg.get("alloc_flows", 0))
+    if not injected and (current["failed"] or current["alloc_failed"]):
+        out.append(f"{current['failed'] + current['alloc_failed']} flows failed with no errors injected")
+    elif rate > base_rate + FAIL_RATE_SLACK:
+        out.append(f"failure rate {rate:.1%} > baseline {base_rate:.1%}")
+    if current["flows_per_s"] < baseline["flows_per_s"] * (1 - tolerance):
+        out.append(f"throughput {current['flows_per_s']:,.0f}/s < baseline {baseline['flows_per_s']:,.0f}/s")
+    for name, base in baseline["stages"].items():
+        cur = current["stages"].get(name)
+        if cur is None:
+            out.append(f"{name} missing")
+            continue
+        if cur["calls"] < base["calls"] * (1 - tolerance):
+            out.append(f"{name}.calls {cur['calls']} < baseline {base['calls']}")
+        for key, floor in FLOORS.items():
+            if cur[key] is not None and base[key] is not None and cur[key] > base[key] * (1 + tolerance) + floor:
+                out.append(f"{name}.{key} {cur[key]:.2f} > baseline {base[key]:.2f}")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--payments", type=int, default=1_000)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency", type=float, default=0.002, help="mock node delay per request (s)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of JSON-RPC error replies")
+    ap.add_argument("--http-error-rate", type=float, default=0.0, help="fraction of HTTP 500 replies")
+    ap.add_argument("--senders", type=int, default=50)
+    ap.add_argument("--recipients", type=int, default=200)
+    ap.add_argument("--warmup", type=int, default=100)
+    ap.add_argument("--alloc-flows", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write the results here")
+    ap.add_argument("--save-baseline", help="write the results here as the new baseline")
+    ap.add_argument("--baseline", help="compare against this baseline and exit 1 on regression")
+    ap.add_argument("--tolerance", type=float, default=0.3)
+    args = ap.parse_args()
+
+    result = run(args)
+    report(result)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(result, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION: {line}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench/rpc_roundtrips.py
+"""
+Calls/sec against the local mock node: a fresh connection per call (the old
+Rpc), the pooled Rpc, JSON-RPC batches, and AsyncRpc with concurrent calls.
+
+    python -m bench.rpc_roundtrips --calls 500 --latency 0.002
+
+Correctness (batch reply ordering, missing/rejected batches, error
+unwrapping) is covered by tests/test_rpc.py.
+"""
+import argparse
+import asyncio
+import time
+
+import requests
+
+from bench.mock_rpc import MockRpcServer
+from services.rpc import AsyncRpc, Rpc
+
+OWNER = "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"
+
+
+def _rate(n, fn):
+    t0 = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=500)
+    ap.add_argument("--latency", type=float, default=0.002, help="server-side seconds per HTTP request")
+    ap.add_argument("--batch", type=int, default=8)
+    ap.add_argument("--concurrency", type=int, default=16)
+    args = ap.parse_args()
+    n = args.calls
+    params = [OWNER, {"commitment": "processed"}]
+
+    with MockRpcServer(latency=args.latency) as node:
+        node.chain.set_balance(OWNER, 10**9)
+        body = {"jsonrpc": "2.0", "id": 1, "method": "getBalance", "params": params}
+
+        def fresh():
+            for _ in range(n):
+                requests.post(node.url, json=body, timeout=25).json()
+
+        rpc = Rpc(node.url)
+
+        def pooled():
+            for _ in range(n):
+                rpc.get_balance_lamports(OWNER)
+
+        def batched():
+            for _ in range(n // args.batch):
+                rpc.batch([("getBalance", params)] * args.batch)
+
+        async def concurrent():
+            async with AsyncRpc(node.url, pool_size=args.concurrency) as arpc:
+                sem = asyncio.Semaphore(args.concurrency)
+
+                async def one():
+                    async with sem:
+                        await arpc.get_balance_lamports(OWNER)
+
+                await asyncio.gather(*(one() for _ in range(n)))
+
+        print(f"{'mode':<24} {'calls/s':>10}")
+        print(f"{'fresh connection':<24} {_rate(n, fresh):>10.0f}")
+        print(f"{'pooled Rpc':<24} {_rate(n, pooled):>10.0f}")
+        print(f"{f'batch x{args.batch}':<24} {_rate(n // args.batch * args.batch, batched):>10.0f}")
+        print(f"{f'AsyncRpc c={args.concurrency}':<24} {_rate(n, lambda: asyncio.run(concurrent())):>10.0f}")
+        rpc.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# bench/rpc_router.py
+"""
+RpcRouter against three local nodes sharing one chain: one that rate-limits
+(429), one with tail-latency spikes, and a steady but slower one. Compares
+read latency and failures with a plain Rpc pinned to each node, then checks
+where sendTransaction lands.
+
+    python -m bench.rpc_router --reads 400 --threads 8
+
+Pass/fail checks for routing, hedging, 429 backoff and failover live in
+tests/test_rpc_router.py.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from solders.keypair import Keypair
+
+from bench.mock_rpc import MockChain, MockRpcServer
+from services.rpc import Rpc
+from services.rpc_router import RpcRouter
+
+
+def _load(rpc: Rpc, keys, reads: int, threads: int):
+    lat, failures = [], 0
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal failures
+        for _ in range(reads // threads):
+            t0 = time.perf_counter()
+            try:
+                rpc.get_multiple_accounts(keys)
+                ok = True
+            except Exception:
+                ok = False
+            with lock:
+                lat.append(time.perf_counter() - t0)
+                failures += not ok
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    ms = sorted(x * 1000 for x in lat)
+    return statistics.median(ms), ms[int(len(ms) * 0.99)], failures
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reads", type=int, default=400)
+    ap.add_argument("--threads", type=int, default=8)
+    args = ap.parse_args()
+
+    chain = MockChain()
+    keys = [str(Keypair().pubkey()) for _ in range(10)]
+    nodes = {
+        "throttled": MockRpcServer(chain, latency=0.005, http_error_rate=0.3, http_error_status=429, seed=1),
+        "spiky": MockRpcServer(chain, latency=0.005, slow_rate=0.03, slow_latency=0.5, seed=2),
+        "steady": MockRpcServer(chain, latency=0.03, seed=3),
+    }
+    for node in nodes.values():
+        node.__enter__()
+    try:
+        print(f"{'target':<12} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7}")
+        for name, node in nodes.items():
+            rpc = Rpc(node.url, timeout=5)
+            p50, p99, failed = _load(rpc, keys, args.reads, args.threads)
+            print(f"{name:<12} {p50:>8.1f} {p99:>8.1f} {failed:>7}")
+            rpc.close()
+
+        router = RpcRouter([n.url for n in nodes.values()], timeout=5)
+        p50, p99, failed = _load(router, keys, args.reads, args.threads)
+        print(f"{'router':<12} {p50:>8.1f} {p99:>8.1f} {failed:>7}")
+        names = {n.url: k for k, n in nodes.items()}
+        for url, h in router.health().items():
+            lat = h["latency_ewma"] or 0.0
+            print(f"  {names[url]:<10} ewma {lat * 1000:6.1f} ms  err {h['error_ewma']:.3f}  "
+                  f"requests {h['requests']:>4}  429s {h['throttled']:>3}")
+
+        before = {k: n.requests for k, n in nodes.items()}
+        for _ in range(20):
+            try:
+                router.send_raw_transaction("AQ==")  # rejected by the mock; we only count where it went
+            except Exception:
+                pass
+        sent = {k: n.requests - before[k] for k, n in nodes.items()}
+        print(f"  sendTransaction x20 landed on: {sent}")
+        assert sum(sent.values()) == 20, "sendTransaction was hedged or retried"
+        router.close()
+    finally:
+        for node in nodes.values():
+            node.__exit__(None, None, None)
+
+
+if __name__ == "__main__":
+    main()
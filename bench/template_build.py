@@ -0,0 +1,60 @@
+# bench/template_build.py
+"""
+Builds/s of the serialize step in build_usdc_transfer: full MessageV0 compile
+versus splicing amount + blockhash into a cached template, for a pool of
+repeat sender/recipient pairs. Every spliced transaction is checked
+byte-for-byte against a full compile first.
+
+    python -m bench.template_build --pairs 100 --builds 20000
+"""
+import argparse
+import random
+import time
+
+from solders.hash import Hash
+from solders.keypair import Keypair
+
+from core.config import USDC_MINT
+from services.solana_service import SolanaService
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pairs", type=int, default=100)
+    ap.add_argument("--builds", type=int, default=20_000)
+    args = ap.parse_args()
+
+    svc = SolanaService(rpc=None, usdc_mint=USDC_MINT)
+    rnd = random.Random(7)
+    pairs = [(Keypair().pubkey(), Keypair().pubkey(), rnd.random() < 0.1, rnd.random() < 0.3)
+             for _ in range(args.pairs)]
+    hashes = [str(Hash.new_unique()) for _ in range(8)]
+    jobs = [(rnd.choice(pairs), rnd.randrange(1, 10**12), rnd.choice(hashes)) for _ in range(args.builds)]
+
+    def compiled(pair, amount, bh):
+        sender, recipient, cs, cr = pair
+        return svc._serialize_unsigned(sender, svc._transfer_ixs(sender, recipient, cs, cr, amount), bh)
+
+    for pair, amount, bh in jobs[:2000]:
+        assert svc._render_transfer(*pair, amount, bh) == compiled(pair, amount, bh)
+    svc.templates.clear()
+
+    t0 = time.perf_counter()
+    for pair, amount, bh in jobs:
+        compiled(pair, amount, bh)
+    full = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for pair, amount, bh in jobs:
+        svc._render_transfer(*pair, amount, bh)
+    spliced = time.perf_counter() - t0
+
+    n = args.builds
+    print(f"{n} builds over {args.pairs} pairs (byte-identical on 2000 samples)")
+    print(f"  compile : {n / full:>10,.0f} builds/s  ({full / n * 1e6:6.1f} us)")
+    print(f"  template: {n / spliced:>10,.0f} builds/s  ({spliced / n * 1e6:6.1f} us)  x{full / spliced:.1f}")
+    print(f"  {svc.templates.stats()}")
+
+
+if __name__ == "__main__":
+    main()
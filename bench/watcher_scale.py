@@ -0,0 +1,129 @@
+# bench/watcher_scale.py
+"""
+PaymentWatcher at scale against the local mock node + mock PubSub websocket:
+register N invoices (each with a Solana Pay reference) on N recipient
+accounts, credit them all (with a forced reconnect half way), and report
+registration/settlement time. First checks matching on a shared account:
+same-price invoices settle by reference, never by arrival order.
+
+    python -m bench.watcher_scale --accounts 20000 --connections 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from solders.keypair import Keypair
+
+from bench.mock_rpc import MockChain, MockRpcServer
+from bench.mock_ws import MockWsServer
+from core.db import DB
+from services.payment_watcher import PaymentWatcher
+from services.rpc import AsyncRpc
+from services.x402_service import X402Service
+
+MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+
+
+async def check_matching():
+    tmp = tempfile.TemporaryDirectory()
+    db = DB(os.path.join(tmp.name, "match.db"))
+    x402 = X402Service(db)
+    chain = MockChain()
+    ata = str(Keypair().pubkey())
+    chain.set_token_account(ata, str(Keypair().pubkey()), MINT, 0)
+    refs = [str(Keypair().pubkey()) for _ in range(4)]
+    a, b, c, d = (x402.create_invoice("same-price", 5_000_000, buyer) for buyer in (1, 2, 3, 4))
+
+    with MockRpcServer(chain) as node:
+        async with MockWsServer(chain) as ws, AsyncRpc(node.url) as rpc:
+            watcher = await PaymentWatcher(ws.url, rpc, db, x402=x402, connections=1, ttl=0.3,
+                                           sweep_interval=3600).start()
+            for inv, ref in zip((a, b, c), refs):
+                await watcher.expect_invoice(inv, ata, 5_000_000, reference=ref)
+            await watcher.expect_invoice(d, ata, 5_000_000)  # no reference
+
+            async def settled(n):
+                for _ in range(100):
+                    await watcher.flush()
+                    if watcher.stats["matched"] >= n:
+                        return
+                    await asyncio.sleep(0.02)
+                raise AssertionError(f"expected {n} settlements, got {watcher.snapshot()}")
+
+            chain.credit(ata, 5_000_000, reference=refs[1])  # buyer 2 pays first
+            await settled(1)
+            assert x402.has_paid("same-price", 2) and not x402.has_paid("same-price", 1)
+
+            chain.credit(ata, 5_000_000)  # no reference: 1, 3 and 4 are all candidates
+            await asyncio.sleep(0.2)
+            await watcher.flush()
+            assert watcher.stats["matched"] == 1, watcher.snapshot()
+
+            assert watcher.cancel("invoice", c) and not watcher.cancel("invoice", c)
+            await asyncio.sleep(0.3)
+            await watcher.sweep()  # a and d are past ttl
+            assert not watcher.expected and not watcher.by_ref, watcher.snapshot()
+            await asyncio.sleep(0.05)
+            assert ws.subscriptions == 0
+            await watcher.stop()
+    print(f"matching: same-price invoices settle by reference; cancel/ttl release subscriptions  "
+          f"{watcher.snapshot()}")
+    db.close()
+    tmp.cleanup()
+
+
+async def run(n: int, connections: int, reconnect: bool):
+    tmp = tempfile.TemporaryDirectory()
+    db = DB(os.path.join(tmp.name, "watch.db"))
+    x402 = X402Service(db)
+    chain = MockChain()
+    accounts = [str(Keypair().pubkey()) for _ in range(n)]
+    refs = [str(Keypair().pubkey()) for _ in range(n)]
+    for acc in accounts:
+        chain.set_token_account(acc, str(Keypair().pubkey()), MINT, 0)
+    ids = [x402.create_invoice("bench", 1000 + i, i) for i in range(n)]
+
+    with MockRpcServer(chain) as node:
+        async with MockWsServer(chain) as ws, AsyncRpc(node.url) as rpc:
+            watcher = await PaymentWatcher(ws.url, rpc, db, x402=x402, connections=connections).start()
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(watcher.expect_invoice(ids[i], accounts[i], 1000 + i, refs[i]) for i in range(n)))
+            t_reg = time.perf_counter() - t0
+            print(f"registered {n} accounts in {t_reg:.2f}s ({ws.subscriptions} live subscriptions)")
+
+            t0 = time.perf_counter()
+            for i, acc in enumerate(accounts):
+                chain.credit(acc, 1000 + i, refs[i])
+                if reconnect and i == n // 2:
+                    await ws.drop_all()
+                if i % 500 == 0:
+                    await asyncio.sleep(0)  # let notifications flow
+            while watcher.expected:
+                await asyncio.sleep(0.05)
+            t_settle = time.perf_counter() - t0
+            await watcher.stop()
+
+    paid = db.fetch_one("SELECT COUNT(*) AS n FROM invoices WHERE status='PAID'")["n"]
+    print(f"settled {paid}/{n} in {t_settle:.2f}s ({paid / t_settle:.0f}/s)  {watcher.snapshot()}")
+    db.close()
+    tmp.cleanup()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--accounts", type=int, default=10_000)
+    ap.add_argument("--connections", type=int, default=8)
+    ap.add_argument("--no-reconnect", action="store_true")
+    args = ap.parse_args()
+    for name in ("websockets", "asyncio"):
+        logging.getLogger(name).setLevel(logging.CRITICAL)  # aborted-socket noise from drop_all()
+    asyncio.run(check_matching())
+    asyncio.run(run(args.accounts, args.connections, not args.no_reconnect))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# core/amounts.py
+from decimal import Decimal, InvalidOperation
+
+USDC_DECIMALS = 6
+U64_MAX = 2**64 - 1
+
+def _plain(text: str) -> bool:
+    whole, _, frac = text.partition(".")
+    return (whole or frac) != "" and whole.isascii() and frac.isascii() \
+        and (not whole or whole.isdigit()) and (not frac or frac.isdigit())
+
+def to_base_units(value, decimals: int = USDC_DECIMALS) -> int:
+    """
+    Exact UI amount -> integer base units: "1.25" / Decimal("1.25") / 1.25 -> 1250000.
+    Floats are read through their shortest repr, so 0.1 means "0.1", not 0.1000000000000000055...
+    Raises ValueError for negatives, more than `decimals` fractional digits, or u64 overflow.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if isinstance(value, int):
+        units = value * 10 ** decimals
+    elif isinstance(value, str) and _plain(value.strip()):
+        # fast path for "123" / "123.45": integer arithmetic only
+        whole, _, frac = value.strip().partition(".")
+        frac = frac.rstrip("0")
+        if len(frac) > decimals:
+            raise ValueError(f"Amount {value} has more than {decimals} decimal places.")
+        units = int(whole or "0") * 10 ** decimals + int(frac.ljust(decimals, "0") or "0")
+    else:
+        try:
+            d = Decimal(repr(value)) if isinstance(value, float) else Decimal(str(value).strip())
+        except InvalidOperation:
+            raise ValueError(f"Invalid amount: {value!r}") from None
+        if not d.is_finite():
+            raise ValueError(f"Invalid amount: {value!r}")
+        scaled = d.scaleb(decimals)
+        if scaled != scaled.to_integral_value():
+            raise ValueError(f"Amount {value} has more than {decimals} decimal places.")
+        units = int(scaled)
+    if units < 0:
+        raise ValueError(f"Amount must not be negative: {value}")
+    if units > U64_MAX:
+        raise ValueError(f"Amount too large: {value}")
+    return units
+
+def from_base_units(units: int, decimals: int = USDC_DECIMALS) -> Decimal:
+    return Decimal(units).scaleb(-decimals)
+
+def format_units(units: int, decimals: int = USDC_DECIMALS) -> str:
+    """1250000 -> "1.250000" (always `decimals` places, no float rounding)."""
+    whole, frac = divmod(units, 10 ** decimals)
+    return f"{whole}.{frac:0{decimals}d}" if decimals else str(whole)
+
+def require_base_units(amount) -> int:
+    """Guard for APIs that take base units: a float here is almost certainly a UI amount."""
+    if not isinstance(amount, int) or isinstance(amount, bool):
+        raise TypeError(f"Amount must be integer base units, got {type(amount).__name__}; use to_base_units().")
+    if not 0 <= amount <= U64_MAX:
+        raise ValueError(f"Amount out of range: {amount}")
+    return amount
@@ -0,0 +1,176 @@
+# core/async_db.py
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from core.db import DB
+from core.metrics import metrics
+
+# DB helpers exposed as coroutines: reads run on the reader pool, writes on the writer thread.
+READ_HELPERS = (
+    "get_user_by_username", "get_user_by_id", "get_active_wallet", "list_wallets", "get_payment",
+    "find_latest_unfulfilled_request", "get_recent_requests", "payment_history", "request_history",
+    "payment_summary", "payment_totals",
+)
+WRITE_HELPERS = (
+    "ensure_user", "bulk_add_users", "touch_users", "add_wallet", "set_active_wallet", "add_payment",
+    "bulk_add_payments", "update_payment_status", "update_payment_statuses", "add_request",
+    "mark_request_fulfilled",
+)
+
+_STOP = object()
+
+def _resolve(fut: asyncio.Future, ok: bool, value: Any):
+    if not fut.done():
+        if ok:
+            fut.set_result(value)
+        else:
+            fut.set_exception(value)
+
+
+class AsyncDB:
+    """
+    asyncio facade over DB for FastAPI / bot handlers.
+
+    Reads run on a bounded pool of reader threads (each with its own WAL read
+    connection). Writes are queued to one writer thread, which drains whatever
+    has queued up (up to `max_batch`) and commits it as a single transaction:
+    concurrent handlers share one commit instead of taking the write lock in
+    turn. Each write runs in its own savepoint, so a failing write raises to
+    its caller without undoing the others. A write's future resolves only after
+    its group has committed.
+
+    `max_pending` bounds queued work per side; further callers wait (backpressure).
+    """
+
+    def __init__(self, db: DB, readers: int = 4, max_batch: int = 256, max_pending: int = 1024):
+        self.db = db
+        self.max_batch = max_batch
+        self._pool = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-read")
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._read_slots = asyncio.Semaphore(max_pending)
+        self._write_slots = asyncio.Semaphore(max_pending)
+        self._writer = threading.Thread(target=self._write_loop, name="db-write", daemon=True)
+        self._writer.start()
+        self.commits = 0
+        self.writes = 0
+
+    async def aclose(self):
+        self._queue.put(_STOP)
+        await asyncio.to_thread(self._writer.join)
+        self._pool.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    # ---------- dispatch ----------
+    async def run_read(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking read (any DB/service call that only reads) on the reader pool."""
+        async with self._read_slots:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, lambda: fn(*args, **kwargs))
+
+    async def run_write(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run `fn` on the writer thread inside the next group commit; returns once committed."""
+        async with self._write_slots:
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            self._queue.put((fn, args, kwargs, fut, loop))
+            return await fut
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.put(_STOP)  # finish this group, then stop
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        results = []
+        try:
+            with self.db.transaction():
+                for fn, args, kwargs, _, _ in batch:
+                    try:
+                        with self.db.savepoint():
+                            results.append((True, fn(*args, **kwargs)))
+                    except Exception as e:
+                        results.append((False, e))
+        except Exception as e:  # BEGIN/COMMIT itself failed: nothing in the group persisted
+            results = [(False, e)] * len(batch)
+        self.commits += 1
+        self.writes += len(batch)
+        metrics.observe("db_group_commit_writes", len(batch))
+        for (_, _, _, fut, loop), (ok, value) in zip(batch, results):
+            loop.call_soon_threadsafe(_resolve, fut, ok, value)
+
+    # ---------- DB API ----------
+    async def fetch_one(self, query: str, params: tuple = ()):
+        return await self.run_read(self.db.fetch_one, query, params)
+
+    async def fetch_all(self, query: str, params: tuple = ()):
+        return await self.run_read(self.db.fetch_all, query, params)
+
+    async def execute(self, query: str, params: tuple = ()):
+        return await self.run_write(self.db.execute, query, params)
+
+    async def executemany(self, query: str, seq_of_params) -> int:
+        return await self.run_write(self.db.executemany, query, list(seq_of_params))
+
+    async def insert_many(self, table: str, columns: tuple, rows, or_ignore: bool = False) -> int:
+        return await self.run_write(self.db.insert_many, table, columns, list(rows), or_ignore)
+
+    async def iter_payment_history(self, tg_user_id: int, direction: str = "all", status: str | None = None,
+                                   page_size: int = 500):
+        cursor = None
+        while True:
+            rows, cursor = await self.run_read(self.db.payment_history, tg_user_id, direction, page_size, cursor, status)
+            for row in rows:
+                yield row
+            if cursor is None:
+                return
+
+    async def iter_request_history(self, tg_user_id: int, role: str = "all", fulfilled: bool | None = None,
+                                   page_size: int = 500):
+        cursor = None
+        while True:
+            rows, cursor = await self.run_read(self.db.request_history, tg_user_id, role, page_size, cursor, fulfilled)
+            for row in rows:
+                yield row
+            if cursor is None:
+                return
+
+    def stats(self) -> dict:
+        return {"commits": self.commits, "writes": self.writes,
+                "writes_per_commit": self.writes / self.commits if self.commits else 0.0}
+
+
+def _read_helper(name: str):
+    async def helper(self, *args, **kwargs):
+        return await self.run_read(getattr(self.db, name), *args, **kwargs)
+    helper.__name__ = name
+    return helper
+
+def _write_helper(name: str):
+    async def helper(self, *args, **kwargs):
+        return await self.run_write(getattr(self.db, name), *args, **kwargs)
+    helper.__name__ = name
+    return helper
+
+for _name in READ_HELPERS:
+    setattr(AsyncDB, _name, _read_helper(_name))
+for _name in WRITE_HELPERS:
+    setattr(AsyncDB, _name, _write_helper(_name))
@@ -0,0 +1,2 @@
+USDC_MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+PUBLIC_BASE_URL = "http://localhost:8000"
@@ -1,50 +1,169 @@
 # core/db.py
 import sqlite3
 import threading
+import time
+from contextlib import contextmanager
+
+from core.amounts import require_base_units
+from core.metrics import metrics
 
 class DB:
+    # Applied to every pooled connection. WAL lets readers run concurrently with
+    # the single writer; synchronous=NORMAL is durable under WAL except on power loss.
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-16000",
+        "PRAGMA mmap_size=134217728",
+    )
+
     def __init__(self, filename: str):
         self.filename = filename
-        self.lock = threading.Lock()
+        self.lock = threading.RLock()  # serializes the writer connection
         self._last_row_id = None
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        # In-memory databases are private per connection, so everything shares the writer.
+        self._shared = filename == ":memory:" or filename.startswith("file::memory:")
+        self._writer = self._get_conn()
         self._ensure_tables()
         self._migrate_schema()
 
     # ---------- Base helpers ----------
     def _get_conn(self):
-        conn = sqlite3.connect(self.filename, check_same_thread=False)
+        conn = sqlite3.connect(self.filename, check_same_thread=False, isolation_level=None)
         conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _reader(self):
+        """Long-lived read connection owned by the calling thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._get_conn()
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
         return conn
 
+    def _in_transaction(self) -> bool:
+        return getattr(self._local, "tx_depth", 0) > 0
+
+    def _record(self, op: str, t0: float, t1: float):
+        """t0 = before taking the write lock, t1 = lock held / statement start."""
+        if t1 > t0:
+            metrics.observe("db_lock_wait_seconds", t1 - t0, op=op)
+        metrics.observe("db_exec_seconds", time.perf_counter() - t1, op=op)
+
+    def _read(self, query: str, params: tuple, one: bool):
+        t0 = time.perf_counter()
+        # Inside a transaction, read through the writer so uncommitted rows are visible.
+        if self._shared or self._in_transaction():
+            with self.lock:
+                t1 = time.perf_counter()
+                cur = self._writer.execute(query, params)
+                rows = cur.fetchone() if one else cur.fetchall()
+        else:
+            t1 = t0
+            cur = self._reader().execute(query, params)
+            rows = cur.fetchone() if one else cur.fetchall()
+        if metrics.enabled:
+            self._record("read", t0, t1)
+        return rows
+
     def execute(self, query: str, params: tuple = ()):
         """Execute a write and return cursor.lastrowid (None for non-INSERTs)."""
+        t0 = time.perf_counter()
         with self.lock:
-            conn = self._get_conn()
-            cur = conn.cursor()
-            cur.execute(query, params)
-            conn.commit()
+            t1 = time.perf_counter()
+            cur = self._writer.execute(query, params)
             rid = cur.lastrowid
-            conn.close()
             self._last_row_id = rid
-            return rid
+        if metrics.enabled:
+            self._record("execute", t0, t1)
+        return rid
 
-    def fetch_one(self, query: str, params: tuple = ()):
+    def executemany(self, query: str, seq_of_params) -> int:
+        """Run one statement for many parameter tuples in a single commit; returns rows affected."""
+        with self.transaction():
+            return self._writer.executemany(query, seq_of_params).rowcount
+
+    def insert_many(self, table: str, columns: tuple, rows, or_ignore: bool = False) -> int:
+        """Bulk INSERT of row tuples matching `columns` in one commit."""
+        verb = "INSERT OR IGNORE" if or_ignore else "INSERT"
+        marks = ",".join("?" * len(columns))
+        return self.executemany(f"{verb} INTO {table} ({','.join(columns)}) VALUES ({marks})", rows)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes into one atomic commit:
+
+            with db.transaction():
+                db.execute(...)
+                db.execute(...)
+
+        Nested blocks join the outermost transaction. Holds the write lock throughout.
+        """
+        t0 = time.perf_counter()
         with self.lock:
-            conn = self._get_conn()
-            cur = conn.cursor()
-            cur.execute(query, params)
-            row = cur.fetchone()
-            conn.close()
-            return dict(row) if row else None
+            t1 = time.perf_counter()
+            depth = getattr(self._local, "tx_depth", 0)
+            if depth == 0:
+                self._writer.execute("BEGIN IMMEDIATE")
+            self._local.tx_depth = depth + 1
+            try:
+                yield self
+            except BaseException:
+                if depth == 0:
+                    self._writer.execute("ROLLBACK")
+                raise
+            else:
+                if depth == 0:
+                    self._writer.execute("COMMIT")
+            finally:
+                self._local.tx_depth = depth
+                if depth == 0 and metrics.enabled:
+                    self._record("transaction", t0, t1)
+
+    @contextmanager
+    def savepoint(self, name: str = "sp"):
+        """
+        A block that can fail on its own: on error only its writes are undone and
+        the surrounding transaction (opened here if there is none) carries on.
+        """
+        with self.transaction():
+            self._writer.execute(f"SAVEPOINT {name}")
+            try:
+                yield self
+            except BaseException:
+                self._writer.execute(f"ROLLBACK TO {name}")
+                self._writer.execute(f"RELEASE {name}")
+                raise
+            else:
+                self._writer.execute(f"RELEASE {name}")
+
+    def fetch_one(self, query: str, params: tuple = ()):
+        row = self._read(query, params, one=True)
+        return dict(row) if row else None
 
     def fetch_all(self, query: str, params: tuple = ()):
+        return [dict(r) for r in self._read(query, params, one=False)]
+
+    def close(self):
         with self.lock:
-            conn = self._get_conn()
-            cur = conn.cursor()
-            cur.execute(query, params)
-            rows = cur.fetchall()
+            self._writer.execute("PRAGMA optimize")
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
             conn.close()
-            return [dict(r) for r in rows]
+        with self.lock:
+            self._writer.close()
 
     # Back-compat if some code still calls these:
     def last_id(self):
@@ -55,8 +174,7 @@ class DB:
     # ---------- Schema ----------
     def _ensure_tables(self):
         with self.lock:
-            conn = self._get_conn()
-            c = conn.cursor()
+            c = self._writer.cursor()
 
             c.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -97,23 +215,124 @@ class DB:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 sender_id INTEGER,
                 recip_id INTEGER,
-                ts REAL,
+                ts REAL NOT NULL,
                 payment_id INTEGER,
                 fulfilled INTEGER DEFAULT 0
             )
             """)
 
-            conn.commit()
-            conn.close()
+            c.execute("""
+            CREATE TABLE IF NOT EXISTS invoices (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                resource_id TEXT,
+                buyer_tg_id INTEGER,
+                price_usdc INTEGER,
+                status TEXT DEFAULT 'OPEN',
+                created_ts REAL DEFAULT (strftime('%s','now')),
+                expires_ts REAL,
+                paid_ts REAL
+            )
+            """)
+
+            # cross-process cache invalidation log (services/directory_cache.py)
+            c.execute("""
+            CREATE TABLE IF NOT EXISTS cache_invalidations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT,
+                key TEXT,
+                ts REAL
+            )
+            """)
 
     # ---------- Migrations ----------
+    INDEXES = (
+        # get_user_by_username
+        "CREATE INDEX IF NOT EXISTS idx_users_username_lower ON users(LOWER(username))",
+        "CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)",
+        # list_wallets, and the per-address UPDATEs in set_active_wallet
+        "CREATE INDEX IF NOT EXISTS idx_wallets_user_addr ON wallets(tg_user_id, wallet_address)",
+        # get_active_wallet: at most one active row per user
+        "CREATE INDEX IF NOT EXISTS idx_wallets_active ON wallets(tg_user_id) WHERE is_active=1",
+        # per-user payment history
+        "CREATE INDEX IF NOT EXISTS idx_payments_sender_ts ON payments(sender_tg_id, created_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_recipient_ts ON payments(recipient_tg_id, created_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_pending ON payments(created_ts) WHERE status='PENDING'",
+        "CREATE INDEX IF NOT EXISTS idx_payments_sig ON payments(tx_signature) WHERE tx_signature IS NOT NULL",
+        # X402Service: paywall lookups, expiry sweep, incremental paid-index refresh
+        "CREATE INDEX IF NOT EXISTS idx_invoices_resource_buyer ON invoices(resource_id, buyer_tg_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_invoices_open_expiry ON invoices(expires_ts) WHERE status='OPEN'",
+        "CREATE INDEX IF NOT EXISTS idx_invoices_paid_ts ON invoices(paid_ts) WHERE status='PAID'",
+        # DirectoryCache.prune
+        "CREATE INDEX IF NOT EXISTS idx_cache_invalidations_ts ON cache_invalidations(ts)",
+        # get_recent_requests
+        "CREATE INDEX IF NOT EXISTS idx_requests_pair_ts ON requests(sender_id, recip_id, ts)",
+        # request_history (keyset on (ts, id) per side)
+        "CREATE INDEX IF NOT EXISTS idx_requests_sender_ts ON requests(sender_id, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_requests_recip_ts ON requests(recip_id, ts)",
+        # find_latest_unfulfilled_request (WHERE must match the query's term verbatim)
+        "CREATE INDEX IF NOT EXISTS idx_requests_open ON requests(sender_id, recip_id, ts) "
+        "WHERE (fulfilled IS NULL OR fulfilled=0)",
+    )
+
+    # Confirmed payment totals per user and UTC day, kept current by triggers so
+    # summaries never scan payments. Amounts of CONFIRMED rows are never edited.
+    PAYMENT_DAILY_TABLE = """
+    CREATE TABLE IF NOT EXISTS payment_daily (
+        tg_user_id INTEGER,
+        day TEXT,
+        sent_count INTEGER DEFAULT 0,
+        sent_total INTEGER DEFAULT 0,
+        received_count INTEGER DEFAULT 0,
+        received_total INTEGER DEFAULT 0,
+        PRIMARY KEY (tg_user_id, day)
+    ) WITHOUT ROWID
+    """
+
+    @staticmethod
+    def _daily_apply(row: str, sign: str) -> str:
+        day = f"date({row}.created_ts, 'unixepoch')"
+        return "".join(
+            f"INSERT INTO payment_daily(tg_user_id, day, {side}_count, {side}_total) "
+            f"VALUES ({row}.{col}, {day}, {sign}1, {sign}{row}.amount_usdc) "
+            f"ON CONFLICT(tg_user_id, day) DO UPDATE SET "
+            f"{side}_count={side}_count+excluded.{side}_count, {side}_total={side}_total+excluded.{side}_total; "
+            for side, col in (("sent", "sender_tg_id"), ("received", "recipient_tg_id"))
+        )
+
+    def _payment_daily_triggers(self):
+        confirmed, was_confirmed = "NEW.status='CONFIRMED'", "OLD.status='CONFIRMED'"
+        return (
+            ("trg_payment_daily_insert", "AFTER INSERT ON payments", confirmed, self._daily_apply("NEW", "+")),
+            ("trg_payment_daily_confirm", "AFTER UPDATE OF status ON payments",
+             f"{confirmed} AND OLD.status IS NOT 'CONFIRMED'", self._daily_apply("NEW", "+")),
+            ("trg_payment_daily_unconfirm", "AFTER UPDATE OF status ON payments",
+             f"{was_confirmed} AND NEW.status IS NOT 'CONFIRMED'", self._daily_apply("OLD", "-")),
+            ("trg_payment_daily_delete", "AFTER DELETE ON payments", was_confirmed, self._daily_apply("OLD", "-")),
+        )
+
+    def _ensure_payment_daily(self):
+        with self.transaction():
+            fresh = not self.fetch_one("SELECT 1 AS x FROM sqlite_master WHERE type='table' AND name='payment_daily'")
+            self.execute(self.PAYMENT_DAILY_TABLE)
+            for name, event, when, body in self._payment_daily_triggers():
+                self.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} WHEN {when} BEGIN {body} END")
+            if fresh:
+                # one-off backfill from payments that predate the table
+                self.execute("""
+                INSERT INTO payment_daily(tg_user_id, day, sent_count, sent_total, received_count, received_total)
+                SELECT uid, day, SUM(sc), SUM(st), SUM(rc), SUM(rt) FROM (
+                    SELECT sender_tg_id AS uid, date(created_ts, 'unixepoch') AS day,
+                           1 AS sc, amount_usdc AS st, 0 AS rc, 0 AS rt
+                    FROM payments WHERE status='CONFIRMED'
+                    UNION ALL
+                    SELECT recipient_tg_id, date(created_ts, 'unixepoch'), 0, 0, 1, amount_usdc
+                    FROM payments WHERE status='CONFIRMED'
+                ) GROUP BY uid, day
+                """)
+
     def _table_info(self, table: str):
         with self.lock:
-            conn = self._get_conn()
-            cur = conn.cursor()
-            cur.execute(f"PRAGMA table_info({table})")
-            rows = cur.fetchall()
-            conn.close()
+            rows = self._writer.execute(f"PRAGMA table_info({table})").fetchall()
             return [dict(r) for r in rows]
 
     def _has_column(self, table: str, column: str) -> bool:
@@ -136,13 +355,60 @@ class DB:
         if not self._has_column("requests", "fulfilled"):
             self.execute("ALTER TABLE requests ADD COLUMN fulfilled INTEGER DEFAULT 0")
 
+        # requests.ts NOT NULL: history pages on (ts, id), where a NULL ts never
+        # compares and the row would drop out after the first page. Older tables
+        # get their NULLs backfilled as the oldest rows and triggers in place of
+        # the constraint SQLite cannot add to an existing column.
+        if not any(c["name"] == "ts" and c["notnull"] for c in self._table_info("requests")):
+            with self.transaction():
+                self.execute("UPDATE requests SET ts=0 WHERE ts IS NULL")
+                for name, event in (("trg_requests_ts_insert", "BEFORE INSERT ON requests"),
+                                    ("trg_requests_ts_update", "BEFORE UPDATE OF ts ON requests")):
+                    self.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} WHEN NEW.ts IS NULL "
+                                 f"BEGIN SELECT RAISE(ABORT, 'NOT NULL constraint failed: requests.ts'); END")
+
+        # users.last_seen_ts (batched by UserService.flush_seen)
+        if not self._has_column("users", "last_seen_ts"):
+            self.execute("ALTER TABLE users ADD COLUMN last_seen_ts REAL")
+
+        # invoices.expires_ts / paid_ts (tables created before expiry support)
+        for col in ("expires_ts", "paid_ts"):
+            if not self._has_column("invoices", col):
+                self.execute(f"ALTER TABLE invoices ADD COLUMN {col} REAL")
+
+        # secondary indexes for the hot lookups (see bench/query_plans.py)
+        for ddl in self.INDEXES:
+            self.execute(ddl)
+
+        self._ensure_payment_daily()
+
     # ---------- User management ----------
-    def ensure_user(self, tg_user_id: int, username: str | None):
-        row = self.fetch_one("SELECT * FROM users WHERE tg_user_id=?", (tg_user_id,))
-        if not row:
-            self.execute("INSERT INTO users (tg_user_id, username) VALUES (?, ?)", (tg_user_id, username))
-        elif username and row["username"] != username:
-            self.execute("UPDATE users SET username=? WHERE tg_user_id=?", (username, tg_user_id))
+    # Insert, or rename when a new non-empty username differs; a no-op otherwise.
+    UPSERT_USER = (
+        "INSERT INTO users (tg_user_id, username) VALUES (?, ?) "
+        "ON CONFLICT(tg_user_id) DO UPDATE SET username=excluded.username "
+        "WHERE excluded.username IS NOT NULL AND excluded.username!='' "
+        "AND users.username IS NOT excluded.username"
+    )
+
+    def ensure_user(self, tg_user_id: int, username: str | None) -> bool:
+        """Returns True if a row was written. The lock-free read skips the write for unchanged users."""
+        row = self.fetch_one("SELECT username FROM users WHERE tg_user_id=?", (tg_user_id,))
+        if row and (not username or row["username"] == username):
+            return False
+        self.execute(self.UPSERT_USER, (tg_user_id, username))
+        return True
+
+    def touch_users(self, seen) -> int:
+        """seen: iterable of (tg_user_id, ts); advances last_seen_ts in one commit, never backwards."""
+        return self.executemany(
+            "UPDATE users SET last_seen_ts=?2 WHERE tg_user_id=?1 AND (last_seen_ts IS NULL OR last_seen_ts<?2)",
+            seen,
+        )
+
+    def bulk_add_users(self, users) -> int:
+        """users: iterable of (tg_user_id, username). Existing ids are left untouched."""
+        return self.insert_many("users", ("tg_user_id", "username"), users, or_ignore=True)
 
     def get_user_by_username(self, username: str):
         return self.fetch_one("SELECT * FROM users WHERE LOWER(username)=?", (username.lower(),))
@@ -158,11 +424,12 @@ class DB:
         )
 
     def set_active_wallet(self, tg_user_id: int, wallet_address: str):
-        self.execute("UPDATE wallets SET is_active=0 WHERE tg_user_id=?", (tg_user_id,))
-        self.execute(
-            "UPDATE wallets SET is_active=1 WHERE tg_user_id=? AND wallet_address=?",
-            (tg_user_id, wallet_address),
-        )
+        with self.transaction():
+            self.execute("UPDATE wallets SET is_active=0 WHERE tg_user_id=?", (tg_user_id,))
+            self.execute(
+                "UPDATE wallets SET is_active=1 WHERE tg_user_id=? AND wallet_address=?",
+                (tg_user_id, wallet_address),
+            )
 
     def get_active_wallet(self, tg_user_id: int):
         return self.fetch_one("SELECT * FROM wallets WHERE tg_user_id=? AND is_active=1", (tg_user_id,))
@@ -172,15 +439,38 @@ class DB:
 
     # ---------- Payments ----------
     def add_payment(self, sender_tg_id, sender_wallet, recip_tg_id, recip_wallet, amount_usdc, status="PENDING"):
+        """amount_usdc is integer base units; floats are rejected rather than silently truncated."""
+        require_base_units(amount_usdc)
         return self.execute(
             "INSERT INTO payments (sender_tg_id, sender_wallet, recipient_tg_id, recipient_wallet, amount_usdc, status) "
             "VALUES (?,?,?,?,?,?)",
             (sender_tg_id, sender_wallet, recip_tg_id, recip_wallet, amount_usdc, status),
         )
 
+    def bulk_add_payments(self, payments) -> int:
+        """
+        payments: iterable of (sender_tg_id, sender_wallet, recip_tg_id, recip_wallet, amount_usdc, status),
+        amount_usdc in integer base units; a float anywhere rejects the whole batch.
+        """
+        payments = list(payments)
+        for row in payments:
+            require_base_units(row[4])
+        return self.insert_many(
+            "payments",
+            ("sender_tg_id", "sender_wallet", "recipient_tg_id", "recipient_wallet", "amount_usdc", "status"),
+            payments,
+        )
+
     def update_payment_status(self, payment_id, status, tx_sig=None):
         self.execute("UPDATE payments SET status=?, tx_signature=? WHERE id=?", (status, tx_sig, payment_id))
 
+    def update_payment_statuses(self, updates) -> int:
+        """updates: iterable of (payment_id, status, tx_sig); applied in one commit."""
+        return self.executemany(
+            "UPDATE payments SET status=?, tx_signature=COALESCE(?, tx_signature) WHERE id=?",
+            [(status, tx_sig, payment_id) for payment_id, status, tx_sig in updates],
+        )
+
     def get_payment(self, payment_id):
         return self.fetch_one("SELECT * FROM payments WHERE id=?", (payment_id,))
 
@@ -201,8 +491,109 @@ class DB:
             (requester_id, payer_id),
         )
 
-    def get_recent_requests(self, sender_id, recip_id):
+    def get_recent_requests(self, sender_id, recip_id, limit: int = 5):
+        return self.fetch_all(
+            "SELECT * FROM requests WHERE sender_id=? AND recip_id=? ORDER BY ts DESC LIMIT ?",
+            (sender_id, recip_id, limit),
+        )
+
+    # ---------- History ----------
+    # Pages are ordered newest first and continue from an opaque "ts:id" cursor
+    # (keyset pagination), so page N costs the same as page 1.
+    PAYMENT_SIDES = {"sent": ("sender_tg_id",), "received": ("recipient_tg_id",),
+                     "all": ("sender_tg_id", "recipient_tg_id")}
+    REQUEST_SIDES = {"sent": ("sender_id",), "received": ("recip_id",), "all": ("sender_id", "recip_id")}
+
+    @staticmethod
+    def _cursor(row: dict, ts_col: str) -> str:
+        return f"{row[ts_col]!r}:{row['id']}"
+
+    @staticmethod
+    def _parse_cursor(cursor: str):
+        try:
+            ts, rid = cursor.rsplit(":", 1)
+            return float(ts), int(rid)
+        except (AttributeError, ValueError):
+            raise ValueError(f"Invalid history cursor: {cursor!r}") from None
+
+    def _history_page(self, table: str, ts_col: str, cols, user_id: int, limit: int,
+                      cursor: str | None, where: str = "", params: tuple = ()):
+        if limit <= 0:
+            return []
+        order = f"ORDER BY {ts_col} DESC, id DESC LIMIT ?"
+        keyset, keyset_params = "", ()
+        if cursor is not None:
+            keyset, keyset_params = f" AND ({ts_col}, id) < (?, ?)", self._parse_cursor(cursor)
+        branches, args = [], []
+        for i, col in enumerate(cols):
+            # "all": a row where the user is on both sides only comes from the first branch
+            dedupe = f" AND {cols[0]} IS NOT {col}" if i else ""
+            branches.append(f"SELECT * FROM (SELECT * FROM {table} WHERE {col}=?{where}{keyset}{dedupe} {order})")
+            args += [user_id, *params, *keyset_params, limit]
+        if len(branches) == 1:
+            return self.fetch_all(branches[0], tuple(args))
+        return self.fetch_all(" UNION ALL ".join(branches) + f" {order}", (*args, limit))
+
+    def payment_history(self, tg_user_id: int, direction: str = "all", limit: int = 20,
+                        cursor: str | None = None, status: str | None = None):
+        """
+        One page of a user's payments (direction: "sent" | "received" | "all").
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        if direction not in self.PAYMENT_SIDES:
+            raise ValueError(f"Unknown direction: {direction}")
+        where, params = (" AND status=?", (status,)) if status else ("", ())
+        rows = self._history_page("payments", "created_ts", self.PAYMENT_SIDES[direction],
+                                  tg_user_id, limit, cursor, where, params)
+        return rows, (self._cursor(rows[-1], "created_ts") if len(rows) == limit else None)
+
+    def iter_payment_history(self, tg_user_id: int, direction: str = "all", status: str | None = None,
+                             page_size: int = 500):
+        """
+        Stream every matching payment, newest first, holding at most one page in
+        memory. Each page is its own short read, so no snapshot is held open.
+        """
+        cursor = None
+        while True:
+            rows, cursor = self.payment_history(tg_user_id, direction, page_size, cursor, status)
+            yield from rows
+            if cursor is None:
+                return
+
+    def request_history(self, tg_user_id: int, role: str = "all", limit: int = 20,
+                        cursor: str | None = None, fulfilled: bool | None = None):
+        """Requests the user made ("sent"), received, or both; same paging as payment_history."""
+        if role not in self.REQUEST_SIDES:
+            raise ValueError(f"Unknown role: {role}")
+        where, params = "", ()
+        if fulfilled is not None:
+            where = " AND fulfilled=1" if fulfilled else " AND (fulfilled IS NULL OR fulfilled=0)"
+        rows = self._history_page("requests", "ts", self.REQUEST_SIDES[role], tg_user_id, limit, cursor, where, params)
+        return rows, (self._cursor(rows[-1], "ts") if len(rows) == limit else None)
+
+    def iter_request_history(self, tg_user_id: int, role: str = "all", fulfilled: bool | None = None,
+                             page_size: int = 500):
+        cursor = None
+        while True:
+            rows, cursor = self.request_history(tg_user_id, role, page_size, cursor, fulfilled)
+            yield from rows
+            if cursor is None:
+                return
+
+    # ---------- Summaries ----------
+    def payment_summary(self, tg_user_id: int, since: str | None = None, until: str | None = None):
+        """Confirmed sent/received counts and base-unit totals per UTC day ("YYYY-MM-DD"), newest first."""
         return self.fetch_all(
-            "SELECT * FROM requests WHERE sender_id=? AND recip_id=? ORDER BY ts DESC LIMIT 5",
-            (sender_id, recip_id),
+            "SELECT day, sent_count, sent_total, received_count, received_total FROM payment_daily "
+            "WHERE tg_user_id=? AND day>=? AND day<=? ORDER BY day DESC",
+            (tg_user_id, since or "", until or "9999-12-31"),
+        )
+
+    def payment_totals(self, tg_user_id: int):
+        """All-time confirmed totals, summed from the per-day rows."""
+        return self.fetch_one(
+            "SELECT COUNT(*) AS days, COALESCE(SUM(sent_count), 0) AS sent_count, "
+            "COALESCE(SUM(sent_total), 0) AS sent_total, COALESCE(SUM(received_count), 0) AS received_count, "
+            "COALESCE(SUM(received_total), 0) AS received_total FROM payment_daily WHERE tg_user_id=?",
+            (tg_user_id,),
         )
@@ -0,0 +1,177 @@
+# core/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+# Upper bounds in seconds; covers sub-ms SQLite calls up to slow RPC timeouts.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopTimer()
+
+
+class _Timer:
+    __slots__ = ("m", "name", "key", "t0")
+
+    def __init__(self, m: "Metrics", name: str, key: LabelKey):
+        self.m, self.name, self.key = m, name, key
+
+    def __enter__(self):
+        self.m._gauge(f"{self.name}_in_flight", self.key, 1)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.m._observe(f"{self.name}_seconds", self.key, time.perf_counter() - self.t0)
+        self.m._gauge(f"{self.name}_in_flight", self.key, -1)
+        if exc_type is not None:
+            self.m._count(f"{self.name}_errors_total", self.key, 1)
+        return False
+
+
+class Metrics:
+    """
+    Process-wide latency histograms, counters and in-flight gauges.
+
+    Disabled by default: every recording call returns after one attribute check,
+    and timer() hands back a shared no-op context manager. Call enable() at
+    startup to collect; read with render_prometheus() or register sinks that
+    receive each observation as (name, labels, value).
+    """
+
+    def __init__(self, enabled: bool = False, buckets=DEFAULT_BUCKETS, prefix: str = "telepay_"):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._hist: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._sinks: List[Callable[[str, Dict[str, str], float], None]] = []
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def add_sink(self, sink: Callable[[str, Dict[str, str], float], None]):
+        self._sinks.append(sink)
+
+    def reset(self):
+        with self._lock:
+            self._hist.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    # ---------- recording ----------
+    def timer(self, name: str, **labels):
+        """`with metrics.timer("rpc", method=m):` -> <name>_seconds, <name>_in_flight, <name>_errors_total."""
+        if not self.enabled:
+            return _NOOP
+        return _Timer(self, name, tuple(sorted(labels.items())))
+
+    def observe(self, name: str, value: float, **labels):
+        if self.enabled:
+            self._observe(name, tuple(sorted(labels.items())), value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        if self.enabled:
+            self._count(name, tuple(sorted(labels.items())), amount)
+
+    def _observe(self, name: str, key: LabelKey, value: float):
+        with self._lock:
+            series = self._hist.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = _Histogram(self.buckets)
+            h.observe(value)
+        for sink in self._sinks:
+            sink(name, dict(key), value)
+
+    def _count(self, name: str, key: LabelKey, amount: float):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+        for sink in self._sinks:
+            sink(name, dict(key), amount)
+
+    def _gauge(self, name: str, key: LabelKey, delta: float):
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + delta
+
+    # ---------- export ----------
+    @staticmethod
+    def _labels(key: LabelKey, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in key]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render_prometheus(self) -> str:
+        """Text exposition format snapshot of everything recorded so far."""
+        out = []
+        with self._lock:
+            for name, series in sorted(self._hist.items()):
+                full = self.prefix + name
+                out.append(f"# TYPE {full} histogram")
+                for key, h in series.items():
+                    cum = 0
+                    for bound, n in zip(self.buckets, h.counts):
+                        cum += n
+                        le = self._labels(key, 'le="%s"' % bound)
+                        out.append(f"{full}_bucket{le} {cum}")
+                    le = self._labels(key, 'le="+Inf"')
+                    out.append(f"{full}_bucket{le} {h.count}")
+                    out.append(f"{full}_sum{self._labels(key)} {h.sum}")
+                    out.append(f"{full}_count{self._labels(key)} {h.count}")
+            for kind, table in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(table.items()):
+                    full = self.prefix + name
+                    out.append(f"# TYPE {full} {kind}")
+                    for key, v in series.items():
+                        out.append(f"{full}{self._labels(key)} {v}")
+        return "\n".join(out) + "\n"
+
+    def snapshot(self) -> Dict:
+        """count/sum/mean per histogram series, plus counters and gauges, as plain dicts."""
+        with self._lock:
+            hist = {
+                name: {self._labels(k) or "{}": {"count": h.count, "sum": h.sum, "mean": h.sum / h.count if h.count else 0.0}
+                       for k, h in series.items()}
+                for name, series in self._hist.items()
+            }
+            counters = {n: {self._labels(k) or "{}": v for k, v in s.items()} for n, s in self._counters.items()}
+            gauges = {n: {self._labels(k) or "{}": v for k, v in s.items()} for n, s in self._gauges.items()}
+        return {"histograms": hist, "counters": counters, "gauges": gauges}
+
+
+metrics = Metrics()
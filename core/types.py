@@ -1,6 +1,9 @@
 # core/types.py
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from core.amounts import from_base_units
 
 @dataclass
 class BuiltTx:
@@ -8,12 +11,26 @@ class BuiltTx:
     recent_blockhash: str
     sender_ata: str
     recipient_ata: str
+    last_valid_block_height: Optional[int] = None
+
+@dataclass
+class BuiltBatchTx:
+    unsigned_b64: str
+    recent_blockhash: str
+    sender_ata: str
+    transfers: List[Tuple[str, int]] = field(default_factory=list)  # (recipient wallet, base units)
+    created_atas: List[str] = field(default_factory=list)
+    last_valid_block_height: Optional[int] = None
 
 @dataclass
 class PayIntent:
     sender_tg_id: int
     recipient_tg_id: int
-    amount_ui: float
+    amount: int                # USDC base units (core.amounts.to_base_units)
     sender_wallet: str
     recipient_wallet: str
     pay_id: Optional[int] = None
+
+    @property
+    def amount_ui(self) -> Decimal:
+        return from_base_units(self.amount)
@@ -0,0 +1,142 @@
+# services/blockhash_provider.py
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from services.rpc import Rpc
+
+SLOT_SECONDS = 0.4  # target slot time; block height advances at most this fast
+
+LATEST_BLOCKHASH_CALLS = [
+    ("getLatestBlockhash", [{"commitment": "finalized"}]),
+    ("getBlockHeight", [{"commitment": "confirmed"}]),
+]
+
+@dataclass(frozen=True)
+class RecentBlockhash:
+    blockhash: str
+    last_valid_block_height: int
+    block_height: int      # chain height when fetched
+    fetched_at: float      # time.monotonic()
+
+    def est_block_height(self, now: float) -> int:
+        return self.block_height + int((now - self.fetched_at) / SLOT_SECONDS)
+
+    def blocks_left(self, now: float) -> int:
+        return self.last_valid_block_height - self.est_block_height(now)
+
+
+class BlockhashProvider:
+    """
+    Shared recent-blockhash source. A background thread keeps a hash fresh so
+    transaction builds never wait on getLatestBlockhash; a hash is only handed
+    out while it has more than `min_blocks_left` blocks of validity, so the user
+    still has time to sign and submit before it expires.
+    """
+
+    def __init__(self, rpc: Rpc, refresh_interval: float = 5.0, min_blocks_left: int = 60):
+        self.rpc = rpc
+        self.refresh_interval = refresh_interval
+        self.min_blocks_left = min_blocks_left
+        self._lock = threading.Lock()
+        self._current: Optional[RecentBlockhash] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._age_sum = 0.0
+        self._age_max = 0.0
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="blockhash-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                self.refresh_errors += 1
+            self._stop.wait(self.refresh_interval)
+
+    # ---------- fetching ----------
+    def store(self, results: List[Dict]) -> RecentBlockhash:
+        """Record the results of LATEST_BLOCKHASH_CALLS (e.g. from a larger batch)."""
+        latest, height = results
+        rb = RecentBlockhash(
+            blockhash=latest["value"]["blockhash"],
+            last_valid_block_height=int(latest["value"]["lastValidBlockHeight"]),
+            block_height=int(height),
+            fetched_at=time.monotonic(),
+        )
+        with self._lock:
+            self._current = rb
+            self.refreshes += 1
+        return rb
+
+    def refresh(self) -> RecentBlockhash:
+        return self.store(self.rpc.batch(LATEST_BLOCKHASH_CALLS))
+
+    def invalidate(self):
+        with self._lock:
+            self._current = None
+
+    # ---------- serving ----------
+    def _served(self, rb: RecentBlockhash, now: float, hit: bool) -> RecentBlockhash:
+        age = now - rb.fetched_at
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._age_sum += age
+            self._age_max = max(self._age_max, age)
+        return rb
+
+    def current(self) -> Optional[RecentBlockhash]:
+        """The cached hash if it is still safely valid, else None (counted as a miss by get())."""
+        rb = self._current
+        now = time.monotonic()
+        if rb is not None and rb.blocks_left(now) > self.min_blocks_left:
+            return self._served(rb, now, hit=True)
+        return None
+
+    def get(self) -> RecentBlockhash:
+        rb = self.current()
+        if rb is None:
+            rb = self._served(self.refresh(), time.monotonic(), hit=False)
+        return rb
+
+    def record_miss(self, rb: RecentBlockhash) -> RecentBlockhash:
+        """For callers that fetched via store() themselves after current() returned None."""
+        return self._served(rb, time.monotonic(), hit=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            served = self.hits + self.misses
+            rb = self._current
+            return {
+                "served": served,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / served if served else 0.0,
+                "avg_age_s": self._age_sum / served if served else 0.0,
+                "max_age_s": self._age_max,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "blocks_left": rb.blocks_left(time.monotonic()) if rb else None,
+            }
@@ -0,0 +1,215 @@
+# services/directory_cache.py
+import threading
+import time
+import weakref
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.cache import LRUCache
+from core.db import DB
+
+_MISSING = object()
+
+class DirectoryCache:
+    """
+    Read-through cache for "@username -> tg id -> active wallet" resolution,
+    shared by UserService and WalletService so the pay flow skips SQLite.
+
+    Entries (including "not found") live for `ttl` seconds and are dropped
+    eagerly by the services' write paths once the write has committed. With
+    `shared=True` every invalidation is also appended to the
+    cache_invalidations table, and other processes on the same database
+    replay new rows (id watermark) at most every `sync_interval` seconds.
+
+    While a read-through load is in flight its key carries a generation that
+    invalidations bump; the load only stores its result if the generation is
+    unchanged, so a load that raced an invalidation cannot put the stale row
+    back. Generations are dropped with the last load of the key, so they never
+    outnumber the loads in flight.
+    """
+
+    def __init__(self, db: DB, maxsize: int = 50_000, ttl: Optional[float] = 300.0,
+                 shared: bool = False, sync_interval: float = 1.0, retention: float = 3600.0):
+        self.db = db
+        self.users = LRUCache(maxsize, ttl)    # ("name", username) | ("id", tg_user_id) -> tg_user_id | None
+        self.wallets = LRUCache(maxsize, ttl)  # tg_user_id -> active wallet | None
+        self.seen = LRUCache(maxsize, ttl)     # tg_user_id -> username as stored (UserService.ensure_user)
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self.retention = retention
+        self.invalidations = 0  # entries invalidated by this process
+        self.replayed = 0       # rows applied by sync() (our own included)
+        self._sync_lock = threading.Lock()
+        self._next_sync = 0.0
+        self._watermark = 0
+        self._loading: Dict[Tuple[int, object], List[int]] = {}  # (id(cache), key) -> [loads, generation]
+        self._epoch = 0                                            # bumped by clear()/clear_users()
+        self._gen_lock = threading.Lock()
+        if shared:
+            row = self.db.fetch_one("SELECT MAX(id) AS id FROM cache_invalidations")
+            self._watermark = row["id"] or 0
+
+    _by_db: "weakref.WeakKeyDictionary[DB, DirectoryCache]" = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def for_db(cls, db: DB) -> "DirectoryCache":
+        """Default instance per DB, so services built separately still invalidate each other."""
+        cache = cls._by_db.get(db)
+        if cache is None:
+            cache = cls._by_db[db] = cls(db)
+        return cache
+
+    # ---------- lookups ----------
+    def _get(self, cache: LRUCache, key, load):
+        if self.shared:
+            self.sync()
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            gen = self._begin_load(cache, key)
+            value = _MISSING
+            try:
+                value = load()
+            finally:
+                self._end_load(cache, key, value, gen)
+        return value
+
+    def _begin_load(self, cache: LRUCache, key) -> Tuple[int, int]:
+        with self._gen_lock:
+            entry = self._loading.setdefault((id(cache), key), [0, 0])
+            entry[0] += 1
+            return self._epoch, entry[1]
+
+    def _end_load(self, cache: LRUCache, key, value, gen: Tuple[int, int]):
+        # the put is skipped if the key was invalidated while loading: the value may predate the write
+        k = (id(cache), key)
+        with self._gen_lock:
+            entry = self._loading[k]
+            if value is not _MISSING and (self._epoch, entry[1]) == gen:
+                cache.put(key, value)
+            entry[0] -= 1
+            if not entry[0]:
+                del self._loading[k]
+
+    def user_by_name(self, username: str, load) -> Optional[int]:
+        return self._get(self.users, ("name", username), load)
+
+    def user_by_id(self, tg_user_id: int, load) -> Optional[int]:
+        return self._get(self.users, ("id", tg_user_id), load)
+
+    def active_wallet(self, tg_user_id: int, load) -> Optional[str]:
+        return self._get(self.wallets, tg_user_id, load)
+
+    async def aget(self, cache: LRUCache, key, run, load, *args):
+        """_get for asyncio callers: `run` moves blocking work off the loop (AsyncDB.run_read)."""
+        if self.shared and time.monotonic() >= self._next_sync:
+            await run(self.sync)
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            gen = self._begin_load(cache, key)
+            value = _MISSING
+            try:
+                value = await run(load, *args)
+            finally:
+                self._end_load(cache, key, value, gen)
+        return value
+
+    # ---------- invalidation ----------
+    def invalidate_user(self, tg_user_id: int, *usernames: Optional[str]):
+        """Call after the write commits: drops the id entry and every given (old/new) username."""
+        keys = [("user_id", str(tg_user_id))] + [("user_name", u) for u in usernames if u]
+        self._drop(keys)
+        self.invalidations += len(keys)
+        self._publish(keys)
+
+    def invalidate_wallet(self, tg_user_id: int):
+        keys = [("wallet", str(tg_user_id))]
+        self._drop(keys)
+        self.invalidations += len(keys)
+        self._publish(keys)
+
+    async def ainvalidate_user(self, run_write, tg_user_id: int, *usernames: Optional[str]):
+        """invalidate_user for asyncio callers; the shared log insert goes through `run_write`."""
+        if self.shared:
+            await run_write(self.invalidate_user, tg_user_id, *usernames)
+        else:
+            self.invalidate_user(tg_user_id, *usernames)
+
+    async def ainvalidate_wallet(self, run_write, tg_user_id: int):
+        if self.shared:
+            await run_write(self.invalidate_wallet, tg_user_id)
+        else:
+            self.invalidate_wallet(tg_user_id)
+
+    def _drop(self, keys: Iterable[Tuple[str, str]]):
+        with self._gen_lock:
+            for scope, key in keys:
+                if scope == "user_name":
+                    self._discard(self.users, ("name", key))
+                elif scope == "user_id":
+                    self._discard(self.users, ("id", int(key)))
+                    self.seen.discard(int(key))
+                else:
+                    self._discard(self.wallets, int(key))
+
+    def _discard(self, cache: LRUCache, key):
+        # caller holds _gen_lock
+        entry = self._loading.get((id(cache), key))
+        if entry is not None:
+            entry[1] += 1
+        cache.discard(key)
+
+    def _publish(self, keys):
+        if self.shared:
+            now = time.time()
+            self.db.executemany(
+                "INSERT INTO cache_invalidations(scope, key, ts) VALUES (?,?,?)",
+                [(scope, key, now) for scope, key in keys],
+            )
+
+    def sync(self):
+        """Replay invalidations written by other processes; cheap no-op between intervals."""
+        now = time.monotonic()
+        if now < self._next_sync or not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sync = now + self.sync_interval
+            rows = self.db.fetch_all(
+                "SELECT id, scope, key FROM cache_invalidations WHERE id>? ORDER BY id", (self._watermark,)
+            )
+            if rows:
+                # our own rows come back too; dropping them again is harmless
+                self._drop((r["scope"], r["key"]) for r in rows)
+                self.replayed += len(rows)
+                self._watermark = rows[-1]["id"]
+        finally:
+            self._sync_lock.release()
+
+    def prune(self) -> int:
+        """Delete invalidation rows older than `retention`; run occasionally from one process."""
+        cutoff = time.time() - self.retention
+        with self.db.transaction():
+            n = self.db.fetch_one("SELECT COUNT(*) AS n FROM cache_invalidations WHERE ts<?", (cutoff,))["n"]
+            if n:
+                self.db.execute("DELETE FROM cache_invalidations WHERE ts<?", (cutoff,))
+        return n
+
+    def clear_users(self):
+        """Drop every user entry, e.g. after a bulk import that may answer cached misses."""
+        with self._gen_lock:
+            self._epoch += 1
+            self.users.clear()
+
+    def clear(self):
+        with self._gen_lock:
+            self._epoch += 1
+            self.users.clear()
+            self.wallets.clear()
+            self.seen.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "users": self.users.stats(),
+            "wallets": self.wallets.stats(),
+            "seen": self.seen.stats(),
+            "invalidations": self.invalidations,
+            "replayed": self.replayed,
+        }
@@ -0,0 +1,507 @@
+# services/payment_watcher.py
+import asyncio
+import itertools
+import json
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from websockets.asyncio.client import connect
+
+from core.db import DB
+from services.rpc import AsyncRpc
+from services.solana_service import MAX_MULTIPLE_ACCOUNTS, _token_amount
+from services.x402_service import X402Service
+
+# subscription key: ("account", pubkey) or ("signature", sig)
+SubKey = Tuple[str, str]
+
+def _token_delta(tx: Optional[Dict], account: str) -> Optional[int]:
+    """Net token change of `account` in a getTransaction result; None if the tx failed or does not touch it."""
+    meta = (tx or {}).get("meta")
+    if not meta or meta.get("err") is not None:
+        return None
+    keys = [k if isinstance(k, str) else k.get("pubkey") for k in tx["transaction"]["message"]["accountKeys"]]
+    loaded = meta.get("loadedAddresses") or {}
+    keys += loaded.get("writable", []) + loaded.get("readonly", [])
+    if account not in keys:
+        return None
+    index = keys.index(account)
+
+    def units(balances):
+        return next((int(b["uiTokenAmount"]["amount"]) for b in balances or () if b.get("accountIndex") == index), 0)
+
+    return units(meta.get("postTokenBalances")) - units(meta.get("preTokenBalances"))
+
+@dataclass(eq=False)  # identity: two invoices can carry identical fields
+class Expectation:
+    kind: str              # "payment" | "invoice"
+    ref_id: int
+    account: str           # recipient token account (ATA) the funds land in
+    amount: int            # USDC base units
+    signature: Optional[str] = None
+    created: float = 0.0
+    reference: Optional[str] = None  # Solana Pay reference pubkey carried by the payer's transfer
+
+
+class _WsConnection:
+    """
+    One multiplexed websocket carrying many subscriptions. Keeps the set of
+    wanted subscriptions and re-creates them after a reconnect.
+    """
+
+    def __init__(self, url: str, watcher: "PaymentWatcher"):
+        self.url = url
+        self.watcher = watcher
+        self.ws = None
+        self.connected = asyncio.Event()
+        self.wanted: Set[SubKey] = set()
+        self.subs: Dict[SubKey, int] = {}
+        self.by_sub: Dict[int, SubKey] = {}
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self.reconnects = 0
+
+    async def run(self):
+        backoff = 0.5
+        while True:
+            try:
+                async with connect(self.url, max_size=None, ping_interval=20, close_timeout=2) as ws:
+                    self.ws = ws
+                    self.subs.clear()
+                    self.by_sub.clear()
+                    self.connected.set()
+                    backoff = 0.5
+                    resub = asyncio.create_task(self._resubscribe())
+                    try:
+                        async for raw in ws:
+                            self._dispatch(json.loads(raw))
+                    finally:
+                        resub.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            finally:
+                self.connected.clear()
+                self.ws = None
+                for fut in self._pending.values():
+                    if not fut.done():
+                        fut.set_exception(ConnectionError("websocket closed"))
+                self._pending.clear()
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    async def _resubscribe(self):
+        keys = list(self.wanted)
+        await asyncio.gather(*(self._subscribe(k) for k in keys), return_exceptions=True)
+        accounts = [k[1] for k in keys if k[0] == "account"]
+        if accounts and self.reconnects:
+            # Anything that moved while we were disconnected shows up as a delta.
+            await self.watcher._sync_balances(accounts)
+
+    def _dispatch(self, msg: Dict):
+        if "id" in msg and msg["id"] in self._pending:
+            fut = self._pending.pop(msg["id"])
+            if not fut.done():
+                if "error" in msg:
+                    fut.set_exception(RuntimeError(f"WS error: {msg['error'].get('message', msg['error'])}"))
+                else:
+                    fut.set_result(msg.get("result"))
+            return
+        method = msg.get("method")
+        params = msg.get("params") or {}
+        key = self.by_sub.get(params.get("subscription"))
+        if key is None:
+            return
+        result = params.get("result") or {}
+        if method == "accountNotification":
+            self.watcher._on_account(key[1], result.get("value"), result.get("context", {}).get("slot", 0))
+        elif method == "signatureNotification":
+            # signature subscriptions end server-side after the first notification
+            self.wanted.discard(key)
+            self.by_sub.pop(params.get("subscription"), None)
+            self.subs.pop(key, None)
+            self.watcher._on_signature(key[1], result.get("value") or {})
+
+    async def request(self, method: str, params) -> object:
+        await self.connected.wait()
+        rid = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[rid] = fut
+        await self.ws.send(json.dumps({"jsonrpc": "2.0", "id": rid, "method": method, "params": params}))
+        return await asyncio.wait_for(fut, timeout=30)
+
+    async def _subscribe(self, key: SubKey):
+        kind, target = key
+        if kind == "account":
+            params = [target, {"encoding": "base64", "commitment": self.watcher.commitment}]
+        else:
+            params = [target, {"commitment": self.watcher.commitment}]
+        sub = await self.request(f"{kind}Subscribe", params)
+        if key in self.wanted:
+            self.subs[key] = sub
+            self.by_sub[sub] = key
+        else:  # dropped while the request was in flight
+            await self.request(f"{kind}Unsubscribe", [sub])
+
+    async def subscribe(self, key: SubKey):
+        if key in self.wanted:
+            return
+        self.wanted.add(key)
+        if self.connected.is_set():
+            await self._subscribe(key)
+
+    async def unsubscribe(self, key: SubKey):
+        self.wanted.discard(key)
+        sub = self.subs.pop(key, None)
+        if sub is not None:
+            self.by_sub.pop(sub, None)
+            if self.connected.is_set():
+                try:
+                    await self.request(f"{key[0]}Unsubscribe", [sub])
+                except (ConnectionError, RuntimeError, asyncio.TimeoutError):
+                    pass  # the subscription dies with the socket anyway
+
+
+class PaymentWatcher:
+    """
+    Push-based settlement. Register what you expect to arrive with
+    expect_payment()/expect_invoice(); the watcher subscribes to the recipient
+    token account (accountSubscribe) and, for payments with a known signature,
+    to the signature (signatureSubscribe). A signature notification settles or
+    fails its payment directly; balance changes never settle those.
+
+    A balance increase is matched by amount and reference. An expectation with
+    a Solana Pay `reference` settles only when getSignaturesForAddress(reference)
+    lists a successful transaction that, per getTransaction, moved exactly its
+    amount into its account (the reference is public, so listing alone proves
+    nothing). One without a reference settles only if it is the sole open
+    expectation of that amount on the account; otherwise the credit is
+    ambiguous and nothing is settled. Observed credits are a budget: each one
+    settles at most one expectation, and a transaction settles at most one.
+    Unexplained credits are re-checked every `sweep_interval`.
+
+    Expectations are dropped by cancel() or after `ttl` seconds (the sweep), so
+    abandoned payments and expired invoices do not hold subscriptions forever.
+    Results are written in bulk every `flush_interval` via
+    DB.update_payment_statuses and X402Service.mark_paid_many.
+
+    Subscriptions are sharded by account across `connections` websockets, so
+    tens of thousands of watched accounts share a handful of sockets. Register
+    expectations before the payer is shown the link: the account's starting
+    balance is read right after subscribing and later changes are deltas.
+    """
+
+    def __init__(self, ws_url: str, rpc: AsyncRpc, db: DB, x402: Optional[X402Service] = None,
+                 connections: int = 4, commitment: str = "confirmed", flush_interval: float = 0.5,
+                 ttl: Optional[float] = 3600.0, sweep_interval: float = 30.0):
+        self.rpc = rpc
+        self.db = db
+        self.x402 = x402
+        self.commitment = commitment
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.conns = [_WsConnection(ws_url, self) for _ in range(connections)]
+        self.expected: Dict[str, Deque[Expectation]] = {}   # account -> FIFO of open expectations
+        self.by_signature: Dict[str, Expectation] = {}
+        self.by_ref: Dict[Tuple[str, int], Expectation] = {}  # (kind, ref_id), in registration order
+        self._suspects: Set[str] = set()                      # accounts with credits not yet explained
+        self._credits: Dict[str, int] = {}                    # account -> observed credit not yet settled
+        self._claimed: Dict[str, Set[str]] = {}               # account -> signatures that settled something
+        self._background: Set[asyncio.Task] = set()
+        self._ref_checks: List[Expectation] = []
+        self.balances: Dict[str, Tuple[int, int]] = {}       # account -> (amount, slot)
+        self._payment_updates: List[tuple] = []
+        self._paid_invoices: List[int] = []
+        self._tasks: List[asyncio.Task] = []
+        self._baseline_waiters: List[Tuple[str, asyncio.Future]] = []
+        self.stats = {"notifications": 0, "matched": 0, "unmatched": 0, "ambiguous": 0, "failed": 0,
+                      "cancelled": 0, "expired": 0}
+
+    # ---------- lifecycle ----------
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(c.run()) for c in self.conns]
+            self._tasks.append(asyncio.create_task(self._flush_loop()))
+            self._tasks.append(asyncio.create_task(self._sweep_loop()))
+        return self
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        for t in self._background:
+            t.cancel()
+        await asyncio.gather(*self._tasks, *self._background, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+    def _conn(self, target: str) -> _WsConnection:
+        return self.conns[zlib.crc32(target.encode()) % len(self.conns)]
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    # ---------- registration ----------
+    async def expect_payment(self, payment_id: int, recipient_ata: str, amount: int, signature: Optional[str] = None,
+                             reference: Optional[str] = None):
+        exp = Expectation("payment", payment_id, recipient_ata, amount, signature, time.monotonic(), reference)
+        await self._expect(exp)
+        if signature:
+            self.by_signature[signature] = exp
+            await self._conn(signature).subscribe(("signature", signature))
+
+    async def expect_invoice(self, invoice_id: int, recipient_ata: str, amount: int, reference: Optional[str] = None):
+        await self._expect(Expectation("invoice", invoice_id, recipient_ata, amount, None, time.monotonic(), reference))
+
+    async def _expect(self, exp: Expectation):
+        old = self.by_ref.pop((exp.kind, exp.ref_id), None)
+        if old is not None:
+            self._forget(old)  # re-registration replaces the previous expectation
+        self.by_ref[(exp.kind, exp.ref_id)] = exp
+        queue = self.expected.get(exp.account)
+        if queue is None:
+            queue = self.expected[exp.account] = deque()
+            queue.append(exp)
+            await self._conn(exp.account).subscribe(("account", exp.account))
+            if exp.account not in self.balances:
+                await self._baseline(exp.account)
+        else:
+            queue.append(exp)
+
+    def cancel(self, kind: str, ref_id: int) -> bool:
+        """Stop watching a payment/invoice (abandoned, expired); False if it was not open."""
+        exp = self.by_ref.get((kind, ref_id))
+        if exp is None:
+            return False
+        self._forget(exp)
+        self.stats["cancelled"] += 1
+        return True
+
+    async def _baseline(self, account: str):
+        """
+        Coalesce baseline reads: every registration made in the same loop turn
+        shares one batched getMultipleAccounts round trip.
+        """
+        fut = asyncio.get_running_loop().create_future()
+        if not self._baseline_waiters:
+            asyncio.get_running_loop().call_soon(lambda: self._spawn(self._run_baselines()))
+        self._baseline_waiters.append((account, fut))
+        await fut
+
+    async def _run_baselines(self):
+        waiters, self._baseline_waiters = self._baseline_waiters, []
+        try:
+            await self._sync_balances(list(dict.fromkeys(a for a, _ in waiters)))
+        except asyncio.CancelledError:
+            for _, fut in waiters:
+                fut.cancel()
+            raise
+        except Exception as e:
+            for _, fut in waiters:
+                fut.set_exception(e)
+        else:
+            for _, fut in waiters:
+                fut.set_result(None)
+
+    async def _sync_balances(self, accounts: List[str]):
+        """Read current balances; the first read is a baseline, later ones are diffed like notifications."""
+        cfg = {"encoding": "base64", "commitment": self.commitment}
+        chunks = [accounts[i:i + MAX_MULTIPLE_ACCOUNTS] for i in range(0, len(accounts), MAX_MULTIPLE_ACCOUNTS)]
+        results = await self.rpc.batch([("getMultipleAccounts", [chunk, cfg]) for chunk in chunks])
+        for chunk, res in zip(chunks, results):
+            slot = res.get("context", {}).get("slot", 0)
+            for account, value in zip(chunk, res["value"]):
+                if account in self.balances:
+                    self._on_account(account, value, slot, counted=False)
+                else:
+                    self.balances[account] = (_token_amount(value) or 0, slot)
+
+    # ---------- notifications ----------
+    def _on_account(self, account: str, value: Optional[Dict], slot: int, counted: bool = True):
+        if counted:
+            self.stats["notifications"] += 1
+        amount = _token_amount(value) or 0
+        prev, prev_slot = self.balances.get(account, (None, 0))
+        if slot < prev_slot:
+            return  # stale
+        self.balances[account] = (amount, slot)
+        if prev is None or amount <= prev:
+            return
+        delta = amount - prev
+        queue = self.expected.get(account)
+        if not queue:
+            self.stats["unmatched"] += 1
+            return
+        credit = self._credits[account] = self._credits.get(account, 0) + delta
+        same = [e for e in queue if e.amount == delta]
+        # signature-tracked payments are settled by signatureSubscribe only
+        referenced = [e for e in queue if e.reference and not e.signature and e.amount <= credit]
+        untracked = [e for e in same if not e.signature and not e.reference]
+        if referenced:
+            self._queue_reference_check(referenced)
+        if len(same) == 1 and untracked:
+            self._consume(account, delta)
+            self._settle(same[0], ok=True)
+        elif untracked:
+            self.stats["ambiguous"] += 1
+        elif not same and not referenced:
+            self.stats["unmatched"] += 1
+
+    def _consume(self, account: str, amount: int, signature: Optional[str] = None):
+        """Charge a settlement against the account's observed credit (and its transaction)."""
+        if account in self._credits:
+            self._credits[account] = max(self._credits[account] - amount, 0)
+        if signature:
+            self._claimed.setdefault(account, set()).add(signature)
+
+    def _queue_reference_check(self, exps: List[Expectation]):
+        """Like _baseline: lookups queued in the same loop turn share batched round trips."""
+        if not self._ref_checks:
+            asyncio.get_running_loop().call_soon(lambda: self._spawn(self._run_reference_checks()))
+        self._ref_checks.extend(exps)
+
+    async def _run_reference_checks(self):
+        exps, self._ref_checks = list(dict.fromkeys(self._ref_checks)), []
+        await asyncio.gather(*(self._check_references(exps[i:i + MAX_MULTIPLE_ACCOUNTS])
+                               for i in range(0, len(exps), MAX_MULTIPLE_ACCOUNTS)))
+
+    async def _check_references(self, exps: List[Expectation]):
+        """
+        Settle the expectations whose reference shows a successful transaction
+        that moved exactly their amount into their account, as Solana Pay's
+        transfer validation does.
+        """
+        exps = [e for e in exps if self.by_ref.get((e.kind, e.ref_id)) is e]
+        if not exps:
+            return
+        cfg = {"limit": 10, "commitment": self.commitment}
+        tx_cfg = {"encoding": "json", "commitment": self.commitment, "maxSupportedTransactionVersion": 0}
+        try:
+            found = await self.rpc.batch([("getSignaturesForAddress", [e.reference, cfg]) for e in exps])
+            candidates = {exp: [s["signature"] for s in sigs or () if s.get("err") is None]
+                          for exp, sigs in zip(exps, found)}
+            sigs = list(dict.fromkeys(s for c in candidates.values() for s in c))
+            txs = dict(zip(sigs, await self.rpc.batch([("getTransaction", [s, tx_cfg]) for s in sigs]))) if sigs else {}
+        except Exception:
+            self._suspects.update(e.account for e in exps)
+            return
+        for exp in exps:
+            if self.by_ref.get((exp.kind, exp.ref_id)) is not exp:
+                continue
+            claimed = self._claimed.get(exp.account, set())
+            sig = next((s for s in candidates[exp] if s not in claimed and s not in self.by_signature
+                        and _token_delta(txs.get(s), exp.account) == exp.amount), None)
+            if sig is None or self._credits.get(exp.account, 0) < exp.amount:
+                self._suspects.add(exp.account)  # not indexed / not credited yet; the sweep looks again
+                continue
+            self._consume(exp.account, exp.amount, sig)
+            exp.signature = sig
+            self._settle(exp, ok=True)
+
+    def _on_signature(self, signature: str, value: Dict):
+        self.stats["notifications"] += 1
+        exp = self.by_signature.get(signature)
+        if exp is not None:
+            ok = value.get("err") is None
+            if ok:
+                self._consume(exp.account, exp.amount, signature)
+            self._settle(exp, ok=ok)
+
+    def _settle(self, exp: Expectation, ok: bool):
+        if not self._forget(exp):
+            return
+        if exp.kind == "payment":
+            self._payment_updates.append((exp.ref_id, "CONFIRMED" if ok else "FAILED", exp.signature))
+        elif ok:
+            self._paid_invoices.append(exp.ref_id)
+        self.stats["matched" if ok else "failed"] += 1
+
+    def _forget(self, exp: Expectation) -> bool:
+        """Drop an open expectation and any subscription only it needed; False if already gone."""
+        if self.by_ref.get((exp.kind, exp.ref_id)) is not exp:
+            return False
+        del self.by_ref[(exp.kind, exp.ref_id)]
+        queue = self.expected.get(exp.account)
+        if queue is not None and exp in queue:
+            queue.remove(exp)
+            if not queue:
+                del self.expected[exp.account]
+                self.balances.pop(exp.account, None)
+                self._credits.pop(exp.account, None)
+                self._claimed.pop(exp.account, None)
+                self._suspects.discard(exp.account)
+                self._spawn(self._conn(exp.account).unsubscribe(("account", exp.account)))
+        if exp.signature and self.by_signature.get(exp.signature) is exp:
+            del self.by_signature[exp.signature]
+            self._spawn(self._conn(exp.signature).unsubscribe(("signature", exp.signature)))
+        return True
+
+    # ---------- sweep ----------
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+
+    async def sweep(self):
+        """Expire expectations older than `ttl`, then re-check references behind unexplained credits."""
+        if self.ttl is not None:
+            cutoff = time.monotonic() - self.ttl
+            stale = []
+            for exp in self.by_ref.values():  # registration order, so oldest first
+                if exp.created > cutoff:
+                    break
+                stale.append(exp)
+            for exp in stale:
+                self._forget(exp)
+            self.stats["expired"] += len(stale)
+        suspects, self._suspects = self._suspects, set()
+        recheck = [e for a in suspects for e in self.expected.get(a, ()) if e.reference and not e.signature]
+        if recheck:
+            await self._check_references(recheck)
+
+    # ---------- persistence ----------
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+
+    async def flush(self):
+        """Write settled payments and invoices; whatever did not commit is re-queued in front."""
+        payments, self._payment_updates = self._payment_updates, []
+        invoices, self._paid_invoices = self._paid_invoices, []
+        try:
+            if payments:
+                await asyncio.to_thread(self.db.update_payment_statuses, payments)
+                payments = []
+            if invoices and self.x402 is not None:
+                await asyncio.to_thread(self.x402.mark_paid_many, invoices)
+            invoices = []
+        finally:
+            self._payment_updates[:0] = payments
+            self._paid_invoices[:0] = invoices
+
+    def snapshot(self) -> Dict:
+        return dict(
+            self.stats,
+            watched_accounts=len(self.expected),
+            watched_signatures=len(self.by_signature),
+            subscriptions=sum(len(c.subs) for c in self.conns),
+            reconnects=sum(c.reconnects for c in self.conns),
+        )
@@ -1,27 +1,97 @@
 # services/rpc.py
+import itertools
+import httpx
 import requests
-from typing import Any, Dict, Optional
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.amounts import from_base_units
+from core.metrics import metrics
+
+# A batch is a list of (method, params) pairs sent as one JSON-RPC array.
+Call = Tuple[str, Any]
+
+def _payload(calls: Sequence[Call]) -> List[Dict]:
+    return [{"jsonrpc": "2.0", "id": i, "method": m, "params": p} for i, (m, p) in enumerate(calls)]
+
+def _order_batch(calls: Sequence[Call], replies: Any) -> List[Dict]:
+    """Servers may answer a batch in any order; line replies back up with calls by id."""
+    if not isinstance(replies, list):
+        # A malformed batch gets a single error object back
+        raise RuntimeError(f"RPC batch rejected: {replies.get('error', replies)}")
+    by_id = {r.get("id"): r for r in replies}
+    return [by_id.get(i, {"error": {"message": "missing reply"}}) for i in range(len(calls))]
+
+class RpcError(RuntimeError):
+    """A JSON-RPC error reply; keeps the code and data (e.g. the preflight `err`) for callers that classify."""
+
+    def __init__(self, method: str, error: Dict):
+        super().__init__(f"RPC error in {method}: {error.get('message', str(error))}")
+        self.method = method
+        self.code = error.get("code")
+        self.data = error.get("data")
+
+def _unwrap(method: str, j: Dict) -> Any:
+    if "error" in j:
+        metrics.inc("rpc_errors_total", method=method)
+        raise RpcError(method, j["error"])
+    return j["result"]
+
+def _first_token_account(res: Dict) -> Optional[str]:
+    arr = res.get("value", [])
+    if not arr:
+        return None
+    return arr[0]["pubkey"]
+
+def _token_balance(res: Dict) -> int:
+    # "amount" is the exact base-unit string; uiAmount is a lossy float
+    return int(res["value"]["amount"])
+
+def _token_balance_ui(res: Dict) -> float:
+    v = res["value"]
+    return float(from_base_units(int(v["amount"]), v.get("decimals", 0)))
+
 
 class Rpc:
-    def __init__(self, url: str):
+    """
+    Blocking client. Keeps a pooled requests.Session so repeated calls reuse
+    the same TCP+TLS connection instead of handshaking every time.
+    """
+
+    def __init__(self, url: str, timeout: float = 25, pool_size: int = 16):
         self.url = url
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
-    def _raw(self, method: str, params: Any) -> Dict:
-        r = requests.post(
-            self.url,
-            json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params},
-            timeout=25,
-        )
+    def close(self):
+        self.session.close()
+
+    def _post(self, body: Any) -> Any:
+        r = self.session.post(self.url, json=body, timeout=self.timeout)
         r.raise_for_status()
         return r.json()
 
+    def _raw(self, method: str, params: Any) -> Dict:
+        with metrics.timer("rpc", method=method):
+            return self._post({"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params})
+
     def call(self, method: str, params: Any) -> Dict:
-        j = self._raw(method, params)
-        if "error" in j:
-            err = j["error"]
-            msg = err.get("message", str(err))
-            raise RuntimeError(f"RPC error in {method}: {msg}")
-        return j["result"]
+        return _unwrap(method, self._raw(method, params))
+
+    def batch_raw(self, calls: Sequence[Call]) -> List[Dict]:
+        """One POST for all calls; returns the raw reply objects in call order."""
+        if not calls:
+            return []
+        with metrics.timer("rpc", method="batch"):
+            return _order_batch(calls, self._post(_payload(calls)))
+
+    def batch(self, calls: Sequence[Call]) -> List[Any]:
+        """Like call() for several methods at once; raises on the first error."""
+        return [_unwrap(m, j) for (m, _), j in zip(calls, self.batch_raw(calls))]
 
     def get_latest_blockhash(self) -> str:
         res = self.call("getLatestBlockhash", [{"commitment": "finalized"}])
@@ -36,6 +106,11 @@ class Rpc:
         except Exception:
             return None
 
+    def get_multiple_accounts(self, pubkeys: List[str], commitment: str = "processed") -> List[Optional[Dict]]:
+        """Account values (None where missing) for up to 100 pubkeys in one call."""
+        res = self.call("getMultipleAccounts", [pubkeys, {"encoding": "base64", "commitment": commitment}])
+        return res["value"]
+
     def get_balance_lamports(self, pubkey: str) -> int:
         res = self.call("getBalance", [pubkey, {"commitment": "processed"}])
         return int(res["value"])
@@ -43,16 +118,17 @@ class Rpc:
     def get_token_account_by_owner(self, owner: str, mint: str) -> Optional[str]:
         """Return first token account address for (owner, mint) if any."""
         res = self.call("getTokenAccountsByOwner", [owner, {"mint": mint}, {"encoding": "jsonParsed"}])
-        arr = res.get("value", [])
-        if not arr:
-            return None
-        return arr[0]["pubkey"]
+        return _first_token_account(res)
+
+    def get_token_balance(self, token_account: str) -> int:
+        """Exact balance in base units. Prefer decoding get_multiple_accounts data when batching."""
+        res = self.call("getTokenAccountBalance", [token_account, {"commitment": "processed"}])
+        return _token_balance(res)
 
     def get_token_balance_ui(self, token_account: str) -> float:
+        """Display-only; use get_token_balance for comparisons."""
         res = self.call("getTokenAccountBalance", [token_account, {"commitment": "processed"}])
-        v = res["value"]
-        # uiAmountString is accurate and avoids float rounding
-        return float(v.get("uiAmount", v.get("uiAmountString", "0")))
+        return _token_balance_ui(res)
 
     def send_raw_transaction(self, raw_base64: str) -> str:
         # IMPORTANT: base64
@@ -61,3 +137,87 @@ class Rpc:
             [raw_base64, {"encoding": "base64", "skipPreflight": False, "maxRetries": 3}],
         )
         return res
+
+
+class AsyncRpc:
+    """
+    asyncio counterpart of Rpc for FastAPI / bot handlers. Same methods, awaited,
+    over one keep-alive httpx.AsyncClient.
+    """
+
+    def __init__(self, url: str, timeout: float = 25, pool_size: int = 16):
+        self.url = url
+        self._ids = itertools.count(1)
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _post(self, body: Any) -> Any:
+        r = await self.client.post(self.url, json=body)
+        r.raise_for_status()
+        return r.json()
+
+    async def _raw(self, method: str, params: Any) -> Dict:
+        with metrics.timer("rpc", method=method):
+            return await self._post({"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params})
+
+    async def call(self, method: str, params: Any) -> Dict:
+        return _unwrap(method, await self._raw(method, params))
+
+    async def batch_raw(self, calls: Sequence[Call]) -> List[Dict]:
+        if not calls:
+            return []
+        with metrics.timer("rpc", method="batch"):
+            return _order_batch(calls, await self._post(_payload(calls)))
+
+    async def batch(self, calls: Sequence[Call]) -> List[Any]:
+        return [_unwrap(m, j) for (m, _), j in zip(calls, await self.batch_raw(calls))]
+
+    async def get_latest_blockhash(self) -> str:
+        res = await self.call("getLatestBlockhash", [{"commitment": "finalized"}])
+        return res["value"]["blockhash"]
+
+    async def get_account_info(self, pubkey: str) -> Optional[Dict]:
+        try:
+            j = await self._raw("getAccountInfo", [pubkey, {"encoding": "base64"}])
+            if "error" in j:
+                return None
+            return j.get("result", {}).get("value")
+        except Exception:
+            return None
+
+    async def get_multiple_accounts(self, pubkeys: List[str], commitment: str = "processed") -> List[Optional[Dict]]:
+        res = await self.call("getMultipleAccounts", [pubkeys, {"encoding": "base64", "commitment": commitment}])
+        return res["value"]
+
+    async def get_balance_lamports(self, pubkey: str) -> int:
+        res = await self.call("getBalance", [pubkey, {"commitment": "processed"}])
+        return int(res["value"])
+
+    async def get_token_account_by_owner(self, owner: str, mint: str) -> Optional[str]:
+        res = await self.call("getTokenAccountsByOwner", [owner, {"mint": mint}, {"encoding": "jsonParsed"}])
+        return _first_token_account(res)
+
+    async def get_token_balance(self, token_account: str) -> int:
+        res = await self.call("getTokenAccountBalance", [token_account, {"commitment": "processed"}])
+        return _token_balance(res)
+
+    async def get_token_balance_ui(self, token_account: str) -> float:
+        res = await self.call("getTokenAccountBalance", [token_account, {"commitment": "processed"}])
+        return _token_balance_ui(res)
+
+    async def send_raw_transaction(self, raw_base64: str) -> str:
+        return await self.call(
+            "sendTransaction",
+            [raw_base64, {"encoding": "base64", "skipPreflight": False, "maxRetries": 3}],
+        )
@@ -0,0 +1,321 @@
+# services/rpc_router.py
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence
+
+from core.metrics import metrics
+from services.rpc import AsyncRpc, Rpc
+
+# Never hedged or duplicated across nodes: one healthy node gets the write.
+WRITE_METHODS = frozenset({"sendTransaction"})
+
+# JSON-RPC errors meaning "this node cannot serve it right now" (behind, block/slot
+# not available, min context slot not reached, internal error). They count as
+# node failures and fail over; request errors (bad params, failed simulation)
+# would get the same answer anywhere and are returned as-is.
+NODE_ERROR_CODES = frozenset({-32004, -32005, -32007, -32009, -32014, -32016, -32603})
+
+ERROR_PENALTY = 20.0      # score multiplier per unit of error EWMA
+MIN_SAMPLES_FOR_P95 = 20
+
+def _is_write(body: Any) -> bool:
+    reqs = body if isinstance(body, list) else [body]
+    return any(r.get("method") in WRITE_METHODS for r in reqs)
+
+def _node_error(reply: Any) -> Optional[Dict]:
+    """The first node-side error in a reply (each item of a batch is checked)."""
+    for r in reply if isinstance(reply, list) else [reply]:
+        err = r.get("error") if isinstance(r, dict) else None
+        if isinstance(err, dict) and err.get("code") in NODE_ERROR_CODES:
+            return err
+    return None
+
+def _give_up(last: Exception) -> Any:
+    # every node answered with a node error: hand back the last reply so the
+    # caller unwraps it exactly as it would from a single Rpc
+    if isinstance(last, NodeError):
+        return last.reply
+    raise last
+
+
+class NodeError(RuntimeError):
+    """A node replied, but with a node-side JSON-RPC error; carries the reply."""
+
+    def __init__(self, reply: Any, error: Dict):
+        super().__init__(f"RPC node error {error.get('code')}: {error.get('message', error)}")
+        self.reply = reply
+
+
+def _throttle_info(exc: Exception):
+    """(is_429, Retry-After seconds or None) for requests/httpx HTTP errors."""
+    resp = getattr(exc, "response", None)
+    if resp is None or getattr(resp, "status_code", None) != 429:
+        return False, None
+    try:
+        return True, float(resp.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return True, None
+
+
+class _Endpoint:
+    """Health of one node: latency/error EWMAs, a latency window for p95, 429 backoff."""
+
+    def __init__(self, url: str, client, alpha: float, window: int):
+        self.url = url
+        self.client = client
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.errors = 0.0
+        self.samples = deque(maxlen=window)
+        self.backoff = 0.0
+        self.backoff_until = 0.0
+        self.in_flight = 0
+        self.requests = self.failures = self.throttled = 0
+        self.lock = threading.Lock()
+
+    def score(self, now: float) -> float:
+        """Lower is better. Untried nodes score lowest so they get probed."""
+        if now < self.backoff_until:
+            return float("inf")
+        return ((self.latency or 0.0) + 0.001) * (1 + ERROR_PENALTY * self.errors) * (1 + self.in_flight)
+
+    def p95(self) -> Optional[float]:
+        with self.lock:
+            if len(self.samples) < MIN_SAMPLES_FOR_P95:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[int(len(ordered) * 0.95)]
+
+    def _update(self, dt: float, failed: bool):
+        a = self.alpha
+        self.latency = dt if self.latency is None else (1 - a) * self.latency + a * dt
+        self.errors = (1 - a) * self.errors + a * (1.0 if failed else 0.0)
+
+    def succeeded(self, dt: float):
+        with self.lock:
+            self.requests += 1
+            self._update(dt, False)
+            self.samples.append(dt)
+            self.backoff = 0.0
+        metrics.observe("rpc_endpoint_seconds", dt, endpoint=self.url)
+
+    def failed(self, dt: float, exc: Exception):
+        throttled, retry_after = _throttle_info(exc)
+        with self.lock:
+            self.requests += 1
+            self.failures += 1
+            self._update(dt, True)
+            if throttled:
+                self.throttled += 1
+                self.backoff = retry_after if retry_after is not None else min(max(self.backoff * 2, 0.5), 30.0)
+                self.backoff_until = time.monotonic() + self.backoff
+        metrics.inc("rpc_endpoint_errors_total", endpoint=self.url, kind="429" if throttled else "error")
+
+    def health(self) -> Dict:
+        return {
+            "latency_ewma": self.latency,
+            "error_ewma": round(self.errors, 4),
+            "p95": self.p95(),
+            "requests": self.requests,
+            "failures": self.failures,
+            "throttled": self.throttled,
+            "backed_off": time.monotonic() < self.backoff_until,
+        }
+
+
+class _Routing:
+    """Endpoint ranking and hedge timing shared by RpcRouter and AsyncRpcRouter."""
+
+    def _init_routing(self, urls: Sequence[str], make_client, hedge_after: Optional[float],
+                      min_hedge_delay: float, max_hedges: int, alpha: float, window: int):
+        if not urls:
+            raise ValueError("RpcRouter needs at least one endpoint.")
+        self.endpoints = [_Endpoint(u, make_client(u), alpha, window) for u in urls]
+        self.url = self.endpoints[0].url
+        self.hedge_after = hedge_after
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedges = max_hedges
+        self._ids = itertools.count(1)
+
+    def _ranked(self) -> List[_Endpoint]:
+        now = time.monotonic()
+        # stable sort keeps configuration order among equals
+        ranked = sorted(self.endpoints, key=lambda e: e.score(now))
+        if all(now < e.backoff_until for e in ranked):
+            ranked.sort(key=lambda e: e.backoff_until)  # everyone throttled: least-recently limited first
+        return ranked
+
+    def _hedge_delay(self, ep: _Endpoint) -> float:
+        if self.hedge_after is not None:
+            return self.hedge_after
+        p95 = ep.p95()
+        return max(p95 if p95 is not None else 0.5, self.min_hedge_delay)
+
+    def health(self) -> Dict[str, Dict]:
+        return {e.url: e.health() for e in self.endpoints}
+
+
+class RpcRouter(_Routing, Rpc):
+    """
+    Drop-in Rpc over several nodes. Reads go to the best-scoring endpoint
+    (latency EWMA, penalised by error EWMA and in-flight load; nodes that
+    answered 429 sit out their Retry-After). If no reply arrives within that
+    node's p95 (or `hedge_after`), the same read is sent to the next node and
+    the first success wins; failures, including HTTP 200 replies carrying a
+    NODE_ERROR_CODES error, fall over to the next node.
+    sendTransaction is never hedged: it goes to the healthiest node and only
+    moves on if that node fails.
+    """
+
+    def __init__(self, urls: Sequence[str], timeout: float = 10, pool_size: int = 16,
+                 hedge_after: Optional[float] = None, min_hedge_delay: float = 0.02,
+                 max_hedges: int = 1, alpha: float = 0.2, window: int = 256):
+        self.timeout = timeout
+        self._init_routing(urls, lambda u: Rpc(u, timeout=timeout, pool_size=pool_size),
+                           hedge_after, min_hedge_delay, max_hedges, alpha, window)
+        self._pool = ThreadPoolExecutor(max_workers=pool_size * len(self.endpoints),
+                                        thread_name_prefix="rpc-router")
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        for e in self.endpoints:
+            e.client.close()
+
+    @staticmethod
+    def _attempt(ep: _Endpoint, body: Any) -> Any:
+        t0 = time.perf_counter()
+        with ep.lock:
+            ep.in_flight += 1
+        try:
+            out = ep.client._post(body)
+            err = _node_error(out)
+            if err is not None:
+                raise NodeError(out, err)
+        except Exception as e:
+            ep.failed(time.perf_counter() - t0, e)
+            raise
+        else:
+            ep.succeeded(time.perf_counter() - t0)
+            return out
+        finally:
+            with ep.lock:
+                ep.in_flight -= 1
+
+    def _post(self, body: Any) -> Any:
+        ranked = self._ranked()
+        if _is_write(body):
+            last = None
+            for ep in ranked:
+                try:
+                    return self._attempt(ep, body)
+                except Exception as e:
+                    last = e
+                    metrics.inc("rpc_failovers_total")
+            return _give_up(last)
+
+        queue = deque(ranked)
+        delay = self._hedge_delay(queue[0])
+        pending = {self._pool.submit(self._attempt, queue.popleft(), body)}
+        hedges, last = 0, None
+        while pending:
+            can_hedge = queue and hedges < self.max_hedges
+            done, pending = wait(pending, timeout=delay if can_hedge else None, return_when=FIRST_COMPLETED)
+            if not done:
+                hedges += 1
+                metrics.inc("rpc_hedges_total")
+                pending.add(self._pool.submit(self._attempt, queue.popleft(), body))
+                continue
+            won = [f for f in done if f.exception() is None]
+            if won:
+                return won[0].result()
+            last = next(iter(done)).exception()
+            if not pending and queue:
+                metrics.inc("rpc_failovers_total")
+                pending.add(self._pool.submit(self._attempt, queue.popleft(), body))
+        return _give_up(last)
+
+
+class AsyncRpcRouter(_Routing, AsyncRpc):
+    """asyncio counterpart of RpcRouter with the same routing, hedging and failover rules."""
+
+    def __init__(self, urls: Sequence[str], timeout: float = 10, pool_size: int = 16,
+                 hedge_after: Optional[float] = None, min_hedge_delay: float = 0.02,
+                 max_hedges: int = 1, alpha: float = 0.2, window: int = 256):
+        self._init_routing(urls, lambda u: AsyncRpc(u, timeout=timeout, pool_size=pool_size),
+                           hedge_after, min_hedge_delay, max_hedges, alpha, window)
+        self._losers = set()  # hedge losers left running so their latency is still recorded
+
+    async def aclose(self):
+        for t in self._losers:
+            t.cancel()
+        await asyncio.gather(*self._losers, return_exceptions=True)
+        for e in self.endpoints:
+            await e.client.aclose()
+
+    @staticmethod
+    async def _attempt(ep: _Endpoint, body: Any) -> Any:
+        t0 = time.perf_counter()
+        ep.in_flight += 1
+        try:
+            out = await ep.client._post(body)
+            err = _node_error(out)
+            if err is not None:
+                raise NodeError(out, err)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            ep.failed(time.perf_counter() - t0, e)
+            raise
+        else:
+            ep.succeeded(time.perf_counter() - t0)
+            return out
+        finally:
+            ep.in_flight -= 1
+
+    def _spawn(self, ep: _Endpoint, body: Any) -> asyncio.Task:
+        return asyncio.ensure_future(self._attempt(ep, body))
+
+    async def _post(self, body: Any) -> Any:
+        ranked = self._ranked()
+        if _is_write(body):
+            last = None
+            for ep in ranked:
+                try:
+                    return await self._attempt(ep, body)
+                except Exception as e:
+                    last = e
+                    metrics.inc("rpc_failovers_total")
+            return _give_up(last)
+
+        queue = deque(ranked)
+        delay = self._hedge_delay(queue[0])
+        pending = {self._spawn(queue.popleft(), body)}
+        hedges, last = 0, None
+        try:
+            while pending:
+                can_hedge = queue and hedges < self.max_hedges
+                done, pending = await asyncio.wait(
+                    pending, timeout=delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedges += 1
+                    metrics.inc("rpc_hedges_total")
+                    pending.add(self._spawn(queue.popleft(), body))
+                    continue
+                won = [t for t in done if t.exception() is None]  # reads every exception
+                if won:
+                    return won[0].result()
+                last = next(iter(done)).exception()
+                if not pending and queue:
+                    metrics.inc("rpc_failovers_total")
+                    pending.add(self._spawn(queue.popleft(), body))
+            return _give_up(last)
+        finally:
+            for t in pending:
+                self._losers.add(t)
+                t.add_done_callback(self._losers.discard)
+                t.add_done_callback(lambda t: t.cancelled() or t.exception())  # consume errors
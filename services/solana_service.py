@@ -1,6 +1,7 @@
 # services/solana_service.py
-from typing import List
-from base64 import b64encode
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from base64 import b64decode, b64encode
 
 from solders.pubkey import Pubkey
 from solders.instruction import Instruction, AccountMeta
@@ -8,9 +9,14 @@ from solders.message import MessageV0
 from solders.hash import Hash
 from solders.transaction import VersionedTransaction
 from solders.null_signer import NullSigner
+from solders.address_lookup_table_account import AddressLookupTable, AddressLookupTableAccount
 
 from services.rpc import Rpc
-from core.types import BuiltTx
+from services.blockhash_provider import BlockhashProvider, RecentBlockhash, LATEST_BLOCKHASH_CALLS
+from core.amounts import USDC_DECIMALS, format_units, require_base_units
+from core.types import BuiltTx, BuiltBatchTx
+from core.cache import LRUCache
+from core.metrics import metrics
 from core.config import USDC_MINT
 
 TOKEN_PROGRAM_ID = Pubkey.from_string("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA")
@@ -18,12 +24,31 @@ ASSOCIATED_TOKEN_PROGRAM_ID = Pubkey.from_string("ATokenGPvbdGVxr1b2hvZbsiqW5xWH
 SYSTEM_PROGRAM_ID = Pubkey.from_string("11111111111111111111111111111111")
 RENT_SYSVAR_ID = Pubkey.from_string("SysvarRent111111111111111111111111111111111")
 
-USDC_DECIMALS = 6
 MIN_LAMPORTS_FOR_FEES = 2000000  # ~0.002 SOL buffer for fee + small rent
+ATA_RENT_LAMPORTS = 2039280      # rent-exempt minimum for a 165-byte token account
+PACKET_DATA_SIZE = 1232          # max serialized transaction size
+MAX_MULTIPLE_ACCOUNTS = 100      # getMultipleAccounts limit per call
+
+# SPL token account layout: mint[0:32] owner[32:64] amount[64:72] (u64 LE) ...
+TOKEN_ACCOUNT_AMOUNT = slice(64, 72)
+
+# Placeholder amount compiled into transfer templates, then located in the bytes.
+TEMPLATE_AMOUNT_SENTINEL = 0xA5C35A3C5AA5C33C
 
 def _u64_le(n: int) -> bytes:
     return n.to_bytes(8, byteorder="little", signed=False)
 
+def _token_amount(account: Optional[Dict]) -> Optional[int]:
+    """Raw base-unit balance decoded from a base64 getAccountInfo value; None if no token account."""
+    if account is None:
+        return None
+    data = b64decode(account["data"][0])
+    if len(data) < TOKEN_ACCOUNT_AMOUNT.stop:
+        return None
+    return int.from_bytes(data[TOKEN_ACCOUNT_AMOUNT], "little")
+
+# find_program_address is a loop of SHA-256 + curve checks; (owner, mint) -> ATA never changes.
+@lru_cache(maxsize=65536)
 def _get_associated_token_address(owner: Pubkey, mint: Pubkey) -> Pubkey:
     ata, _ = Pubkey.find_program_address(
         [bytes(owner), bytes(TOKEN_PROGRAM_ID), bytes(mint)],
@@ -54,68 +79,304 @@ def _ix_transfer_checked(source: Pubkey, mint: Pubkey, dest: Pubkey, owner: Pubk
     ]
     return Instruction(TOKEN_PROGRAM_ID, data, metas)
 
+@lru_cache(maxsize=64)
+def _blockhash_bytes(blockhash: str) -> bytes:
+    return bytes(Hash.from_string(blockhash))
+
+class _TxTemplate:
+    """
+    A serialized single-transfer transaction with known offsets for the u64
+    TransferChecked amount and the recent blockhash. Everything else (keys,
+    header, instruction layout) depends only on the template key.
+    """
+    __slots__ = ("raw", "amount_at", "blockhash_at")
+
+    def __init__(self, raw: bytes, amount_at: int, blockhash_at: int):
+        self.raw, self.amount_at, self.blockhash_at = raw, amount_at, blockhash_at
+
+    @classmethod
+    def locate(cls, raw: bytes, blockhash: str) -> Optional["_TxTemplate"]:
+        """None if either placeholder is not unique in `raw` (then just compile normally)."""
+        amount, bh = _u64_le(TEMPLATE_AMOUNT_SENTINEL), _blockhash_bytes(blockhash)
+        if raw.count(amount) != 1 or raw.count(bh) != 1:
+            return None
+        return cls(raw, raw.index(amount), raw.index(bh))
+
+    def render(self, amount: int, blockhash: str) -> bytes:
+        buf = bytearray(self.raw)
+        buf[self.amount_at:self.amount_at + 8] = _u64_le(amount)
+        buf[self.blockhash_at:self.blockhash_at + 32] = _blockhash_bytes(blockhash)
+        return bytes(buf)
+
 class SolanaService:
-    def __init__(self, rpc: Rpc, usdc_mint: str = USDC_MINT):
+    def __init__(self, rpc: Rpc, usdc_mint: str = USDC_MINT, blockhashes: Optional[BlockhashProvider] = None):
         self.rpc = rpc
         self.usdc_mint = Pubkey.from_string(usdc_mint)
+        # Share one provider (and start() it) across services to keep hashes warm in the background.
+        self.blockhashes = blockhashes or BlockhashProvider(rpc)
+        # ATAs seen on-chain. Token accounts are almost never closed, so a positive
+        # sighting is trusted until a send touching the account fails.
+        self.known_atas = LRUCache(maxsize=100_000)
+        # (sender, recipient, create sender ATA, create recipient ATA) -> _TxTemplate
+        self.templates = LRUCache(maxsize=10_000)
+
+    def cache_stats(self) -> Dict:
+        info = _get_associated_token_address.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "ata_derivation": {
+                "hits": info.hits,
+                "misses": info.misses,
+                "hit_ratio": info.hits / lookups if lookups else 0.0,
+                "size": info.currsize,
+                "maxsize": info.maxsize,
+            },
+            "ata_exists": self.known_atas.stats(),
+            "tx_templates": self.templates.stats(),
+        }
 
-    def build_usdc_transfer(self, sender_pubkey: str, recipient_pubkey: str, amount_ui: float) -> BuiltTx:
+    def _fetch_state(self, pubkeys: List[str]) -> Tuple[List[Optional[Dict]], RecentBlockhash]:
+        """
+        Account states for `pubkeys` and a recent blockhash in a single round trip:
+        getMultipleAccounts (one call per 100 keys), batched with the blockhash calls
+        only when the provider has no fresh hash.
+        """
+        calls = [
+            ("getMultipleAccounts", [pubkeys[i:i + MAX_MULTIPLE_ACCOUNTS], {"encoding": "base64", "commitment": "processed"}])
+            for i in range(0, len(pubkeys), MAX_MULTIPLE_ACCOUNTS)
+        ]
+        n = len(calls)
+        recent = self.blockhashes.current()
+        if recent is None:
+            calls.extend(LATEST_BLOCKHASH_CALLS)
+        res = self.rpc.batch(calls)
+        if recent is None:
+            recent = self.blockhashes.record_miss(self.blockhashes.store(res[n:]))
+        return [acc for r in res[:n] for acc in r["value"]], recent
+
+    def load_lookup_tables(self, addresses: List[str]) -> List[AddressLookupTableAccount]:
+        """Fetch and decode on-chain address lookup tables for build_usdc_batch."""
+        out = []
+        for addr, acc in zip(addresses, self.rpc.get_multiple_accounts(addresses)):
+            if acc is None:
+                raise ValueError(f"Address lookup table {addr} not found.")
+            table = AddressLookupTable.deserialize(b64decode(acc["data"][0]))
+            out.append(AddressLookupTableAccount(Pubkey.from_string(addr), list(table.addresses)))
+        return out
+
+    @staticmethod
+    def _serialize_unsigned(payer: Pubkey, ixs: List[Instruction], blockhash: str,
+                            lookup_tables: List[AddressLookupTableAccount] = ()) -> bytes:
+        msg = MessageV0.try_compile(
+            payer=payer,
+            instructions=ixs,
+            recent_blockhash=Hash.from_string(blockhash),
+            address_lookup_table_accounts=list(lookup_tables),
+        )
+        # Placeholder Signer for payer; Phantom will replace with a real sig
+        return bytes(VersionedTransaction(msg, [NullSigner(payer)]))
+
+    def build_usdc_transfer(self, sender_pubkey: str, recipient_pubkey: str, amount: int) -> BuiltTx:
+        """`amount` is in USDC base units (core.amounts.to_base_units for UI input)."""
+        require_base_units(amount)
         sender = Pubkey.from_string(sender_pubkey)
         recipient = Pubkey.from_string(recipient_pubkey)
+        sender_ata = _get_associated_token_address(sender, self.usdc_mint)
+        recipient_ata = _get_associated_token_address(recipient, self.usdc_mint)
+
+        # Sender + sender ATA are always read (SOL and USDC balance checks); the
+        # recipient ATA only while we have not yet seen it exist.
+        recipient_known = self.known_atas.get(str(recipient_ata), False)
+        pubkeys = [str(sender), str(sender_ata)]
+        if not recipient_known:
+            pubkeys.append(str(recipient_ata))
+        with metrics.timer("build", stage="fetch_state"):
+            accounts, recent = self._fetch_state(pubkeys)
+        sender_acc, sender_ata_acc = accounts[0], accounts[1]
+        recipient_exists = recipient_known or accounts[2] is not None
+        if sender_ata_acc is not None:
+            self.known_atas.put(str(sender_ata), True)
+        if recipient_exists and not recipient_known:
+            self.known_atas.put(str(recipient_ata), True)
 
         # ----------- PRECHECKS: SOL fee & USDC balance -----------
-        lamports = self.rpc.get_balance_lamports(str(sender))
+        lamports = sender_acc["lamports"] if sender_acc else 0
         if lamports < MIN_LAMPORTS_FOR_FEES:
             need_sol = (MIN_LAMPORTS_FOR_FEES - lamports) / 1_000_000_000
             raise ValueError(f"Insufficient SOL to pay fees. Top up ~{need_sol:.5f} SOL and try again.")
 
-        # Find sender USDC ATA (may not exist yet)
-        sender_token_acc = self.rpc.get_token_account_by_owner(str(sender), str(self.usdc_mint))
-        if sender_token_acc is None:
+        # USDC balance decoded locally from the sender ATA (may not exist yet)
+        balance = _token_amount(sender_ata_acc)
+        if balance is None:
             # If there is no USDC ATA yet, user cannot send a positive amount (balance = 0).
-            if amount_ui > 0:
+            if amount > 0:
                 raise ValueError("Your USDC account doesn't exist yet or has 0 balance. Receive USDC first.")
-        else:
-            bal_ui = self.rpc.get_token_balance_ui(sender_token_acc)
-            if bal_ui < amount_ui:
-                raise ValueError(f"Insufficient USDC balance. You have {bal_ui:.6f}, need {amount_ui:.6f}.")
+        elif balance < amount:
+            raise ValueError(f"Insufficient USDC balance. You have {format_units(balance)}, need {format_units(amount)}.")
 
         # ---------------------------------------------------------
 
-        sender_ata = _get_associated_token_address(sender, self.usdc_mint)
-        recipient_ata = _get_associated_token_address(recipient, self.usdc_mint)
+        with metrics.timer("build", stage="compile"):
+            raw = self._render_transfer(
+                sender, recipient, sender_ata_acc is None, not recipient_exists, amount, recent.blockhash
+            )
 
-        ixs: List[Instruction] = []
+        return BuiltTx(
+            unsigned_b64=b64encode(raw).decode(),
+            recent_blockhash=recent.blockhash,
+            sender_ata=str(sender_ata),
+            recipient_ata=str(recipient_ata),
+            last_valid_block_height=recent.last_valid_block_height,
+        )
 
+    def _transfer_ixs(self, sender: Pubkey, recipient: Pubkey, create_sender_ata: bool,
+                      create_recipient_ata: bool, amount: int) -> List[Instruction]:
+        ixs: List[Instruction] = []
         # Create ATAs if missing (sender pays)
-        if self.rpc.get_account_info(str(sender_ata)) is None:
+        if create_sender_ata:
             ixs.append(_ix_create_associated_token_account(payer=sender, owner=sender, mint=self.usdc_mint))
-        if self.rpc.get_account_info(str(recipient_ata)) is None:
+        if create_recipient_ata:
             ixs.append(_ix_create_associated_token_account(payer=sender, owner=recipient, mint=self.usdc_mint))
-
-        amount = int(round(amount_ui * (10 ** USDC_DECIMALS)))
         ixs.append(_ix_transfer_checked(
-            source=sender_ata, mint=self.usdc_mint, dest=recipient_ata, owner=sender, amount=amount, decimals=USDC_DECIMALS
+            source=_get_associated_token_address(sender, self.usdc_mint),
+            mint=self.usdc_mint,
+            dest=_get_associated_token_address(recipient, self.usdc_mint),
+            owner=sender, amount=amount, decimals=USDC_DECIMALS,
         ))
+        return ixs
 
-        recent = self.rpc.get_latest_blockhash()
-        msg = MessageV0.try_compile(
-            payer=sender,
-            instructions=ixs,
-            recent_blockhash=Hash.from_string(recent),
-            address_lookup_table_accounts=[],
-        )
+    def _render_transfer(self, sender: Pubkey, recipient: Pubkey, create_sender_ata: bool,
+                         create_recipient_ata: bool, amount: int, blockhash: str) -> bytes:
+        """
+        Serialized unsigned transfer. Repeat (sender, recipient) pairs reuse a
+        compiled template and only splice in the amount and blockhash bytes.
+        """
+        key = (sender, recipient, create_sender_ata, create_recipient_ata)
+        tpl = self.templates.get(key)
+        if tpl is None:
+            ixs = self._transfer_ixs(sender, recipient, create_sender_ata, create_recipient_ata, TEMPLATE_AMOUNT_SENTINEL)
+            tpl = _TxTemplate.locate(self._serialize_unsigned(sender, ixs, blockhash), blockhash)
+            if tpl is None:
+                ixs = self._transfer_ixs(sender, recipient, create_sender_ata, create_recipient_ata, amount)
+                return self._serialize_unsigned(sender, ixs, blockhash)
+            self.templates.put(key, tpl)
+        return tpl.render(amount, blockhash)
 
-        # Placeholder Signer for payer; Phantom will replace with a real sig
-        signers = [NullSigner(sender)]
-        tx = VersionedTransaction(msg, signers)
+    def _fits(self, payer: Pubkey, ixs: List[Instruction], blockhash: str,
+              lookup_tables: List[AddressLookupTableAccount]) -> bool:
+        try:
+            return len(self._serialize_unsigned(payer, ixs, blockhash, lookup_tables)) <= PACKET_DATA_SIZE
+        except Exception:
+            return False  # e.g. more account keys than a message can index
 
-        return BuiltTx(
-            unsigned_b64=b64encode(bytes(tx)).decode(),
-            recent_blockhash=recent,
-            sender_ata=str(sender_ata),
-            recipient_ata=str(recipient_ata),
-        )
+    def build_usdc_batch(
+        self,
+        sender_pubkey: str,
+        payouts: List[Tuple[str, int]],
+        lookup_tables: List[AddressLookupTableAccount] = (),
+    ) -> List[BuiltBatchTx]:
+        """
+        Pay many recipients from one sender; payouts are (recipient, base units). Transfers (plus any create-ATA
+        instructions they need) are packed greedily into as few transactions as
+        fit under PACKET_DATA_SIZE; passing lookup tables that hold the recipient
+        ATAs lets more transfers fit per transaction. Balance checks cover the
+        whole batch up front, so either every transaction is buildable or none is.
+        Every payout to an ATA the batch creates is packed into the transaction
+        that creates it (so transactions can land in any order); those payouts
+        move up to the first payout to that recipient.
+        """
+        if not payouts:
+            return []
+        sender = Pubkey.from_string(sender_pubkey)
+        sender_ata = _get_associated_token_address(sender, self.usdc_mint)
+        legs = []  # (recipient, recipient_ata, amount)
+        for recipient_pubkey, amount in payouts:
+            recipient = Pubkey.from_string(recipient_pubkey)
+            if require_base_units(amount) == 0:
+                raise ValueError(f"Payout amount to {recipient_pubkey} must be positive.")
+            legs.append((recipient, _get_associated_token_address(recipient, self.usdc_mint), amount))
+
+        unknown = list(dict.fromkeys(str(ata) for _, ata, _ in legs if not self.known_atas.get(str(ata), False)))
+        accounts, recent = self._fetch_state([str(sender), str(sender_ata)] + unknown)
+        sender_acc, sender_ata_acc = accounts[0], accounts[1]
+        missing = {ata for ata, acc in zip(unknown, accounts[2:]) if acc is None}
+        for ata in unknown:
+            if ata not in missing:
+                self.known_atas.put(ata, True)
+
+        # ----------- PRECHECKS (aggregated over the batch) -----------
+        total = sum(amount for _, _, amount in legs)
+        balance = _token_amount(sender_ata_acc)
+        if balance is None:
+            raise ValueError("Your USDC account doesn't exist yet or has 0 balance. Receive USDC first.")
+        self.known_atas.put(str(sender_ata), True)
+        if balance < total:
+            raise ValueError(
+                f"Insufficient USDC balance. You have {format_units(balance)}, "
+                f"need {format_units(total)} for {len(legs)} payouts."
+            )
+
+        # ----------- PACKING -----------
+        # A unit is packed whole: one leg, or a create-ATA plus every leg to that ATA.
+        units: Dict[object, Tuple[List[Instruction], list, list]] = {}  # ata or leg index -> (ixs, transfers, created)
+        for i, (recipient, recipient_ata, amount) in enumerate(legs):
+            ata = str(recipient_ata)
+            key = ata if ata in missing else i
+            unit = units.get(key)
+            if unit is None:
+                unit = units[key] = ([], [], [])
+                if ata in missing:
+                    unit[0].append(_ix_create_associated_token_account(payer=sender, owner=recipient, mint=self.usdc_mint))
+                    unit[2].append(ata)
+            unit[0].append(_ix_transfer_checked(
+                source=sender_ata, mint=self.usdc_mint, dest=recipient_ata, owner=sender, amount=amount, decimals=USDC_DECIMALS
+            ))
+            unit[1].append((str(recipient), amount))
+
+        packed: List[Tuple[List[Instruction], list, list]] = []  # (ixs, transfers, created)
+        ixs, transfers, created = [], [], []
+        for unit_ixs, unit_transfers, unit_created in units.values():
+            if ixs and not self._fits(sender, ixs + unit_ixs, recent.blockhash, lookup_tables):
+                packed.append((ixs, transfers, created))
+                ixs, transfers, created = [], [], []
+            ixs = ixs + unit_ixs
+            transfers += unit_transfers
+            created += unit_created
+        packed.append((ixs, transfers, created))
+
+        lamports = sender_acc["lamports"] if sender_acc else 0
+        need = MIN_LAMPORTS_FOR_FEES * len(packed) + ATA_RENT_LAMPORTS * len(missing)
+        if lamports < need:
+            raise ValueError(f"Insufficient SOL to pay fees. Top up ~{(need - lamports) / 1_000_000_000:.5f} SOL and try again.")
+
+        out = []
+        for tx_ixs, tx_transfers, tx_created in packed:
+            raw = self._serialize_unsigned(sender, tx_ixs, recent.blockhash, lookup_tables)
+            if len(raw) > PACKET_DATA_SIZE:
+                raise ValueError("A single payout does not fit in one transaction.")
+            out.append(BuiltBatchTx(
+                unsigned_b64=b64encode(raw).decode(),
+                recent_blockhash=recent.blockhash,
+                sender_ata=str(sender_ata),
+                transfers=tx_transfers,
+                created_atas=tx_created,
+                last_valid_block_height=recent.last_valid_block_height,
+            ))
+        return out
+
+    def forget_accounts(self, signed_b64: str):
+        """Drop every account a transaction references from the ATA existence cache."""
+        try:
+            tx = VersionedTransaction.from_bytes(b64decode(signed_b64))
+        except Exception:
+            return
+        for key in tx.message.account_keys:
+            self.known_atas.discard(str(key))
 
     def send_signed(self, signed_b64: str) -> str:
-        return self.rpc.send_raw_transaction(signed_b64)
+        try:
+            return self.rpc.send_raw_transaction(signed_b64)
+        except Exception:
+            # A stale "exists" entry can make us skip a needed create-ATA instruction.
+            self.forget_accounts(signed_b64)
+            raise
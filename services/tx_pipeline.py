@@ -0,0 +1,241 @@
+# services/tx_pipeline.py
+import asyncio
+import time
+from base64 import b64decode
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import base58
+
+from core.db import DB
+from services.rpc import AsyncRpc, RpcError
+from services.solana_service import SolanaService
+
+MAX_SIGNATURES_PER_STATUS_CALL = 256  # getSignatureStatuses limit
+EXPIRY_BLOCKS_IF_UNKNOWN = 150
+
+# sendTransaction errors that reject the transaction itself: failed simulation
+# (-32002), bad signatures (-32003), undecodable transaction (-32602). Anything
+# else (node behind, rate limits, internal errors) says nothing about the
+# transaction, so it stays in flight and the rebroadcast loop retries it.
+REJECT_CODES = frozenset({-32002, -32003, -32602})
+# preflight outcomes under -32002 that are not rejections
+PREFLIGHT_TRANSIENT = ("BlockhashNotFound", "Blockhash not found")   # node lags the blockhash
+PREFLIGHT_LANDED = ("AlreadyProcessed", "already been processed")   # an earlier send landed
+
+@dataclass
+class InFlight:
+    payment_id: int
+    signature: str
+    signed_b64: str
+    last_valid_block_height: Optional[int]
+    submitted_at: float
+    sends: int = 1
+
+
+def _rejected(exc: RpcError) -> bool:
+    """Whether a sendTransaction error reply means the transaction itself was refused."""
+    detail = f"{exc} {exc.data.get('err') if isinstance(exc.data, dict) else exc.data}"
+    if any(s in detail for s in PREFLIGHT_TRANSIENT + PREFLIGHT_LANDED):
+        return False
+    return exc.code in REJECT_CODES
+
+
+def signature_of(signed_b64: str) -> str:
+    """Fee-payer signature (the transaction id) straight from the wire bytes."""
+    raw = b64decode(signed_b64)
+    # compact-u16 signature count (always < 128 here, so one byte), then 64-byte signatures
+    return base58.b58encode(raw[1:65]).decode()
+
+
+class SubmissionPipeline:
+    """
+    Owns signed transactions from send to final status.
+
+    submit() sends once (with preflight) and registers the signature. A poll loop
+    checks every in-flight signature with batched getSignatureStatuses calls plus
+    one getBlockHeight, and a rebroadcast loop resends unconfirmed transactions
+    until their blockhash expires. Outcomes are written to `payments` in bulk:
+    CONFIRMED when the cluster reaches `commitment`, FAILED on an on-chain error
+    or once the blockhash has expired without the signature landing.
+
+    With `solana`, the accounts of a rejected or failed transaction are dropped
+    from its ATA existence cache (SolanaService.forget_accounts), so the next
+    build re-checks them.
+    """
+
+    def __init__(
+        self,
+        rpc: AsyncRpc,
+        db: DB,
+        commitment: str = "confirmed",
+        poll_interval: float = 1.0,
+        rebroadcast_interval: float = 2.0,
+        max_in_flight: int = 10_000,
+        send_concurrency: int = 32,
+        on_final: Optional[Callable[[int, str, str], None]] = None,
+        solana: Optional[SolanaService] = None,
+    ):
+        self.rpc = rpc
+        self.db = db
+        self.solana = solana
+        self.commitment = commitment
+        self.poll_interval = poll_interval
+        self.rebroadcast_interval = rebroadcast_interval
+        self.on_final = on_final  # (payment_id, status, signature)
+        self.in_flight: Dict[str, InFlight] = {}
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._send_limit = asyncio.Semaphore(send_concurrency)
+        self._pending_updates: List[tuple] = []
+        self._tasks: List[asyncio.Task] = []
+        self.block_height: Optional[int] = None
+        self.stats = {"submitted": 0, "rebroadcasts": 0, "confirmed": 0, "failed": 0, "expired": 0, "polls": 0,
+                      "send_errors": 0}
+
+    # ---------- lifecycle ----------
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._loop(self.poll_once, self.poll_interval)),
+                asyncio.create_task(self._loop(self.rebroadcast_once, self.rebroadcast_interval)),
+            ]
+        return self
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+    async def _loop(self, step, interval: float):
+        while True:
+            try:
+                await step()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # transient RPC failure; next tick retries
+            await asyncio.sleep(interval)
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait until every submitted transaction has a final status."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.in_flight:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"{len(self.in_flight)} transactions still in flight")
+            await asyncio.sleep(self.poll_interval / 4)
+        await self.flush()
+
+    # ---------- submission ----------
+    async def _send(self, signed_b64: str, preflight: bool) -> str:
+        async with self._send_limit:
+            return await self.rpc.call(
+                "sendTransaction",
+                [signed_b64, {"encoding": "base64", "skipPreflight": not preflight, "maxRetries": 0}],
+            )
+
+    async def submit(self, payment_id: int, signed_b64: str, last_valid_block_height: Optional[int] = None) -> str:
+        """
+        Send a signed transaction and track it. Waits for a free slot when
+        max_in_flight is reached. A preflight rejection (REJECT_CODES) marks the
+        payment FAILED and re-raises; node-side errors, "blockhash not found",
+        "already processed" and network errors leave it in flight, where the
+        status poll and rebroadcast loop settle it.
+        """
+        sig = signature_of(signed_b64)
+        await self._slots.acquire()
+        try:
+            await self._send(signed_b64, preflight=True)
+        except RpcError as e:
+            self._forget_accounts(signed_b64)
+            if _rejected(e):
+                self._slots.release()
+                self._finish_payment(payment_id, "FAILED", sig)
+                self.stats["failed"] += 1
+                await self.flush()
+                raise
+            self.stats["send_errors"] += 1
+        except Exception:
+            self.stats["send_errors"] += 1  # network error: tracked anyway, the rebroadcast loop retries
+        self.in_flight[sig] = InFlight(payment_id, sig, signed_b64, last_valid_block_height, time.monotonic())
+        self._pending_updates.append((payment_id, "PENDING", sig))
+        self.stats["submitted"] += 1
+        return sig
+
+    async def rebroadcast_once(self):
+        async def resend(tx: InFlight):
+            try:
+                await self._send(tx.signed_b64, preflight=False)
+                tx.sends += 1
+                self.stats["rebroadcasts"] += 1
+            except Exception:
+                pass
+
+        await asyncio.gather(*(resend(tx) for tx in list(self.in_flight.values())))
+
+    def _forget_accounts(self, signed_b64: str):
+        if self.solana is not None:
+            self.solana.forget_accounts(signed_b64)
+
+    # ---------- confirmation ----------
+    def _finish_payment(self, payment_id: int, status: str, sig: str):
+        self._pending_updates.append((payment_id, status, sig))
+        if self.on_final:
+            self.on_final(payment_id, status, sig)
+
+    def _resolve(self, tx: InFlight, status: str, counter: str):
+        del self.in_flight[tx.signature]
+        self._slots.release()
+        self.stats[counter] += 1
+        self._finish_payment(tx.payment_id, status, tx.signature)
+
+    def _reached_commitment(self, status: Dict) -> bool:
+        level = status.get("confirmationStatus")
+        if self.commitment == "finalized":
+            return level == "finalized"
+        if self.commitment == "confirmed":
+            return level in ("confirmed", "finalized")
+        return level is not None
+
+    async def poll_once(self):
+        self.stats["polls"] += 1
+        txs = list(self.in_flight.values())
+        if txs:
+            sigs = [tx.signature for tx in txs]
+            calls = [("getBlockHeight", [{"commitment": "confirmed"}])] + [
+                ("getSignatureStatuses", [sigs[i:i + MAX_SIGNATURES_PER_STATUS_CALL]])
+                for i in range(0, len(sigs), MAX_SIGNATURES_PER_STATUS_CALL)
+            ]
+            res = await self.rpc.batch(calls)
+            self.block_height = int(res[0])
+            statuses = [s for r in res[1:] for s in r["value"]]
+
+            for tx, status in zip(txs, statuses):
+                if tx.last_valid_block_height is None:
+                    tx.last_valid_block_height = self.block_height + EXPIRY_BLOCKS_IF_UNKNOWN
+                if status is not None:
+                    if status.get("err") is not None:
+                        self._forget_accounts(tx.signed_b64)
+                        self._resolve(tx, "FAILED", "failed")
+                    elif self._reached_commitment(status):
+                        self._resolve(tx, "CONFIRMED", "confirmed")
+                elif self.block_height > tx.last_valid_block_height:
+                    self._resolve(tx, "FAILED", "expired")
+        await self.flush()
+
+    async def flush(self):
+        """Write queued status changes to `payments` in a single commit; kept queued if the write fails."""
+        if not self._pending_updates:
+            return
+        updates, self._pending_updates = self._pending_updates, []
+        try:
+            await asyncio.to_thread(self.db.update_payment_statuses, updates)
+        except BaseException:
+            # e.g. "database is locked": these transactions already left in_flight,
+            # so put the batch back ahead of anything queued since for the next flush
+            self._pending_updates[:0] = updates
+            raise
+
+    def snapshot(self) -> Dict:
+        return dict(self.stats, in_flight=len(self.in_flight), block_height=self.block_height)
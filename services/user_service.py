@@ -1,20 +1,129 @@
 # services/user_service.py
+import threading
+import time
+from typing import Dict
+
+from core.async_db import AsyncDB
 from core.db import DB
+from services.directory_cache import DirectoryCache
+
+_MISSING = object()
 
 class UserService:
-    def __init__(self, db: DB):
+    """
+    ensure_user() runs on every bot interaction, so it avoids the write lock:
+    users already seen with the same username (DirectoryCache.seen) cost a
+    dict lookup, and only new users or renames are upserted. Sightings are
+    buffered and written as last_seen_ts in one batch at most every
+    `seen_flush_interval` seconds (or on flush_seen()).
+    """
+
+    def __init__(self, db: DB, cache: DirectoryCache | None = None, seen_flush_interval: float = 30.0):
         self.db = db
+        self.cache = cache or DirectoryCache.for_db(db)
+        self.seen_flush_interval = seen_flush_interval
+        self._last_seen: Dict[int, float] = {}
+        self._seen_lock = threading.Lock()
+        self._next_seen_flush = time.monotonic() + seen_flush_interval
 
     def ensure_user(self, tg_user_id: int, username: str | None):
-        self.db.execute("INSERT OR IGNORE INTO users(tg_user_id, username) VALUES (?, ?)", (tg_user_id, username))
-        if username:
-            self.db.execute("UPDATE users SET username=? WHERE tg_user_id=?", (username, tg_user_id))
+        if self._needs_write(tg_user_id, username):
+            old, wrote = self._write_user(tg_user_id, username)
+            if wrote:
+                self.cache.invalidate_user(tg_user_id, old, username)
+            self.cache.seen.put(tg_user_id, username or old)
+        if self._mark_seen(tg_user_id):
+            self.flush_seen()
+
+    def _needs_write(self, tg_user_id: int, username: str | None) -> bool:
+        known = self.cache.seen.get(tg_user_id, _MISSING)
+        return known is _MISSING or bool(username and known != username)
+
+    def _write_user(self, tg_user_id: int, username: str | None):
+        """(previous username, whether a row was written); the caller invalidates once committed."""
+        row = self.db.fetch_one("SELECT username FROM users WHERE tg_user_id=?", (tg_user_id,))
+        old = row["username"] if row else None
+        if row is None or (username and old != username):
+            self.db.execute(DB.UPSERT_USER, (tg_user_id, username))
+            return old, True
+        return old, False
+
+    def _mark_seen(self, tg_user_id: int) -> bool:
+        """Buffer a sighting; True when the buffer is due for flush_seen()."""
+        now = time.monotonic()
+        with self._seen_lock:
+            self._last_seen[tg_user_id] = time.time()
+            if now < self._next_seen_flush:
+                return False
+            self._next_seen_flush = now + self.seen_flush_interval
+            return True
+
+    def flush_seen(self) -> int:
+        """Write buffered last-seen timestamps in one commit; returns rows updated."""
+        with self._seen_lock:
+            seen, self._last_seen = self._last_seen, {}
+        if not seen:
+            return 0
+        return self.db.touch_users(list(seen.items()))
+
+    def import_users(self, users) -> int:
+        """users: iterable of (tg_user_id, username); inserted in a single commit."""
+        n = self.db.bulk_add_users(users)
+        if n:
+            # cached "not found" answers for the new ids/names would otherwise linger
+            self.cache.clear_users()
+        return n
 
     def find_by_username_or_id(self, username: str | None, user_id: int | None):
         if username:
-            row = self.db.fetch_one("SELECT tg_user_id FROM users WHERE username=?", (username,))
-            if row: return row["tg_user_id"]
+            found = self.cache.user_by_name(username, lambda: self._load("username", username))
+            if found is not None: return found
+        if user_id:
+            found = self.cache.user_by_id(user_id, lambda: self._load("tg_user_id", user_id))
+            if found is not None: return found
+        return None
+
+    def _load(self, column: str, value):
+        row = self.db.fetch_one(f"SELECT tg_user_id FROM users WHERE {column}=?", (value,))
+        return row["tg_user_id"] if row else None
+
+
+class AsyncUserService:
+    """
+    UserService for asyncio handlers, over AsyncDB. Cache hits are answered on
+    the loop; misses read on the reader pool and writes join a group commit.
+    Cache invalidation happens after the write's group has committed.
+    """
+
+    def __init__(self, adb: AsyncDB, cache: DirectoryCache | None = None, seen_flush_interval: float = 30.0):
+        self.adb = adb
+        self.sync = UserService(adb.db, cache, seen_flush_interval)
+        self.cache = self.sync.cache
+
+    async def ensure_user(self, tg_user_id: int, username: str | None):
+        if self.sync._needs_write(tg_user_id, username):
+            old, wrote = await self.adb.run_write(self.sync._write_user, tg_user_id, username)
+            if wrote:
+                await self.cache.ainvalidate_user(self.adb.run_write, tg_user_id, old, username)
+            self.cache.seen.put(tg_user_id, username or old)
+        if self.sync._mark_seen(tg_user_id):
+            await self.flush_seen()
+
+    async def flush_seen(self) -> int:
+        return await self.adb.run_write(self.sync.flush_seen)
+
+    async def import_users(self, users) -> int:
+        n = await self.adb.run_write(self.adb.db.bulk_add_users, list(users))
+        if n:
+            self.cache.clear_users()
+        return n
+
+    async def find_by_username_or_id(self, username: str | None, user_id: int | None):
+        run, load = self.adb.run_read, self.sync._load
+        if username:
+            found = await self.cache.aget(self.cache.users, ("name", username), run, load, "username", username)
+            if found is not None: return found
         if user_id:
-            row = self.db.fetch_one("SELECT tg_user_id FROM users WHERE tg_user_id=?", (user_id,))
-            if row: return row["tg_user_id"]
+            found = await self.cache.aget(self.cache.users, ("id", user_id), run, load, "tg_user_id", user_id)
+            if found is not None: return found
         return None
@@ -1,32 +1,85 @@
 # services/wallet_service.py
 from typing import Optional
+from core.async_db import AsyncDB
 from core.db import DB
+from services.directory_cache import DirectoryCache
 
 class WalletService:
-    def __init__(self, db: DB):
+    def __init__(self, db: DB, cache: DirectoryCache | None = None):
         self.db = db
+        self.cache = cache or DirectoryCache.for_db(db)
 
     def add_wallet(self, tg_user_id: int, username: str | None, pubkey: str, make_active=True):
-        self.db.execute("INSERT OR IGNORE INTO users(tg_user_id, username) VALUES (?, ?)", (tg_user_id, username))
-        if username:
-            self.db.execute("UPDATE users SET username=? WHERE tg_user_id=?", (username, tg_user_id))
+        with self.db.transaction():
+            old = self._write_wallet(tg_user_id, username, pubkey, make_active)
+        self.cache.invalidate_user(tg_user_id, old, username)
+        self.cache.invalidate_wallet(tg_user_id)
+
+    def _write_wallet(self, tg_user_id: int, username: str | None, pubkey: str, make_active: bool):
+        """Row writes for add_wallet; returns the previous username. Caller owns the transaction."""
+        row = self.db.fetch_one("SELECT username FROM users WHERE tg_user_id=?", (tg_user_id,))
+        self.db.execute(DB.UPSERT_USER, (tg_user_id, username))
         if make_active:
             self.db.execute("UPDATE wallets SET is_active=0 WHERE tg_user_id=?", (tg_user_id,))
-        self.db.execute(
-            "INSERT OR IGNORE INTO wallets(tg_user_id, label, pubkey, is_active) VALUES (?,?,?,?)",
-            (tg_user_id, "Phantom", pubkey, 1 if make_active else 0)
+        known = self.db.fetch_one(
+            "SELECT id FROM wallets WHERE tg_user_id=? AND wallet_address=?", (tg_user_id, pubkey)
         )
+        if known is None:
+            self.db.execute(
+                "INSERT INTO wallets(tg_user_id, wallet_address, is_active) VALUES (?,?,?)",
+                (tg_user_id, pubkey, 1 if make_active else 0)
+            )
+        elif make_active:
+            self.db.execute("UPDATE wallets SET is_active=1 WHERE id=?", (known["id"],))
+        return row and row["username"]
+
+    def _write_active(self, tg_user_id: int, pubkey: str):
+        self.db.execute("UPDATE wallets SET is_active=0 WHERE tg_user_id=?", (tg_user_id,))
+        self.db.execute("UPDATE wallets SET is_active=1 WHERE tg_user_id=? AND wallet_address=?", (tg_user_id, pubkey))
 
     def list_wallets(self, tg_user_id: int):
-        return self.db.fetch_all("SELECT pubkey, is_active FROM wallets WHERE tg_user_id=?", (tg_user_id,))
+        return self.db.fetch_all("SELECT wallet_address AS pubkey, is_active FROM wallets WHERE tg_user_id=?", (tg_user_id,))
 
     def set_active(self, tg_user_id: int, pubkey: str):
-        self.db.execute("UPDATE wallets SET is_active=0 WHERE tg_user_id=?", (tg_user_id,))
-        self.db.execute("UPDATE wallets SET is_active=1 WHERE tg_user_id=? AND pubkey=?", (tg_user_id, pubkey))
+        with self.db.transaction():
+            self._write_active(tg_user_id, pubkey)
+        self.cache.invalidate_wallet(tg_user_id)
 
     def disconnect(self, tg_user_id: int, pubkey: str):
-        self.db.execute("DELETE FROM wallets WHERE tg_user_id=? AND pubkey=?", (tg_user_id, pubkey))
+        self.db.execute("DELETE FROM wallets WHERE tg_user_id=? AND wallet_address=?", (tg_user_id, pubkey))
+        self.cache.invalidate_wallet(tg_user_id)
 
     def active_wallet(self, tg_user_id: int) -> Optional[str]:
-        row = self.db.fetch_one("SELECT pubkey FROM wallets WHERE tg_user_id=? AND is_active=1", (tg_user_id,))
-        return row["pubkey"] if row else None
+        return self.cache.active_wallet(tg_user_id, lambda: self._load_active(tg_user_id))
+
+    def _load_active(self, tg_user_id: int) -> Optional[str]:
+        row = self.db.fetch_one("SELECT wallet_address FROM wallets WHERE tg_user_id=? AND is_active=1", (tg_user_id,))
+        return row["wallet_address"] if row else None
+
+
+class AsyncWalletService:
+    """WalletService over AsyncDB; each write is one savepoint in a group commit."""
+
+    def __init__(self, adb: AsyncDB, cache: DirectoryCache | None = None):
+        self.adb = adb
+        self.sync = WalletService(adb.db, cache)
+        self.cache = self.sync.cache
+
+    async def add_wallet(self, tg_user_id: int, username: str | None, pubkey: str, make_active=True):
+        old = await self.adb.run_write(self.sync._write_wallet, tg_user_id, username, pubkey, make_active)
+        await self.cache.ainvalidate_user(self.adb.run_write, tg_user_id, old, username)
+        await self.cache.ainvalidate_wallet(self.adb.run_write, tg_user_id)
+
+    async def list_wallets(self, tg_user_id: int):
+        return await self.adb.run_read(self.sync.list_wallets, tg_user_id)
+
+    async def set_active(self, tg_user_id: int, pubkey: str):
+        await self.adb.run_write(self.sync._write_active, tg_user_id, pubkey)
+        await self.cache.ainvalidate_wallet(self.adb.run_write, tg_user_id)
+
+    async def disconnect(self, tg_user_id: int, pubkey: str):
+        await self.adb.execute("DELETE FROM wallets WHERE tg_user_id=? AND wallet_address=?", (tg_user_id, pubkey))
+        await self.cache.ainvalidate_wallet(self.adb.run_write, tg_user_id)
+
+    async def active_wallet(self, tg_user_id: int) -> Optional[str]:
+        return await self.cache.aget(self.cache.wallets, tg_user_id, self.adb.run_read, self.sync._load_active, tg_user_id)
@@ -1,19 +1,187 @@
 # services/x402_service.py
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from core.async_db import AsyncDB
 from core.db import DB
 
+SQLITE_MAX_VARS = 500  # stay well under SQLITE_MAX_VARIABLE_NUMBER for IN (...) lists
+
 class X402Service:
-    def __init__(self, db: DB):
+    """
+    Invoices for x402 paywalled resources.
+
+    has_paid() is answered from an in-memory (resource_id -> buyers) index so
+    gating an HTTP request never touches SQLite. The index is loaded once, kept
+    current by this process's mark_paid calls, and picks up rows paid by other
+    processes with an incremental (paid_ts watermark) refresh at most every
+    `refresh_interval` seconds.
+
+    Only invoices with a buyer are indexed: an anonymous (buyer_tg_id=None)
+    payment proves nothing about the next anonymous caller, so has_paid() is
+    always False for None and anonymous access is gated on the invoice itself
+    (get_invoice(invoice_id)["status"] == "PAID").
+    """
+
+    def __init__(self, db: DB, default_ttl: Optional[float] = 15 * 60, refresh_interval: float = 5.0):
         self.db = db
+        self.default_ttl = default_ttl
+        self.refresh_interval = refresh_interval
+        self._paid: Dict[str, Set[int]] = {}
+        self._paid_lock = threading.Lock()
+        self._watermark: Optional[float] = None  # max paid_ts loaded from the DB
+        self._next_refresh = 0.0
 
-    def create_invoice(self, resource_id: str, price_usdc_int: int, buyer_tg_id: int | None = None) -> int:
-        self.db.execute(
-            "INSERT INTO invoices(resource_id, buyer_tg_id, price_usdc, status) VALUES (?,?,?,?)",
-            (resource_id, buyer_tg_id, price_usdc_int, "OPEN")
+    def create_invoice(self, resource_id: str, price_usdc_int: int, buyer_tg_id: int | None = None,
+                       ttl: Optional[float] = None) -> int:
+        ttl = self.default_ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        return self.db.execute(
+            "INSERT INTO invoices(resource_id, buyer_tg_id, price_usdc, status, expires_ts) VALUES (?,?,?,?,?)",
+            (resource_id, buyer_tg_id, price_usdc_int, "OPEN", expires)
         )
-        return self.db.last_row_id
 
     def mark_paid(self, invoice_id: int):
-        self.db.execute("UPDATE invoices SET status='PAID' WHERE id=?", (invoice_id,))
+        self.mark_paid_many([invoice_id])
+
+    def mark_paid_many(self, invoice_ids: Iterable[int]) -> int:
+        """
+        Settle invoices in one commit. Idempotent: already-PAID invoices are left
+        untouched (their paid_ts is kept). Returns the number newly marked paid.
+        """
+        ids = list(dict.fromkeys(invoice_ids))
+        if not ids:
+            return 0
+        with self.db.transaction():
+            newly = self._mark_paid_rows(ids)
+        self._index_paid(newly)
+        return len(newly)
+
+    def _mark_paid_rows(self, ids: List[int]) -> List[dict]:
+        """UPDATE half of mark_paid_many; caller owns the transaction and indexes the result once committed."""
+        now = time.time()
+        newly: List[dict] = []
+        for i in range(0, len(ids), SQLITE_MAX_VARS):
+            chunk = ids[i:i + SQLITE_MAX_VARS]
+            marks = ",".join("?" * len(chunk))
+            newly += self.db.fetch_all(
+                f"SELECT resource_id, buyer_tg_id FROM invoices WHERE id IN ({marks}) AND status!='PAID'", chunk
+            )
+            self.db.execute(
+                f"UPDATE invoices SET status='PAID', paid_ts=? WHERE id IN ({marks}) AND status!='PAID'",
+                (now, *chunk),
+            )
+        return newly
+
+    def _index_paid(self, rows: List[dict]):
+        with self._paid_lock:
+            for row in rows:
+                self._index_row(row)
+
+    def _index_row(self, row: dict):
+        # caller holds _paid_lock
+        if row["buyer_tg_id"] is not None:
+            self._paid.setdefault(row["resource_id"], set()).add(row["buyer_tg_id"])
 
     def get_invoice(self, invoice_id: int):
-        return self.db.fetch_one("SELECT * FROM invoices WHERE id=?", (invoice_id,))
+        row = self.db.fetch_one("SELECT * FROM invoices WHERE id=?", (invoice_id,))
+        if row and row["status"] == "OPEN" and row["expires_ts"] and row["expires_ts"] < time.time():
+            row["status"] = "EXPIRED"
+        return row
+
+    def find_open_invoice(self, resource_id: str, buyer_tg_id: int | None):
+        """Latest unexpired OPEN invoice for this buyer, to reuse instead of creating another."""
+        return self.db.fetch_one(
+            "SELECT * FROM invoices WHERE resource_id=? AND buyer_tg_id IS ? AND status='OPEN' "
+            "AND (expires_ts IS NULL OR expires_ts>?) ORDER BY id DESC LIMIT 1",
+            (resource_id, buyer_tg_id, time.time()),
+        )
+
+    def expire_stale(self) -> int:
+        """Flip OPEN invoices past expires_ts to EXPIRED; returns how many changed."""
+        where = "status='OPEN' AND expires_ts IS NOT NULL AND expires_ts<?"
+        now = time.time()
+        with self.db.transaction():
+            n = self.db.fetch_one(f"SELECT COUNT(*) AS n FROM invoices WHERE {where}", (now,))["n"]
+            if n:
+                self.db.execute(f"UPDATE invoices SET status='EXPIRED' WHERE {where}", (now,))
+        return n
+
+    # ---------- paywall gating ----------
+    def _refresh_paid_index(self):
+        if self._watermark is None:
+            rows = self.db.fetch_all(
+                "SELECT resource_id, buyer_tg_id, paid_ts FROM invoices WHERE status='PAID'"
+            )
+        else:
+            rows = self.db.fetch_all(
+                "SELECT resource_id, buyer_tg_id, paid_ts FROM invoices WHERE status='PAID' AND paid_ts>=?",
+                (self._watermark,),
+            )
+        with self._paid_lock:
+            for row in rows:
+                self._index_row(row)
+                if row["paid_ts"] is not None and (self._watermark is None or row["paid_ts"] > self._watermark):
+                    self._watermark = row["paid_ts"]
+            if self._watermark is None:
+                self._watermark = 0.0
+
+    def has_paid(self, resource_id: str, buyer_tg_id: int | None) -> bool:
+        """Hot-path check for x402 gating; hits SQLite at most once per refresh_interval."""
+        if self._refresh_due():
+            self._refresh_paid_index()
+        return self._is_paid(resource_id, buyer_tg_id)
+
+    def _refresh_due(self) -> bool:
+        now = time.monotonic()
+        if now < self._next_refresh:
+            return False
+        self._next_refresh = now + self.refresh_interval
+        return True
+
+    def _is_paid(self, resource_id: str, buyer_tg_id: int | None) -> bool:
+        if buyer_tg_id is None:
+            return False
+        buyers = self._paid.get(resource_id)
+        return buyers is not None and buyer_tg_id in buyers
+
+
+class AsyncX402Service:
+    """
+    X402Service over AsyncDB. has_paid() stays on the event loop and only awaits
+    the reader pool when the paid index is due for its incremental refresh.
+    """
+
+    def __init__(self, adb: AsyncDB, default_ttl: Optional[float] = 15 * 60, refresh_interval: float = 5.0):
+        self.adb = adb
+        self.sync = X402Service(adb.db, default_ttl, refresh_interval)
+
+    async def create_invoice(self, resource_id: str, price_usdc_int: int, buyer_tg_id: int | None = None,
+                             ttl: Optional[float] = None) -> int:
+        return await self.adb.run_write(self.sync.create_invoice, resource_id, price_usdc_int, buyer_tg_id, ttl)
+
+    async def mark_paid(self, invoice_id: int):
+        await self.mark_paid_many([invoice_id])
+
+    async def mark_paid_many(self, invoice_ids: Iterable[int]) -> int:
+        ids = list(dict.fromkeys(invoice_ids))
+        if not ids:
+            return 0
+        newly = await self.adb.run_write(self.sync._mark_paid_rows, ids)
+        self.sync._index_paid(newly)
+        return len(newly)
+
+    async def get_invoice(self, invoice_id: int):
+        return await self.adb.run_read(self.sync.get_invoice, invoice_id)
+
+    async def find_open_invoice(self, resource_id: str, buyer_tg_id: int | None):
+        return await self.adb.run_read(self.sync.find_open_invoice, resource_id, buyer_tg_id)
+
+    async def expire_stale(self) -> int:
+        return await self.adb.run_write(self.sync.expire_stale)
+
+    async def has_paid(self, resource_id: str, buyer_tg_id: int | None) -> bool:
+        if self.sync._refresh_due():
+            await self.adb.run_read(self.sync._refresh_paid_index)
+        return self.sync._is_paid(resource_id, buyer_tg_id)
@@ -0,0 +1,88 @@
+# tests/test_amounts.py
+"""Seeded randomized properties of the integer amount path (hypothesis is not a dependency here)."""
+import random
+from base64 import b64encode
+from decimal import Decimal
+
+import pytest
+
+from bench.amount_path import random_units
+from bench.mock_rpc import spl_token_account_data
+from core.amounts import U64_MAX, USDC_DECIMALS, format_units, from_base_units, require_base_units, to_base_units
+from core.db import DB
+from services.rpc import _token_balance, _token_balance_ui
+from services.solana_service import _token_amount, _u64_le
+
+MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+OWNER = "9xQeWvG816bUx9EPjHmaT23yvVM2ZWbrrpZb9PusVFin"
+CASES = 2_000
+SEEDS = range(5)
+
+
+def _cases(seed: int):
+    rnd = random.Random(seed)
+    return [random_units(rnd) for _ in range(CASES)]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_round_trips_are_exact(seed):
+    for units in _cases(seed):
+        ui = format_units(units)
+        assert to_base_units(ui) == units, ui
+        assert to_base_units(from_base_units(units)) == units
+        assert from_base_units(units) == Decimal(ui)
+        assert int.from_bytes(_u64_le(units), "little") == units
+        data = spl_token_account_data(MINT, OWNER, units)
+        assert _token_amount({"data": [b64encode(data).decode(), "base64"]}) == units
+        assert _token_balance({"value": {"amount": str(units), "decimals": USDC_DECIMALS}}) == units
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_ordering_is_preserved(seed):
+    units = _cases(seed)
+    for a, b in zip(units, units[1:]):
+        assert (a < b) == (to_base_units(format_units(a)) < to_base_units(format_units(b)))
+        assert (a < b) == (from_base_units(a) < from_base_units(b))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_padding_accepted_excess_precision_rejected(seed):
+    for units in _cases(seed):
+        ui = format_units(units)
+        assert to_base_units(f" {ui}000 ") == units
+        with pytest.raises(ValueError):
+            to_base_units(ui + "1")
+
+
+@pytest.mark.parametrize("text", ["0.1", "0.29", "1.005", "19.99", "123456.789012"])
+def test_typed_floats_mean_what_they_look_like(text):
+    assert to_base_units(float(text)) == to_base_units(text)
+
+
+@pytest.mark.parametrize("bad", ["-1", "nan", "inf", "1e-7", "abc", str(U64_MAX + 1), True])
+def test_to_base_units_rejects(bad):
+    with pytest.raises(ValueError):
+        to_base_units(bad)
+
+
+@pytest.mark.parametrize("bad", [1.5, "100", None])
+def test_require_base_units_rejects(bad):
+    with pytest.raises(TypeError):
+        require_base_units(bad)
+
+
+def test_ui_balance_is_display_only():
+    assert _token_balance_ui({"value": {"amount": "1250000", "decimals": 6}}) == 1.25
+
+
+def test_payments_reject_floats(tmp_path):
+    db = DB(str(tmp_path / "amounts.db"))
+    try:
+        with pytest.raises(TypeError):
+            db.add_payment(1, "a", 2, "b", 1.25)
+        with pytest.raises(TypeError):
+            db.bulk_add_payments([(1, "a", 2, "b", 1_250_000, "PENDING"), (1, "a", 2, "b", 1.25, "PENDING")])
+        assert db.fetch_one("SELECT COUNT(*) AS n FROM payments")["n"] == 0
+        assert db.bulk_add_payments([(1, "a", 2, "b", 1_250_000, "PENDING")]) == 1
+    finally:
+        db.close()
@@ -0,0 +1,45 @@
+# tests/test_db.py
+import sqlite3
+
+import pytest
+
+from core.db import DB
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DB(str(tmp_path / "t.db"))
+    yield db
+    db.close()
+
+
+def test_touch_users_takes_id_then_ts(db):
+    db.bulk_add_users([(1, "alice"), (2, "bob")])
+    assert db.touch_users([(1, 5.0), (2, 7.0)]) == 2
+    assert db.fetch_one("SELECT last_seen_ts FROM users WHERE tg_user_id=1")["last_seen_ts"] == 5.0
+    assert db.touch_users([(1, 4.0)]) == 0  # never moves backwards
+    assert db.fetch_one("SELECT last_seen_ts FROM users WHERE tg_user_id=1")["last_seen_ts"] == 5.0
+
+
+def test_request_ts_is_required(db):
+    with pytest.raises(Exception, match="NOT NULL"):
+        db.add_request(1, 2, None)
+
+
+def test_legacy_null_request_ts_is_paged(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE requests (id INTEGER PRIMARY KEY AUTOINCREMENT, sender_id INTEGER, "
+                "recip_id INTEGER, ts REAL, payment_id INTEGER, fulfilled INTEGER DEFAULT 0)")
+    con.executemany("INSERT INTO requests (sender_id, recip_id, ts) VALUES (?,?,?)",
+                    [(1, 2, None), (1, 2, 10.0), (1, 2, 20.0)])
+    con.commit()
+    con.close()
+
+    db = DB(path)
+    try:
+        assert [r["ts"] for r in db.iter_request_history(1, page_size=1)] == [20.0, 10.0, 0]
+        with pytest.raises(Exception, match="NOT NULL"):
+            db.add_request(1, 2, None)
+    finally:
+        db.close()
@@ -0,0 +1,105 @@
+# tests/test_directory_cache.py
+import asyncio
+
+import pytest
+
+from core.db import DB
+from services.directory_cache import DirectoryCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    db = DB(str(tmp_path / "cache.db"))
+    yield DirectoryCache(db)
+    db.close()
+
+
+def test_read_through(cache):
+    loads = []
+
+    def load():
+        loads.append(1)
+        return "wallet-a"
+
+    assert cache.active_wallet(1, load) == "wallet-a"
+    assert cache.active_wallet(1, load) == "wallet-a"
+    assert len(loads) == 1
+
+
+def test_invalidation_during_load_is_not_overwritten(cache):
+    # the load read the old row, then the write committed and invalidated
+    def stale_load():
+        cache.invalidate_wallet(1)
+        return "old-wallet"
+
+    assert cache.active_wallet(1, stale_load) == "old-wallet"
+    assert cache.active_wallet(1, lambda: "new-wallet") == "new-wallet"
+    assert cache.active_wallet(1, lambda: "unused") == "new-wallet"
+
+
+def test_invalidation_of_other_key_keeps_put(cache):
+    def load():
+        cache.invalidate_wallet(2)
+        return "wallet-a"
+
+    cache.active_wallet(1, load)
+    assert cache.active_wallet(1, lambda: "unused") == "wallet-a"
+
+
+def test_clear_users_during_load(cache):
+    def stale_load():
+        cache.clear_users()
+        return None  # "not found" from before a bulk import
+
+    assert cache.user_by_name("alice", stale_load) is None
+    assert cache.user_by_name("alice", lambda: 7) == 7
+
+
+def test_aget_invalidation_during_load(cache):
+    async def run(fn, *args):
+        return fn(*args)
+
+    def stale_load(tg_user_id):
+        cache.invalidate_wallet(tg_user_id)
+        return "old-wallet"
+
+    async def main():
+        assert await cache.aget(cache.wallets, 1, run, stale_load, 1) == "old-wallet"
+        return await cache.aget(cache.wallets, 1, run, lambda _: "new-wallet", 1)
+
+    assert asyncio.run(main()) == "new-wallet"
+
+
+def test_generations_only_live_while_loading(cache):
+    for uid in range(1000):
+        cache.invalidate_wallet(uid)
+        cache.invalidate_user(uid, f"user{uid}")
+    assert not cache._loading
+
+    def stale_load():
+        assert cache._loading
+        cache.invalidate_wallet(1)
+        return "old-wallet"
+
+    cache.active_wallet(1, stale_load)
+    assert not cache._loading
+
+    def failing_load():
+        raise RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        cache.active_wallet(2, failing_load)
+    assert not cache._loading
+    assert cache.active_wallet(2, lambda: "wallet-b") == "wallet-b"
+
+
+def test_overlapping_loads(cache):
+    # an invalidation between two loads of the same key only voids the first
+    def outer():
+        cache.invalidate_wallet(1)
+        assert cache.active_wallet(1, lambda: "new-wallet") == "new-wallet"
+        return "old-wallet"
+
+    assert cache.active_wallet(1, outer) == "old-wallet"
+    assert cache.active_wallet(1, lambda: "unused") == "new-wallet"
+    assert not cache._loading
@@ -0,0 +1,141 @@
+# tests/test_payment_watcher.py
+import asyncio
+import sqlite3
+
+import pytest
+from solders.keypair import Keypair
+
+from bench.mock_rpc import MockChain, MockRpcServer
+from bench.mock_ws import MockWsServer
+from core.db import DB
+from services.payment_watcher import PaymentWatcher
+from services.rpc import AsyncRpc
+from services.x402_service import X402Service
+
+MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+PRICE = 5_000_000
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DB(str(tmp_path / "watch.db"))
+    yield db
+    db.close()
+
+
+def _key() -> str:
+    return str(Keypair().pubkey())
+
+
+def _run(db, steps):
+    """Run `steps(watcher, chain, ata, x402)` against a mock node and PubSub socket."""
+    x402 = X402Service(db, refresh_interval=0)
+    chain = MockChain()
+    ata = _key()
+    chain.set_token_account(ata, _key(), MINT, 0)
+
+    async def main():
+        with MockRpcServer(chain) as node:
+            async with MockWsServer(chain) as ws, AsyncRpc(node.url) as rpc:
+                watcher = await PaymentWatcher(ws.url, rpc, db, x402=x402, connections=1,
+                                               flush_interval=3600, sweep_interval=3600).start()
+                try:
+                    await steps(watcher, chain, ata, x402)
+                finally:
+                    await watcher.stop()
+                return watcher
+
+    return asyncio.run(main())
+
+
+async def _until(watcher, cond):
+    for _ in range(100):
+        if cond():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError(watcher.snapshot())
+
+
+def test_reference_settles_the_invoice_that_was_paid(db):
+    async def steps(watcher, chain, ata, x402):
+        refs = [_key(), _key()]
+        a, b = (x402.create_invoice("doc", PRICE, buyer) for buyer in (1, 2))
+        await watcher.expect_invoice(a, ata, PRICE, reference=refs[0])
+        await watcher.expect_invoice(b, ata, PRICE, reference=refs[1])
+        chain.credit(ata, PRICE, reference=refs[1])
+        await _until(watcher, lambda: watcher.stats["matched"] == 1)
+        await watcher.flush()
+        assert x402.has_paid("doc", 2) and not x402.has_paid("doc", 1)
+
+    _run(db, steps)
+
+
+def test_reference_alone_does_not_settle(db):
+    # the reference is in the pay link; a cheap transaction carrying it is not a payment
+    async def steps(watcher, chain, ata, x402):
+        refs = [_key(), _key()]
+        a, b = (x402.create_invoice("doc", PRICE, buyer) for buyer in (1, 2))
+        await watcher.expect_invoice(a, ata, PRICE, reference=refs[0])
+        await watcher.expect_invoice(b, ata, PRICE, reference=refs[1])
+        chain.credit(ata, PRICE, reference=refs[0])
+        await _until(watcher, lambda: watcher.stats["matched"] == 1)
+        chain.touch_reference(refs[1])
+        await watcher.sweep()
+        await watcher.flush()
+        assert watcher.stats["matched"] == 1
+        assert x402.has_paid("doc", 1) and not x402.has_paid("doc", 2)
+
+    _run(db, steps)
+
+
+def test_wrong_amount_does_not_settle(db):
+    async def steps(watcher, chain, ata, x402):
+        ref = _key()
+        inv = x402.create_invoice("doc", PRICE, 1)
+        await watcher.expect_invoice(inv, ata, PRICE, reference=ref)
+        chain.credit(ata, 1, reference=ref)           # the reference, with a token amount
+        await asyncio.sleep(0.1)
+        chain.credit(ata, PRICE, reference=_key())   # the right amount, someone else's payment
+        await asyncio.sleep(0.1)
+        await watcher.sweep()
+        assert watcher.stats["matched"] == 0 and watcher.expected
+
+    _run(db, steps)
+
+
+def test_one_credit_settles_one_expectation(db):
+    async def steps(watcher, chain, ata, x402):
+        ref = _key()
+        a, b = (x402.create_invoice("doc", PRICE, buyer) for buyer in (1, 2))
+        await watcher.expect_invoice(a, ata, PRICE, reference=ref)
+        await watcher.expect_invoice(b, ata, PRICE, reference=ref)
+        chain.credit(ata, PRICE, reference=ref)
+        await _until(watcher, lambda: watcher.stats["matched"] == 1)
+        await watcher.sweep()
+        assert watcher.stats["matched"] == 1 and len(watcher.by_ref) == 1
+
+    _run(db, steps)
+
+
+def test_failed_flush_is_requeued(db, monkeypatch):
+    async def steps(watcher, chain, ata, x402):
+        pay_id = db.add_payment(1, "a", 2, "b", PRICE)
+        inv = x402.create_invoice("doc", PRICE, 1)
+        await watcher.expect_invoice(inv, ata, 7)
+        chain.credit(ata, 7)
+        await _until(watcher, lambda: watcher.stats["matched"] == 1)
+        watcher._payment_updates.append((pay_id, "CONFIRMED", "sig"))
+
+        def locked(*_):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(db, "update_payment_statuses", locked)
+        with pytest.raises(sqlite3.OperationalError):
+            await watcher.flush()
+        assert watcher._payment_updates and watcher._paid_invoices == [inv]
+        monkeypatch.undo()
+        await watcher.flush()
+        assert db.get_payment(pay_id)["status"] == "CONFIRMED" and x402.has_paid("doc", 1)
+        assert not watcher._payment_updates and not watcher._paid_invoices
+
+    _run(db, steps)
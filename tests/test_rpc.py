@@ -0,0 +1,140 @@
+# tests/test_rpc.py
+import asyncio
+
+import pytest
+from solders.keypair import Keypair
+
+from bench.mock_rpc import MockChain, MockRpcServer
+from services.rpc import AsyncRpc, Rpc, _order_batch
+
+OWNER = str(Keypair().pubkey())
+
+
+@pytest.fixture
+def chain():
+    chain = MockChain()
+    chain.set_balance(OWNER, 123_456)
+    return chain
+
+
+@pytest.fixture
+def node(chain, request):
+    kw = getattr(request, "param", {})
+    with MockRpcServer(chain, **kw) as node:
+        yield node
+
+
+def _calls():
+    return [("getBalance", [OWNER]), ("getSlot", []), ("getBlockHeight", []), ("getBalance", [str(Keypair().pubkey())])]
+
+
+def test_call_and_helpers(node, chain):
+    rpc = Rpc(node.url)
+    try:
+        assert rpc.get_balance_lamports(OWNER) == 123_456
+        assert rpc.call("getSlot", []) == chain.slot
+        assert rpc.get_account_info(str(Keypair().pubkey())) is None
+    finally:
+        rpc.close()
+
+
+def test_batch_is_one_request(node, chain):
+    rpc = Rpc(node.url)
+    try:
+        assert rpc.batch(_calls()) == [{"context": {"slot": chain.slot}, "value": 123_456}, chain.slot,
+                                       chain.block_height, {"context": {"slot": chain.slot}, "value": 0}]
+        assert node.requests == 1
+        assert rpc.batch([]) == [] and node.requests == 1
+    finally:
+        rpc.close()
+
+
+@pytest.mark.parametrize("node", [{"batch_mode": "reverse"}], indirect=True)
+def test_batch_replies_are_matched_by_id(node, chain):
+    rpc = Rpc(node.url)
+    try:
+        results = rpc.batch(_calls())
+        assert results[0]["value"] == 123_456
+        assert results[1] == chain.slot and results[2] == chain.block_height
+        assert results[3]["value"] == 0
+    finally:
+        rpc.close()
+
+
+@pytest.mark.parametrize("node", [{"batch_mode": "drop_last"}], indirect=True)
+def test_missing_batch_reply_raises(node):
+    rpc = Rpc(node.url)
+    try:
+        raw = rpc.batch_raw(_calls())
+        assert raw[-1] == {"error": {"message": "missing reply"}}
+        assert raw[0]["result"]["value"] == 123_456
+        with pytest.raises(RuntimeError, match="missing reply"):
+            rpc.batch(_calls())
+    finally:
+        rpc.close()
+
+
+@pytest.mark.parametrize("node", [{"batch_mode": "reject"}], indirect=True)
+def test_rejected_batch_raises(node):
+    rpc = Rpc(node.url)
+    try:
+        with pytest.raises(RuntimeError, match="RPC batch rejected"):
+            rpc.batch(_calls())
+    finally:
+        rpc.close()
+
+
+@pytest.mark.parametrize("node", [{"error_rate": 1.0}], indirect=True)
+def test_errors_are_unwrapped(node):
+    rpc = Rpc(node.url)
+    try:
+        with pytest.raises(RuntimeError, match="RPC error in getBalance: injected error"):
+            rpc.get_balance_lamports(OWNER)
+        with pytest.raises(RuntimeError, match="RPC error in getBalance"):
+            rpc.batch(_calls())
+        assert all("error" in r for r in rpc.batch_raw(_calls()))
+        assert rpc.get_account_info(OWNER) is None
+    finally:
+        rpc.close()
+
+
+def test_unknown_method_is_an_error(node):
+    rpc = Rpc(node.url)
+    try:
+        with pytest.raises(RuntimeError, match="RPC error in noSuchMethod"):
+            rpc.call("noSuchMethod", [])
+    finally:
+        rpc.close()
+
+
+@pytest.mark.parametrize("node", [{"http_error_rate": 1.0}], indirect=True)
+def test_http_errors_raise(node):
+    rpc = Rpc(node.url)
+    try:
+        with pytest.raises(Exception, match="500"):
+            rpc.call("getSlot", [])
+    finally:
+        rpc.close()
+
+
+@pytest.mark.parametrize("node", [{"batch_mode": "reverse"}], indirect=True)
+def test_async_rpc_batches_and_reorders(node, chain):
+    async def run():
+        async with AsyncRpc(node.url) as rpc:
+            balance = await rpc.get_balance_lamports(OWNER)
+            results = await rpc.batch(_calls())
+            return balance, results
+
+    balance, results = asyncio.run(run())
+    assert balance == 123_456
+    assert results[1] == chain.slot and results[3]["value"] == 0
+    assert node.requests == 2
+
+
+def test_order_batch_keeps_call_order():
+    calls = [("a", []), ("b", []), ("c", [])]
+    replies = [{"id": 2, "result": "c"}, {"id": 0, "result": "a"}]
+    assert _order_batch(calls, replies) == [{"id": 0, "result": "a"}, {"error": {"message": "missing reply"}},
+                                            {"id": 2, "result": "c"}]
+    with pytest.raises(RuntimeError, match="rejected"):
+        _order_batch(calls, {"error": {"message": "nope"}})
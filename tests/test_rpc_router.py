@@ -0,0 +1,169 @@
+# tests/test_rpc_router.py
+import asyncio
+import time
+
+import pytest
+from solders.keypair import Keypair
+
+from bench.mock_rpc import MockChain, MockRpcServer
+from services.rpc_router import AsyncRpcRouter, RpcRouter
+
+KEYS = [str(Keypair().pubkey()) for _ in range(3)]
+
+
+@pytest.fixture
+def chain():
+    return MockChain()
+
+
+@pytest.fixture
+def nodes(chain):
+    started = []
+
+    def start(**kw):
+        node = MockRpcServer(chain, **kw).start()
+        started.append(node)
+        return node
+
+    yield start
+    for node in started:
+        node.stop()
+
+
+def test_json_rpc_node_errors_count_as_failures(nodes):
+    bad = nodes(error_rate=1.0)            # answers HTTP 200 with -32005 on every call
+    good = nodes(latency=0.005)
+    router = RpcRouter([bad.url, good.url], timeout=5)
+    try:
+        for _ in range(30):
+            assert router.get_multiple_accounts(KEYS) == [None] * 3
+        health = router.health()
+        assert health[bad.url]["error_ewma"] > 0
+        assert health[bad.url]["failures"] == health[bad.url]["requests"]
+        assert bad.requests < 5 and good.requests >= 30
+    finally:
+        router.close()
+
+
+def test_all_nodes_erroring_surfaces_the_rpc_error(nodes):
+    router = RpcRouter([nodes(error_rate=1.0).url, nodes(error_rate=1.0).url], timeout=5)
+    try:
+        with pytest.raises(RuntimeError, match="injected error"):
+            router.get_multiple_accounts(KEYS)
+        assert router.get_account_info(KEYS[0]) is None  # same contract as a single Rpc
+    finally:
+        router.close()
+
+
+def test_async_router_fails_over_on_node_errors(nodes):
+    bad = nodes(error_rate=1.0)
+    good = nodes(latency=0.005)
+
+    async def run():
+        router = AsyncRpcRouter([bad.url, good.url], timeout=5)
+        try:
+            for _ in range(30):
+                assert await router.get_multiple_accounts(KEYS) == [None] * 3
+            return router.health()
+        finally:
+            await router.aclose()
+
+    health = asyncio.run(run())
+    assert health[bad.url]["error_ewma"] > 0
+    assert bad.requests < 5 and good.requests >= 30
+
+
+def test_slow_read_is_hedged_to_the_next_node(nodes):
+    slow = nodes(latency=0.5)
+    fast = nodes(latency=0.01)
+    router = RpcRouter([slow.url, fast.url], timeout=5, hedge_after=0.05)
+    try:
+        t0 = time.perf_counter()
+        router.get_multiple_accounts(KEYS)
+        elapsed = time.perf_counter() - t0
+        assert 0.05 <= elapsed < 0.3  # waited hedge_after, then the fast node answered
+        assert slow.requests == 1 and fast.requests == 1
+    finally:
+        router.close()
+
+
+def test_no_hedge_before_hedge_delay(nodes):
+    first = nodes(latency=0.02)
+    second = nodes()
+    router = RpcRouter([first.url, second.url], timeout=5, hedge_after=0.2)
+    try:
+        router.get_multiple_accounts(KEYS)
+        assert first.requests == 1 and second.requests == 0
+    finally:
+        router.close()
+
+
+def test_send_transaction_is_never_hedged(nodes):
+    a, b = nodes(latency=0.2), nodes(latency=0.2)
+    router = RpcRouter([a.url, b.url], timeout=5, hedge_after=0.01)
+    try:
+        for n in range(1, 4):
+            router.send_raw_transaction("AQ==")  # slower than hedge_after, still sent once
+            assert a.requests + b.requests == n
+    finally:
+        router.close()
+
+
+def test_send_transaction_fails_over_when_its_node_fails(nodes):
+    down = nodes(http_error_rate=1.0)
+    up = nodes()
+    router = RpcRouter([down.url, up.url], timeout=5)
+    try:
+        router.send_raw_transaction("AQ==")
+        assert down.requests == 1 and up.requests == 1
+    finally:
+        router.close()
+
+
+def test_http_errors_fail_over(nodes):
+    down = nodes(http_error_rate=1.0, http_error_status=500)
+    up = nodes()
+    router = RpcRouter([down.url, up.url], timeout=5)
+    try:
+        assert router.get_multiple_accounts(KEYS) == [None] * 3
+        assert router.health()[down.url]["failures"] == 1
+    finally:
+        router.close()
+
+
+def test_throttled_node_sits_out_retry_after(nodes):
+    limited = nodes(http_error_rate=1.0, http_error_status=429)  # Retry-After: 1
+    other = nodes(latency=0.01)
+    router = RpcRouter([limited.url, other.url], timeout=5)
+    try:
+        router.get_multiple_accounts(KEYS)
+        assert limited.requests == 1
+        health = router.health()[limited.url]
+        assert health["throttled"] == 1 and health["backed_off"]
+        for _ in range(10):
+            router.get_multiple_accounts(KEYS)
+        assert limited.requests == 1  # not retried inside its Retry-After window
+        assert other.requests == 11
+    finally:
+        router.close()
+
+
+def test_async_router_hedges_and_pins_writes(nodes):
+    slow = nodes(latency=0.5)
+    fast = nodes(latency=0.01)
+
+    async def run():
+        router = AsyncRpcRouter([slow.url, fast.url], timeout=5, hedge_after=0.05)
+        try:
+            t0 = time.perf_counter()
+            await router.get_multiple_accounts(KEYS)
+            hedged = time.perf_counter() - t0
+            before = slow.requests + fast.requests
+            await router.send_raw_transaction("AQ==")
+            return hedged, slow.requests + fast.requests - before
+        finally:
+            await router.aclose()
+
+    hedged, sends = asyncio.run(run())
+    assert hedged < 0.3
+    assert sends == 1
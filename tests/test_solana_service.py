@@ -0,0 +1,132 @@
+# tests/test_solana_service.py
+from base64 import b64decode
+from collections import Counter
+
+import pytest
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.transaction import VersionedTransaction
+
+from bench.mock_rpc import MockChain, MockRpcServer
+from services.rpc import Rpc
+from services.solana_service import (
+    ASSOCIATED_TOKEN_PROGRAM_ID, ATA_RENT_LAMPORTS, MIN_LAMPORTS_FOR_FEES, PACKET_DATA_SIZE, SolanaService,
+    _get_associated_token_address,
+)
+
+MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+SOL = 1_000_000_000
+
+
+def _ata(owner: str) -> str:
+    return str(_get_associated_token_address(Pubkey.from_string(owner), Pubkey.from_string(MINT)))
+
+
+@pytest.fixture
+def chain():
+    return MockChain()
+
+
+@pytest.fixture
+def svc(chain):
+    with MockRpcServer(chain) as node:
+        rpc = Rpc(node.url)
+        yield SolanaService(rpc, usdc_mint=MINT)
+        rpc.close()
+
+
+def _sender(chain, usdc: int = 10**12, lamports: int = 10 * SOL) -> str:
+    sender = str(Keypair().pubkey())
+    chain.set_balance(sender, lamports)
+    chain.set_token_account(_ata(sender), sender, MINT, usdc)
+    return sender
+
+
+def _recipients(chain, n: int, with_ata: bool = True):
+    out = [str(Keypair().pubkey()) for _ in range(n)]
+    if with_ata:
+        for r in out:
+            chain.set_token_account(_ata(r), r, MINT, 0)
+    return out
+
+
+def _creates(tx) -> int:
+    msg = VersionedTransaction.from_bytes(b64decode(tx.unsigned_b64)).message
+    keys = msg.account_keys
+    return sum(keys[ix.program_id_index] == ASSOCIATED_TOKEN_PROGRAM_ID for ix in msg.instructions)
+
+
+def test_splits_at_packet_size(chain, svc):
+    sender = _sender(chain)
+    payouts = [(r, 1_000 + i) for i, r in enumerate(_recipients(chain, 40))]
+    txs = svc.build_usdc_batch(sender, payouts)
+    assert len(txs) > 1
+    assert all(len(b64decode(t.unsigned_b64)) <= PACKET_DATA_SIZE for t in txs)
+    assert [p for t in txs for p in t.transfers] == payouts
+    assert not any(t.created_atas for t in txs)
+
+
+def test_lookup_tables_pack_more(chain, svc):
+    sender = _sender(chain)
+    recipients = _recipients(chain, 40)
+    payouts = [(r, 1_000) for r in recipients]
+    plain = svc.build_usdc_batch(sender, payouts)
+    table = AddressLookupTableAccount(Pubkey.from_string(str(Keypair().pubkey())),
+                                      [Pubkey.from_string(_ata(r)) for r in recipients])
+    packed = svc.build_usdc_batch(sender, payouts, lookup_tables=[table])
+    assert len(packed) < len(plain)
+    assert [p for t in packed for p in t.transfers] == payouts
+
+
+def test_create_ata_once_per_recipient(chain, svc):
+    sender = _sender(chain)
+    new = _recipients(chain, 2, with_ata=False)
+    old = _recipients(chain, 2)
+    payouts = [(new[0], 1), (old[0], 2), (new[0], 3), (new[1], 4), (old[1], 5), (new[1], 6)]
+    txs = svc.build_usdc_batch(sender, payouts)
+    assert sum(_creates(t) for t in txs) == 2
+    assert Counter(a for t in txs for a in t.created_atas) == Counter({_ata(new[0]): 1, _ata(new[1]): 1})
+    assert Counter(p for t in txs for p in t.transfers) == Counter(payouts)
+
+
+def test_payouts_to_created_ata_share_its_transaction(chain, svc):
+    # enough legs in between that the second payout to `new` lands past a split
+    sender = _sender(chain)
+    new = _recipients(chain, 1, with_ata=False)[0]
+    middle = [(r, 7) for r in _recipients(chain, 30)]
+    txs = svc.build_usdc_batch(sender, [(new, 1)] + middle + [(new, 2)])
+    assert len(txs) > 1
+    creator = [t for t in txs if _ata(new) in t.created_atas]
+    assert len(creator) == 1
+    assert [p for p in creator[0].transfers if p[0] == new] == [(new, 1), (new, 2)]
+    assert all(p[0] != new for t in txs if t is not creator[0] for p in t.transfers)
+
+
+def test_balance_check_covers_the_batch(chain, svc):
+    sender = _sender(chain, usdc=10)
+    recipients = _recipients(chain, 3)
+    with pytest.raises(ValueError, match="Insufficient USDC"):
+        svc.build_usdc_batch(sender, [(r, 4) for r in recipients])
+    assert len(svc.build_usdc_batch(sender, [(r, 3) for r in recipients])) == 1
+
+
+def test_fee_check_counts_transactions_and_rent(chain, svc):
+    recipients = _recipients(chain, 40)
+    payouts = [(r, 1) for r in recipients]
+    probe = svc.build_usdc_batch(_sender(chain), payouts)
+    need = MIN_LAMPORTS_FOR_FEES * len(probe)
+    with pytest.raises(ValueError, match="Insufficient SOL"):
+        svc.build_usdc_batch(_sender(chain, lamports=need - 1), payouts)
+    assert svc.build_usdc_batch(_sender(chain, lamports=need), payouts)
+
+    new = _recipients(chain, 1, with_ata=False)[0]
+    with pytest.raises(ValueError, match="Insufficient SOL"):
+        svc.build_usdc_batch(_sender(chain, lamports=MIN_LAMPORTS_FOR_FEES), [(new, 1)])
+    assert svc.build_usdc_batch(_sender(chain, lamports=MIN_LAMPORTS_FOR_FEES + ATA_RENT_LAMPORTS), [(new, 1)])
+
+
+@pytest.mark.parametrize("amount, exc", [(0, ValueError), (1.5, TypeError)])
+def test_rejects_bad_amounts(chain, svc, amount, exc):
+    with pytest.raises(exc):
+        svc.build_usdc_batch(_sender(chain), [(_recipients(chain, 1)[0], amount)])
@@ -0,0 +1,147 @@
+# tests/test_tx_pipeline.py
+import asyncio
+import os
+import sqlite3
+from base64 import b64encode
+
+import pytest
+
+from bench.mock_rpc import MockChain, MockRpcServer
+from core.db import DB
+from services.rpc import AsyncRpc
+from services.tx_pipeline import SubmissionPipeline, signature_of
+
+
+class Forgetful:
+    """Stands in for SolanaService; records forget_accounts calls."""
+
+    def __init__(self):
+        self.forgotten = []
+
+    def forget_accounts(self, signed_b64: str):
+        self.forgotten.append(signed_b64)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DB(str(tmp_path / "pipe.db"))
+    yield db
+    db.close()
+
+
+def _signed() -> str:
+    # one signature, then an opaque message; the mock only reads the signature
+    return b64encode(bytes([1]) + os.urandom(64) + b"message").decode()
+
+
+def _run(chain, db, steps, **kw):
+    async def main():
+        solana = Forgetful()
+        with MockRpcServer(chain, **kw) as node:
+            async with AsyncRpc(node.url) as rpc:
+                pipe = SubmissionPipeline(rpc, db, solana=solana)
+                pay_id = db.add_payment(1, "a", 2, "b", 1_000_000)
+                signed = _signed()
+                await steps(pipe, node, pay_id, signed)
+                await pipe.flush()
+                return pipe, solana, db.get_payment(pay_id)["status"], signed
+
+    return asyncio.run(main())
+
+
+def test_confirms(db):
+    chain = MockChain()
+
+    async def steps(pipe, node, pay_id, signed):
+        await pipe.submit(pay_id, signed)
+        chain.tick(chain.confirm_after)
+        await pipe.poll_once()
+
+    pipe, solana, status, _ = _run(chain, db, steps)
+    assert status == "CONFIRMED" and not pipe.in_flight and not solana.forgotten
+
+
+def test_preflight_rejection_fails(db):
+    chain = MockChain()
+    chain.fail_sends = True
+
+    async def steps(pipe, node, pay_id, signed):
+        with pytest.raises(RuntimeError, match="insufficient funds"):
+            await pipe.submit(pay_id, signed)
+
+    pipe, solana, status, signed = _run(chain, db, steps)
+    assert status == "FAILED" and not pipe.in_flight
+    assert solana.forgotten == [signed]
+
+
+@pytest.mark.parametrize("message", [
+    "Transaction simulation failed: Blockhash not found",
+    "Transaction simulation failed: This transaction has already been processed",
+])
+def test_transient_preflight_stays_in_flight(db, message):
+    chain = MockChain()
+    chain.fail_sends = message
+
+    async def steps(pipe, node, pay_id, signed):
+        assert await pipe.submit(pay_id, signed) == signature_of(signed)
+        assert db.get_payment(pay_id)["status"] == "PENDING"
+        chain.fail_sends = False
+        await pipe.rebroadcast_once()
+        chain.tick(chain.confirm_after)
+        await pipe.poll_once()
+
+    pipe, solana, status, signed = _run(chain, db, steps)
+    assert status == "CONFIRMED" and pipe.stats["send_errors"] == 1
+    assert solana.forgotten == [signed]
+
+
+def test_node_error_stays_in_flight(db):
+    chain = MockChain()
+
+    async def steps(pipe, node, pay_id, signed):
+        await pipe.submit(pay_id, signed)  # -32005 from the node, not a rejection
+        assert pipe.in_flight
+        node.error_rate = 0.0
+        await pipe.rebroadcast_once()
+        chain.tick(chain.confirm_after)
+        await pipe.poll_once()
+
+    pipe, _, status, _ = _run(chain, db, steps, error_rate=1.0)
+    assert status == "CONFIRMED"
+
+
+def test_onchain_error_fails_and_forgets_accounts(db):
+    chain = MockChain()
+
+    async def steps(pipe, node, pay_id, signed):
+        sig = await pipe.submit(pay_id, signed)
+        chain.tx_errors[sig] = {"InstructionError": [0, {"Custom": 1}]}
+        chain.tick(chain.confirm_after)
+        await pipe.poll_once()
+
+    pipe, solana, status, signed = _run(chain, db, steps)
+    assert status == "FAILED" and pipe.stats["failed"] == 1
+    assert solana.forgotten == [signed]
+
+
+def test_failed_flush_keeps_updates(db, monkeypatch):
+    chain = MockChain()
+    real = db.update_payment_statuses
+    calls = []
+
+    def locked_once(updates):
+        calls.append(list(updates))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return real(updates)
+
+    async def steps(pipe, node, pay_id, signed):
+        await pipe.submit(pay_id, signed)
+        chain.tick(chain.confirm_after)
+        monkeypatch.setattr(db, "update_payment_statuses", locked_once)
+        with pytest.raises(sqlite3.OperationalError):
+            await pipe.poll_once()  # resolved, but the write fails
+        assert not pipe.in_flight and db.get_payment(pay_id)["status"] == "PENDING"
+
+    pipe, _, status, _ = _run(chain, db, steps)
+    assert status == "CONFIRMED" and len(calls) == 2
@@ -0,0 +1,56 @@
+# tests/test_x402_service.py
+import asyncio
+
+import pytest
+
+from core.async_db import AsyncDB
+from core.db import DB
+from services.x402_service import AsyncX402Service, X402Service
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DB(str(tmp_path / "x402.db"))
+    yield db
+    db.close()
+
+
+def test_has_paid_per_buyer(db):
+    x402 = X402Service(db, refresh_interval=0)
+    inv = x402.create_invoice("article-1", 1000, 7)
+    assert not x402.has_paid("article-1", 7)
+    x402.mark_paid(inv)
+    assert x402.has_paid("article-1", 7)
+    assert not x402.has_paid("article-1", 8)
+    assert not x402.has_paid("article-2", 7)
+
+
+def test_anonymous_payment_does_not_unlock_other_anonymous_callers(db):
+    x402 = X402Service(db, refresh_interval=0)
+    inv = x402.create_invoice("article-1", 1000, None)
+    x402.mark_paid(inv)
+    assert not x402.has_paid("article-1", None)
+    assert x402.get_invoice(inv)["status"] == "PAID"
+    # a fresh process loading the index from SQLite behaves the same
+    assert not X402Service(db).has_paid("article-1", None)
+
+
+def test_paid_elsewhere_is_picked_up_by_refresh(db):
+    x402 = X402Service(db, refresh_interval=0)
+    assert not x402.has_paid("article-1", 7)
+    other = X402Service(db)
+    other.mark_paid(other.create_invoice("article-1", 1000, 7))
+    other.mark_paid(other.create_invoice("article-1", 1000, None))
+    assert x402.has_paid("article-1", 7)
+    assert not x402.has_paid("article-1", None)
+
+
+def test_async_anonymous(db):
+    async def main():
+        async with AsyncDB(db) as adb:
+            x402 = AsyncX402Service(adb, refresh_interval=0)
+            inv = await x402.create_invoice("article-1", 1000, None)
+            await x402.mark_paid(inv)
+            return await x402.has_paid("article-1", None)
+
+    assert asyncio.run(main()) is False